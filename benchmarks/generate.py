@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Generate a synthetic home folder with a dotfiles folder and a .dotconfig file
+tracking a given number of entries.
+
+Usage: generate.py <home> <entries> [<dotfiles-root>]
+
+The entries are a mix of:
+  - regular files in the home folder
+  - folder trees a few levels deep
+  - files nested in a shared ~/.config folder
+  - entries that are already linked to the files folder
+  - entries that are missing on the machine
+
+When <dotfiles-root> is given, the dotfiles folder is created there and linked
+from the home folder, so moves between both are cross-device moves when
+<dotfiles-root> is on another mount.
+"""
+import os
+import sys
+import json
+
+
+# Kinds of entries, the entry with number i gets KINDS[i % len(KINDS)]
+KINDS = ("file", "tree", "nested", "linked", "missing")
+
+TREE_DEPTH = 3
+TREE_FILES = 4
+FILE_SIZE = 512
+
+
+def _write(path, size=FILE_SIZE):
+    data_file = open(path, 'w')
+    data_file.write("x" * size)
+    data_file.close()
+
+
+def _make_tree(path, depth):
+    os.mkdir(path)
+    for number in range(TREE_FILES):
+        _write("%s/file%d" % (path, number))
+    if depth > 1:
+        _make_tree(path + "/sub", depth - 1)
+
+
+def generate(home, count, dotfiles_root=None):
+    """
+    Create the home folder with count entries, returns the .dotconfig data
+    """
+    dotfiles = home + "/dotfiles"
+
+    os.makedirs(home + "/.config")
+
+    if dotfiles_root:
+        real_dotfiles = os.path.join(dotfiles_root, "dotfiles")
+        os.makedirs(real_dotfiles)
+        os.symlink(real_dotfiles, dotfiles)
+    else:
+        os.mkdir(dotfiles)
+
+    os.mkdir(dotfiles + "/backup")
+    os.mkdir(dotfiles + "/files")
+
+    files = {}
+
+    for number in range(count):
+        kind = KINDS[number % len(KINDS)]
+        name = "%s%d" % (kind, number)
+
+        if kind == "nested":
+            path = "/.config/" + name
+        else:
+            path = "/." + name
+
+        files[name] = path
+        origin = home + path
+
+        if kind in ("file", "nested"):
+            _write(origin)
+        elif kind == "tree":
+            _make_tree(origin, TREE_DEPTH)
+        elif kind == "linked":
+            os.mkdir(dotfiles + "/files/" + name)
+            src = dotfiles + "/files/" + name + "/" + os.path.basename(origin)
+            _write(src)
+            os.symlink(src, origin)
+
+    data = {"files": files, "dot_path": "/dotfiles"}
+
+    config_file = open(home + "/.dotconfig", 'w')
+    config_file.write(json.dumps(data, sort_keys=True, indent=4))
+    config_file.close()
+
+    return data
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit(__doc__)
+
+    generate(os.path.abspath(sys.argv[1]), int(sys.argv[2]),
+             sys.argv[3] if len(sys.argv) == 4 else None)
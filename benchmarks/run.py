@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""
+Benchmark the dot commands on synthetic home folders
+
+Usage: run.py [options]
+
+Options:
+  -h --help               Show this screen
+  --sizes=<sizes>         Comma separated numbers of entries [default: 10,1000,100000]
+  --commands=<commands>   Comma separated commands to benchmark, see COMMANDS
+                          [default: list,plan,run,rerun,incremental,add,rm]
+  --root=<dir>            Folder to create the home folders in, a tmpfs like
+                          /dev/shm is used when available
+  --second-root=<dir>     Folder on another mount for the dotfiles folder,
+                          to benchmark cross-device moves
+  --syscalls              Count the system calls with strace, every command
+                          is run a second time for this
+  --output=<file>         Write the results as JSON [default: bench_results.json]
+
+Every command runs as a separate process on a freshly generated home folder,
+its wall time, peak RSS and optionally the number of system calls are
+recorded.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+
+from docopt import docopt
+
+from generate import generate
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOT = os.path.join(REPO, "bin", "dot")
+
+# Number of entries removed by the rm benchmark at most, the names are given
+# as arguments
+RM_LIMIT = 1000
+
+
+def _find_strace():
+    for folder in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(folder, "strace")
+        if os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def _dot(home, args, check=True):
+    """
+    Run dot on a home folder to prepare a benchmark
+    """
+    devnull = open(os.devnull, 'w')
+    status = subprocess.call(
+        [sys.executable, DOT] + args, cwd=home + "/dotfiles", env=_env(home),
+        stdout=devnull, stderr=devnull)
+    devnull.close()
+
+    if check and status != 0:
+        sys.exit("preparing 'dot %s' failed" % " ".join(args))
+
+
+def _env(home):
+    return dict(os.environ, HOME=home, PYTHONPATH=REPO)
+
+
+def prepare_list(home, data):
+    return ["list"]
+
+
+def prepare_plan(home, data):
+    return ["plan"]
+
+
+def prepare_run(home, data):
+    return []
+
+
+def prepare_rerun(home, data):
+    _dot(home, [], check=False)
+    return []
+
+
+def prepare_incremental(home, data):
+    _dot(home, ["--incremental"], check=False)
+    return ["--incremental"]
+
+
+def prepare_add(home, data):
+    count = max(1, len(data['files']) / 10)
+
+    manifest = open(home + "/manifest.tsv", 'w')
+    for number in range(count):
+        path = "%s/.added%d" % (home, number)
+        open(path, 'w').close()
+        manifest.write("added%d\t%s\n" % (number, path))
+    manifest.close()
+
+    return ["add", "--from", home + "/manifest.tsv"]
+
+
+def prepare_rm(home, data):
+    _dot(home, [], check=False)
+
+    names = sorted(name for name in data['files']
+                   if name.startswith(("file", "linked")))
+    return ["rm"] + names[:RM_LIMIT]
+
+
+# The commands that can be benchmarked, with a function that prepares the
+# home folder and returns the arguments for dot
+COMMANDS = {
+    "list": prepare_list,
+    "plan": prepare_plan,
+    "run": prepare_run,
+    "rerun": prepare_rerun,
+    "incremental": prepare_incremental,
+    "add": prepare_add,
+    "rm": prepare_rm,
+}
+
+
+def _count_syscalls(path):
+    """
+    Sum the calls column of a 'strace -c' summary
+    """
+    calls = 0
+    in_table = False
+
+    for line in open(path):
+        if line.startswith("-----"):
+            if in_table:
+                break
+            in_table = True
+            continue
+
+        fields = line.split()
+        if in_table and len(fields) >= 5 and re.match(r"^\d+$", fields[3]):
+            calls += int(fields[3])
+
+    return calls
+
+
+def measure(home, args, strace=None):
+    """
+    Run dot once and return the wall time, peak RSS and exit status. With
+    strace, the number of system calls is returned instead.
+    """
+    command = [sys.executable, DOT] + args
+
+    if strace:
+        summary = tempfile.NamedTemporaryFile()
+        command = [strace, "-f", "-c", "-o", summary.name] + command
+
+    devnull = open(os.devnull, 'w')
+
+    start = time.time()
+    process = subprocess.Popen(command, cwd=home + "/dotfiles",
+                               env=_env(home), stdout=devnull, stderr=devnull)
+    pid, status, rusage = os.wait4(process.pid, 0)
+    seconds = time.time() - start
+
+    devnull.close()
+
+    if strace:
+        calls = _count_syscalls(summary.name)
+        summary.close()
+        return {"syscalls": calls}
+
+    return {
+        "seconds": seconds,
+        "max_rss_kb": rusage.ru_maxrss,
+        "exit_status": os.WEXITSTATUS(status),
+    }
+
+
+def benchmark(root, size, command, dotfiles_root=None, strace=None):
+    """
+    Benchmark a single command on a fresh home folder
+    """
+    results = {}
+
+    for counting in ([False, True] if strace else [False]):
+        workdir = tempfile.mkdtemp(dir=root)
+        seconddir = tempfile.mkdtemp(dir=dotfiles_root) \
+            if dotfiles_root else None
+
+        try:
+            home = workdir + "/home"
+            data = generate(home, size, seconddir)
+            args = COMMANDS[command](home, data)
+            results.update(measure(home, args, strace if counting else None))
+        finally:
+            shutil.rmtree(workdir)
+            if seconddir:
+                shutil.rmtree(seconddir)
+
+    return results
+
+
+def _default_root():
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def main(args):
+    sizes = [int(size) for size in args['--sizes'].split(",")]
+    commands = args['--commands'].split(",")
+    root = args['--root'] or _default_root()
+    second_root = args['--second-root']
+
+    for command in commands:
+        if command not in COMMANDS:
+            sys.exit("unknown command %r, choose from %s" %
+                     (command, ", ".join(sorted(COMMANDS))))
+
+    strace = None
+    if args['--syscalls']:
+        strace = _find_strace()
+        if strace is None:
+            sys.exit("--syscalls needs strace to be installed")
+
+    layouts = [("same-device", None)]
+    if second_root:
+        if os.stat(second_root).st_dev == os.stat(root).st_dev:
+            sys.exit("%s and %s are on the same device" % (root, second_root))
+        layouts.append(("cross-device", second_root))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "root": root,
+        "second_root": second_root,
+        "results": [],
+    }
+
+    print "%-13s %8s %-12s %10s %12s %10s" % (
+        "layout", "entries", "command", "seconds", "max rss kb", "syscalls")
+
+    for layout, dotfiles_root in layouts:
+        for size in sizes:
+            for command in commands:
+                result = benchmark(root, size, command, dotfiles_root, strace)
+                result.update(
+                    {"layout": layout, "entries": size, "command": command})
+                report["results"].append(result)
+
+                print "%-13s %8d %-12s %10.3f %12d %10s" % (
+                    layout, size, command, result["seconds"],
+                    result["max_rss_kb"], result.get("syscalls", "-"))
+
+    output = open(args['--output'], 'w')
+    output.write(json.dumps(report, sort_keys=True, indent=4))
+    output.close()
+
+
+if __name__ == "__main__":
+    main(docopt(__doc__))
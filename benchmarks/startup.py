@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Measure the cold start of dot and fail when it goes over budget
+
+Usage: startup.py [options]
+
+Options:
+  -h --help               Show this screen
+  --command=<command>     Command to start [default: list]
+  --entries=<entries>     Number of entries in the home folder [default: 20]
+  --runs=<runs>           Number of runs, the fastest one counts [default: 20]
+  --budget=<ms>           Milliseconds dot may take on top of starting the
+                          interpreter itself [default: 40]
+  --modules               List the modules that are imported, in order
+
+The interpreter's own start up is measured first, by running 'python -c
+pass', and subtracted so the budget only covers the time spent by dot:
+importing its modules, parsing the arguments and running the command. An
+empty command times a plain run of dot, the one done at every login. The
+arguments of every command but --help are split without docopt, a start
+that imports it fails the check.
+
+The check runs in the CI build after the tests, see circle.yml: 'dot list'
+with the default budget, and a plain run and 'dot -q --incremental', which
+also plan and check the entries, with a budget of 60 ms. Run it by hand from the root of the
+repository with 'python benchmarks/startup.py', it exits with an error when
+dot is over budget.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from docopt import docopt
+
+from generate import generate
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOT = os.path.join(REPO, "bin", "dot")
+
+# Modules that are too slow to import for a command that only reads the
+# config, they must not show up when starting 'dot list'
+HEAVY_MODULES = ("ctypes", "docopt", "shutil", "socket", "sqlite3", "ssl",
+                 "subprocess", "tempfile", "urllib", "dot.move", "dot.plan",
+                 "dot.timings")
+
+
+def _env(home):
+    return dict(os.environ, HOME=home, PYTHONPATH=REPO)
+
+
+def fastest(command, home, runs):
+    """
+    Run command runs times and return the fastest wall time in seconds
+    """
+    devnull = open(os.devnull, 'w')
+    best = None
+
+    for run in range(runs):
+        start = time.time()
+        subprocess.call(command, cwd=home + "/dotfiles", env=_env(home),
+                        stdout=devnull, stderr=devnull)
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+
+    devnull.close()
+    return best
+
+
+def imported_modules(command, home):
+    """
+    Get the names of the modules imported by command, in the order of
+    importing, from the output of 'python -v'
+    """
+    process = subprocess.Popen(
+        [command[0], "-v"] + command[1:], cwd=home + "/dotfiles",
+        env=_env(home), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+
+    modules = []
+    for line in stderr.splitlines():
+        if line.startswith("import "):
+            name = line.split()[1]
+            if name not in modules:
+                modules.append(name)
+    return modules
+
+
+def main(args):
+    runs = int(args['--runs'])
+    budget = float(args['--budget']) / 1000
+
+    arguments = args['--command'].split()
+    label = args['--command'] or "(run)"
+
+    workdir = tempfile.mkdtemp()
+
+    try:
+        home = workdir + "/home"
+        generate(home, int(args['--entries']))
+
+        command = [sys.executable, DOT] + arguments
+        interpreter = fastest([sys.executable, "-c", "pass"], home, runs)
+        total = fastest(command, home, runs)
+        modules = imported_modules(command, home)
+    finally:
+        shutil.rmtree(workdir)
+
+    overhead = total - interpreter
+    heavy = [name for name in modules if name in HEAVY_MODULES]
+
+    print "interpreter %8.1f ms" % (interpreter * 1000)
+    print "dot %-7s %8.1f ms" % (label, total * 1000)
+    print "overhead    %8.1f ms (budget %.1f ms)" % (overhead * 1000,
+                                                     budget * 1000)
+    print "modules     %8d" % len(modules)
+
+    if args['--modules']:
+        print "\n".join("  " + name for name in modules)
+
+    problems = []
+    if overhead > budget:
+        problems.append("start up is %.1f ms over budget"
+                        % ((overhead - budget) * 1000))
+    if heavy and "list" in arguments:
+        problems.append("slow modules imported: %s" % ", ".join(heavy))
+    elif "docopt" in modules:
+        problems.append("the arguments were parsed with docopt")
+
+    if problems:
+        sys.exit("; ".join(problems))
+
+
+if __name__ == "__main__":
+    main(docopt(__doc__))
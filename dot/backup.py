@@ -0,0 +1,250 @@
+import os
+import re
+import sys
+import time
+import stat
+from collections import namedtuple
+
+import colors
+
+
+# Files that are replaced by a symlink are moved into a new generation of
+# their entry: backup/<name>/<stamp>/<file>. Old generations are packed into
+# backup/<name>/<stamp>.tar.gz. Backups made before generations existed are
+# kept as backup/<name>/<file> and treated as the oldest generation.
+BACKUP_DIR = "backup"
+
+STAMP_FORMAT = "%Y%m%dT%H%M%S"
+ARCHIVE_SUFFIX = ".tar.gz"
+
+_STAMP = re.compile(r"^\d{8}T\d{6}\.\d{6}$")
+
+# Generations kept by 'dot backup prune' when no policy is given
+KEEP = 5
+
+# A generation of an entry. path is the folder or archive of the generation,
+# archived is set for archives and legacy for a backup without generation.
+Generation = namedtuple('Generation', [
+    'name', 'stamp', 'path', 'archived', 'legacy'])
+
+
+def new_stamp(now=None):
+    """
+    Get the stamp of a new generation, the time with microseconds so two
+    runs never get the same one
+    """
+    now = time.time() if now is None else now
+    return time.strftime(STAMP_FORMAT, time.localtime(now)) + \
+        ".%06d" % int((now % 1) * 1000000)
+
+
+def stamp_time(stamp):
+    """
+    Get the time of a stamp in seconds since the epoch
+    """
+    seconds, micro = stamp.split(".")
+    return time.mktime(time.strptime(seconds, STAMP_FORMAT)) + \
+        int(micro) / 1000000.0
+
+
+def generation_dir(name, stamp, folder=BACKUP_DIR):
+    """
+    Get the folder of a generation in the backup folder folder
+    """
+    return "%s/%s/%s" % (folder, name, stamp)
+
+
+def generations(name):
+    """
+    Get the generations of an entry, oldest first
+    """
+    folder = BACKUP_DIR + "/" + name
+
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+
+    found = []
+    for child in names:
+        path = folder + "/" + child
+
+        if _STAMP.match(child):
+            found.append(Generation(name, child, path, False, False))
+        elif child.endswith(ARCHIVE_SUFFIX) and \
+                _STAMP.match(child[:-len(ARCHIVE_SUFFIX)]):
+            found.append(Generation(name, child[:-len(ARCHIVE_SUFFIX)], path,
+                                    True, False))
+        elif not child.endswith(".tmp"):
+            # The time a legacy backup was made isn't known, its
+            # modification time is the best guess
+            found.append(Generation(name, new_stamp(os.lstat(path).st_mtime),
+                                    path, False, True))
+
+    return sorted(found, key=lambda generation: generation.stamp)
+
+
+def all_generations():
+    """
+    Get the generations of every entry in the backup folder
+    """
+    found = []
+    for name in sorted(os.listdir(BACKUP_DIR)):
+        if os.path.isdir(BACKUP_DIR + "/" + name):
+            found.extend(generations(name))
+    return found
+
+
+def size(generation):
+    """
+    Get the number of bytes a generation takes
+    """
+    st = os.lstat(generation.path)
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+
+    total = 0
+    for root, dirs, files in os.walk(generation.path):
+        for filename in files:
+            total += os.lstat(os.path.join(root, filename)).st_size
+    return total
+
+
+def archive(generation):
+    """
+    Pack a generation into a compressed tar archive next to it and remove the
+    folder. The files are streamed into the archive one at a time, nothing is
+    copied first. Returns the archived generation.
+    """
+    import tarfile
+
+    path = "%s/%s/%s%s" % (BACKUP_DIR, generation.name, generation.stamp,
+                           ARCHIVE_SUFFIX)
+
+    archive_file = tarfile.open(path + ".tmp", "w:gz")
+    try:
+        if generation.legacy:
+            archive_file.add(generation.path,
+                             os.path.basename(generation.path))
+        else:
+            for child in sorted(os.listdir(generation.path)):
+                archive_file.add(generation.path + "/" + child, child)
+    except (IOError, OSError):
+        archive_file.close()
+        os.unlink(path + ".tmp")
+        raise
+    archive_file.close()
+
+    os.rename(path + ".tmp", path)
+    _remove(generation.path)
+
+    return Generation(generation.name, generation.stamp, path, True, False)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        import shutil
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def select_expired(found, keep=None, keep_days=None, now=None):
+    """
+    Select the generations of an entry that are not kept by the policy: the
+    newest keep generations and the ones younger than keep_days days are
+    kept. The newest generation is always kept.
+    """
+    now = time.time() if now is None else now
+    newest_first = sorted(found, key=lambda generation: generation.stamp,
+                          reverse=True)
+
+    expired = []
+    for number, generation in enumerate(newest_first):
+        kept = number == 0
+        if keep is not None and number < keep:
+            kept = True
+        if keep_days is not None and \
+                now - stamp_time(generation.stamp) < keep_days * 86400:
+            kept = True
+        if not kept:
+            expired.append(generation)
+
+    return expired[::-1]
+
+
+def prune(name, keep=None, keep_days=None, now=None):
+    """
+    Remove the generations of an entry that the policy doesn't keep and pack
+    the kept ones, except the newest, into archives. Returns the removed and
+    the archived generations.
+    """
+    if keep is None and keep_days is None:
+        keep = KEEP
+
+    found = generations(name)
+    expired = select_expired(found, keep, keep_days, now)
+
+    for generation in expired:
+        _remove(generation.path)
+
+    archived = []
+    kept = [generation for generation in found if generation not in expired]
+    for generation in kept[:-1]:
+        if not generation.archived:
+            archived.append(archive(generation))
+
+    return expired, archived
+
+
+def _check_members(archive_file):
+    for member in archive_file.getmembers():
+        if member.name.startswith("/") or ".." in member.name.split("/"):
+            sys.exit(colors.yellow("[ERROR]") + " %s contains the unsafe "
+                     "path %s" % (archive_file.name, member.name))
+
+
+def restore(generation, folder):
+    """
+    Put the files of a generation in folder and remove the generation.
+    Archives are extracted while they're read.
+    """
+    if generation.archived:
+        import tarfile
+
+        archive_file = tarfile.open(generation.path, "r:gz")
+        try:
+            _check_members(archive_file)
+            names = [member.name.split("/")[0]
+                     for member in archive_file.getmembers()]
+            _check_free(folder, names)
+            archive_file.extractall(folder)
+        finally:
+            archive_file.close()
+        os.unlink(generation.path)
+        return
+
+    import move
+
+    if generation.legacy:
+        children = [os.path.basename(generation.path)]
+        sources = [generation.path]
+    else:
+        children = sorted(os.listdir(generation.path))
+        sources = [generation.path + "/" + child for child in children]
+
+    _check_free(folder, children)
+
+    for source, child in zip(sources, children):
+        move.move(source, folder + "/" + child)
+
+    if not generation.legacy:
+        os.rmdir(generation.path)
+
+
+def _check_free(folder, names):
+    for name in set(names):
+        if os.path.lexists(folder + "/" + name):
+            sys.exit(colors.yellow("[ERROR]") + " %s already exists in %s, "
+                     "remove it or restore to another folder with '--to'"
+                     % (name, folder))
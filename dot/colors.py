@@ -1,14 +1,46 @@
-def red(text):
-    return "\033[0;31m" + text + "\033[0m"
+import os
+import sys
 
 
-def green(text):
-    return "\033[0;32m" + text + "\033[0m"
+RESET = "\033[0m"
 
+# ANSI codes of the colours, a function with the same name wraps text in it
+CODES = {"red": 31, "green": 32, "yellow": 33, "blue": 34}
 
-def yellow(text):
-    return "\033[0;33m" + text + "\033[0m"
 
+def _make_color(code):
+    start = "\033[0;%dm" % code
 
-def blue(text):
-    return "\033[0;34m" + text + "\033[0m"
+    def color(text):
+        return start + text + RESET
+    return color
+
+
+def _plain(text):
+    return text
+
+
+def use_colors(enabled):
+    """
+    Switch the colour functions of this module on or off. They're only
+    rebuilt here, so a call to one of them does no more than concatenating.
+    """
+    module = sys.modules[__name__]
+
+    for name, code in CODES.iteritems():
+        setattr(module, name, _make_color(code) if enabled else _plain)
+
+
+def stream_supports_colors(stream):
+    """
+    Check whether ANSI escapes should be written to a stream: only when it's a
+    terminal and NO_COLOR and TERM=dumb aren't set
+    """
+    if "NO_COLOR" in os.environ or os.environ.get("TERM") == "dumb":
+        return False
+
+    isatty = getattr(stream, "isatty", None)
+    return bool(isatty and isatty())
+
+
+use_colors(True)
@@ -0,0 +1,80 @@
+from collections import namedtuple
+
+import state
+
+
+ADDED = 'added'
+REMOVED = 'removed'
+RETARGETED = 'retargeted'
+CONTENT_CHANGED = 'content-changed'
+
+KINDS = (ADDED, REMOVED, RETARGETED, CONTENT_CHANGED)
+
+# A difference of an entry between the manifest and the config and file
+# system. old and new describe the entry before and now, detail lists the
+# changed files for content changes
+Change = namedtuple('Change', ['name', 'kind', 'old', 'new', 'detail'])
+
+
+def describe(record):
+    """
+    Describe where an entry lives and what it is, e.g. '/.vimrc -> target'
+    """
+    if record is None:
+        return None
+
+    text = record["path"]
+    if record["kind"] == "link":
+        text += " -> " + record["target"]
+    elif record["kind"] is None:
+        text += " (missing)"
+    else:
+        text += " (%s)" % record["kind"]
+
+    return text
+
+
+def changed_files(old, new):
+    """
+    Get the files of an entry that were added, removed or changed, compared
+    on their mode and hash
+    """
+    old = old or {}
+    new = new or {}
+
+    return sorted(relative for relative in set(old) | set(new)
+                  if relative not in old or relative not in new or
+                  old[relative][2:] != new[relative][2:])
+
+
+def compare(entries, manifest, jobs=1):
+    """
+    Compare the entries and the file system with a manifest, see
+    state.build_manifest(). Only the files of which the size, modification
+    time or mode differ from the manifest are hashed. Returns the changes
+    sorted by name.
+    """
+    current = state.build_manifest(entries, manifest, jobs)
+    changes = []
+
+    for name in sorted(set(current) | set(manifest)):
+        old = manifest.get(name)
+        new = current.get(name)
+
+        if old is None:
+            changes.append(Change(name, ADDED, None, describe(new), []))
+            continue
+
+        if new is None:
+            changes.append(Change(name, REMOVED, describe(old), None, []))
+            continue
+
+        if describe(old) != describe(new):
+            changes.append(Change(name, RETARGETED, describe(old),
+                                  describe(new), []))
+
+        files = changed_files(old.get("files"), new.get("files"))
+        if files:
+            changes.append(Change(name, CONTENT_CHANGED, None, None, files))
+
+    return changes
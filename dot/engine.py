@@ -0,0 +1,175 @@
+import os
+import Queue
+import threading
+from collections import namedtuple, deque
+
+import colors
+import output
+from errors import DotError
+
+
+# Outcome of handling a single entry. When the entry failed, outcome is
+# 'error' and error holds the message
+Result = namedtuple('Result', ['name', 'outcome', 'error'])
+
+# Queue.get() without a timeout can't be interrupted with ctrl-c, so wait in
+# long intervals instead
+_WAIT_TIMEOUT = 60 * 60 * 24
+
+
+def _normalize(path):
+    """
+    Normalize a path from the .dotconfig file to an absolute path relative to
+    the home folder
+    """
+    return os.path.normpath("/" + path.lstrip("/"))
+
+
+def build_dependency_graph(entries):
+    """
+    Build the parent/child relations between the entries. The parent of an
+    entry is the entry with the nearest tracked path above it, e.g. '.config'
+    is the parent of '.config/nvim'. Returns a dict with the parent of every
+    entry (None for top level entries) and a dict with the children of every
+    entry.
+    """
+    by_path = {}
+    for name, path in entries.iteritems():
+        by_path[_normalize(path)] = name
+
+    parents = {}
+    children = dict((name, []) for name in entries)
+
+    for name, path in entries.iteritems():
+        parent = None
+        current = _normalize(path)
+
+        while current != "/":
+            current = os.path.dirname(current)
+            if current in by_path:
+                parent = by_path[current]
+                break
+
+        parents[name] = parent
+        if parent is not None:
+            children[parent].append(name)
+
+    return parents, children
+
+
+def _call(func, name, path):
+    """
+    Run func for a single entry and turn any failure into an error result, so
+    one entry can't abort the others
+    """
+    try:
+        return Result(name, func(name, path), None)
+    except SystemExit as e:
+        return Result(name, 'error', str(e.code))
+    except DotError as e:
+        return Result(name, 'error', colors.yellow("[ERROR]") + " %s" % e)
+    except Exception as e:
+        return Result(name, 'error', "%s: %s" % (e.__class__.__name__, e))
+
+
+def run_entries(entries, func, jobs=1):
+    """
+    Call func(name, path) for every entry, using at most jobs threads. An
+    entry is only started after its parent entry has finished. Returns the
+    list of results in the order the entries finished.
+    """
+    parents, children = build_dependency_graph(entries)
+    roots = sorted(name for name in entries if parents[name] is None)
+    results = []
+
+    if jobs <= 1 or len(entries) <= 1:
+        ready = deque(roots)
+        while ready:
+            name = ready.popleft()
+            results.append(_call(func, name, entries[name]))
+            ready.extend(sorted(children[name]))
+        return results
+
+    tasks = Queue.Queue()
+    done = Queue.Queue()
+
+    # The workers write output like the thread that started them
+    silenced = output.is_silenced()
+
+    def worker():
+        output.silence(silenced)
+
+        while True:
+            name = tasks.get()
+            if name is None:
+                return
+            done.put(_call(func, name, entries[name]))
+
+    threads = []
+    for _ in range(min(jobs, len(entries))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for name in roots:
+        tasks.put(name)
+
+    for _ in range(len(entries)):
+        result = done.get(True, _WAIT_TIMEOUT)
+        results.append(result)
+        for child in sorted(children[result.name]):
+            tasks.put(child)
+
+    for thread in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def map_jobs(func, items, jobs=1):
+    """
+    Call func for every item with at most jobs threads, returns the results in
+    the order of the items. The first exception raised by func is raised
+    again once all items are done.
+    """
+    items = list(items)
+
+    if jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    tasks = Queue.Queue()
+    for position, item in enumerate(items):
+        tasks.put((position, item))
+
+    results = [None] * len(items)
+    errors = []
+    silenced = output.is_silenced()
+
+    def worker():
+        output.silence(silenced)
+
+        while True:
+            try:
+                position, item = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[position] = func(item)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(jobs, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return results
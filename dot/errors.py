@@ -0,0 +1,35 @@
+class DotError(Exception):
+    """
+    Base class of the errors raised by dot. The command line turns them into
+    an exit with the message, see main.run_command(), DotRepository passes
+    them on.
+    """
+
+
+class ConfigError(DotError):
+    """
+    The config or the dotfiles folder can't be read, parsed or written
+    """
+
+
+class EntryError(DotError):
+    """
+    An entry can't be added or removed, e.g. its name is unknown or its path
+    is tracked already. When there are several problems they're kept in
+    problems.
+    """
+
+    def __init__(self, message, problems=None):
+        DotError.__init__(self, message)
+        self.problems = problems or [message]
+
+
+class ConflictError(DotError):
+    """
+    Planning found conflicts, nothing was changed. The conflicting actions
+    are kept in actions.
+    """
+
+    def __init__(self, message, actions):
+        DotError.__init__(self, message)
+        self.actions = actions
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+from collections import namedtuple
+
+import colors
+import output
+
+
+# Outcome of linking the entries of a single home folder. results holds the
+# engine results of the entries that were changed, error the message when
+# the home as a whole failed
+HomeResult = namedtuple('HomeResult', [
+    'home', 'linked', 'results', 'duration', 'error'])
+
+# Files in the way are backed up in this folder of the home they're in, the
+# owner of the home can't write in the backup folder of the dotfiles
+BACKUP_DIR = "/.dotbackup"
+
+# The manifest of the entries linked in a home, like the one of 'dot diff' in
+# the dotfiles folder
+MANIFEST_FILE = "/.dotmanifest"
+
+# The entries every worker links, set once per worker process
+_entries = {}
+
+
+def read_homes(lines):
+    """
+    Read the home folders from a file, one per line. Empty lines and lines
+    starting with # are skipped.
+    """
+    homes = []
+
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            homes.append(line)
+
+    return homes
+
+
+def _init_worker(entries):
+    global _entries
+
+    _entries = entries
+
+    # The workers have no one to show their notices to, the parent reports
+    # the results of every home
+    output.start(quiet_mode=True, stream=output.Discard())
+
+
+def _inside(path, folder):
+    return path == folder or path.startswith(folder + "/")
+
+
+def _link(home, start):
+    """
+    Link the entries in a home folder with the rights of the running
+    process. Entries of which the folder resolves to outside of the home,
+    through a symlink for example, are refused.
+    """
+    import engine
+    import state
+    import status
+
+    real_home = os.path.realpath(home)
+
+    statuses = status.check_entries(_entries, 1, home)
+    broken = [entry for entry in statuses
+              if entry.state != status.LINKED and
+              os.path.lexists(entry.expected)]
+
+    refused = [entry for entry in broken if not _inside(
+        os.path.realpath(os.path.dirname(entry.origin)), real_home)]
+    broken = [entry for entry in broken if entry not in refused]
+
+    results = status.fix(broken, 1, home, backup_path=home + BACKUP_DIR)
+
+    # Every home has its own manifest, its owner can't write in the dotfiles
+    # folder
+    state.record_run(_entries, _entries, 1, home, path=home + MANIFEST_FILE)
+    results.extend(engine.Result(entry.name, 'error',
+                                 "%s is outside of the home" % entry.path)
+                   for entry in refused)
+
+    linked = len([entry for entry in statuses
+                  if entry.state == status.LINKED]) + \
+        len([result for result in results if not result.error])
+
+    return HomeResult(home, linked, results, time.time() - start, None)
+
+
+def _drop_privileges(st):
+    """
+    Switch the process to the owner of a file, with the groups of that user
+    """
+    import pwd
+
+    try:
+        os.initgroups(pwd.getpwuid(st.st_uid).pw_name, st.st_gid)
+    except KeyError:
+        os.setgroups([st.st_gid])
+
+    os.setgid(st.st_gid)
+    os.setuid(st.st_uid)
+
+
+def _link_as_owner(home, home_st, start):
+    """
+    Link the entries in a home folder in a child process that runs as the
+    owner of the home, so dot never follows a symlink of that user or writes
+    in their home with more rights than they have. The result is passed
+    back through a pipe.
+    """
+    import cPickle
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            try:
+                _drop_privileges(home_st)
+                result = _link(home, start)
+            except SystemExit as e:
+                result = HomeResult(home, 0, [], time.time() - start,
+                                    str(e.code))
+            except Exception as e:
+                result = HomeResult(home, 0, [], time.time() - start,
+                                    "%s: %s" % (e.__class__.__name__, e))
+
+            with os.fdopen(write_fd, "wb") as pipe:
+                cPickle.dump(result, pipe, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            # Leave without running the handlers or flushing the buffers of
+            # the parent
+            os._exit(0)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+
+    if not data:
+        return HomeResult(home, 0, [], time.time() - start,
+                          "the worker of the home stopped without a result")
+    return cPickle.loads(data)
+
+
+def link_home(home):
+    """
+    Link the entries in a single home folder to the dotfiles folder. Files in
+    the way are backed up in the home, in ~/.dotbackup, entries of which the
+    file isn't in the dotfiles folder are skipped, files are never imported
+    from the homes. When dot runs as root the work is done as the owner of
+    the home. Never raises, a failure is returned in the result.
+    """
+    start = time.time()
+
+    try:
+        home_st = os.stat(home)
+
+        if os.geteuid() == 0 and home_st.st_uid != 0:
+            return _link_as_owner(home, home_st, start)
+        return _link(home, start)
+    except SystemExit as e:
+        return HomeResult(home, 0, [], time.time() - start, str(e.code))
+    except Exception as e:
+        return HomeResult(home, 0, [], time.time() - start,
+                          "%s: %s" % (e.__class__.__name__, e))
+
+
+def link_homes(entries, homes, jobs=1):
+    """
+    Link the entries in every home folder, with a pool of at most jobs
+    processes. The results are yielded as soon as a home is done, so a slow
+    home doesn't hold back the report of the others.
+    """
+    global _entries
+
+    if jobs <= 1 or len(homes) <= 1:
+        _entries = entries
+
+        for home in homes:
+            # Only the result of the home is reported, like with a pool
+            quiet = output.quiet
+            output.quiet = True
+            try:
+                result = link_home(home)
+            finally:
+                output.quiet = quiet
+            yield result
+        return
+
+    import multiprocessing
+
+    pool = multiprocessing.Pool(min(jobs, len(homes)), _init_worker,
+                                (entries,))
+    try:
+        for result in pool.imap_unordered(link_home, homes):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def apply_homes(entries, homes, jobs=1):
+    """
+    Link the entries in every home folder and report the result of every
+    home and the total throughput. Exits when any home failed.
+    """
+    start = time.time()
+    found = []
+
+    # The output of the parent is stopped while the workers are forked, so
+    # they don't inherit its buffer
+    output.flush()
+
+    for result in link_homes(entries, homes, jobs):
+        found.append(result)
+
+        failed = [item for item in result.results if item.error]
+
+        if result.error:
+            output.error("%s: %s" % (result.home, result.error))
+        for item in failed:
+            output.error("%s: %s (%s)" % (result.home, item.error,
+                                          item.name))
+        output.line(colors.green("[HOME]") + " %s: %d linked, %d changed, "
+                    "%d failed in %.3fs" % (
+                        result.home, result.linked, len(result.results),
+                        len(failed) + bool(result.error), result.duration))
+        output.event("home", home=result.home, linked=result.linked,
+                     changed=len(result.results),
+                     failed=len(failed), error=result.error,
+                     duration=round(result.duration, 6))
+        output.record("failed" if result.error or failed else "converged")
+
+    duration = time.time() - start
+    linked = sum(result.linked for result in found)
+
+    output.line(colors.blue("[NOTICE]") + " %d homes, %d links in %.3fs "
+                "(%.1f homes/s, %.1f links/s)" % (
+                    len(found), linked, duration,
+                    len(found) / max(duration, 1e-6),
+                    linked / max(duration, 1e-6)))
+    output.event("fleet", homes=len(found), linked=linked,
+                 duration=round(duration, 6))
+
+    failed = [result for result in found
+              if result.error or any(item.error for item in result.results)]
+
+    if failed:
+        sys.exit(colors.yellow("[ERROR]") + " %d of %d homes failed"
+                 % (len(failed), len(found)))
+
+    return found
@@ -0,0 +1,164 @@
+import os
+import sys
+import subprocess
+
+import colors
+import output
+
+
+GIT = "git"
+
+# Ignored in a dotfiles repository created by 'dot init'
+GITIGNORE = """# Written by dot on every run
+/.dotstate
+/.dotmanifest
+*.tmp
+"""
+
+
+def is_repository():
+    """
+    Check whether the dotfiles folder is a git repository
+    """
+    return os.path.exists(".git")
+
+
+def run_git(args, paths=None):
+    """
+    Run a single git command in the dotfiles folder. The paths are given on
+    stdin, separated by NUL bytes, so any number of paths takes one git
+    process. Returns the exit code and the output of git.
+    """
+    if paths is not None:
+        args = args + ["--pathspec-from-file=-", "--pathspec-file-nul"]
+
+    try:
+        process = subprocess.Popen(
+            [GIT] + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+    except OSError:
+        sys.exit(colors.yellow("[ERROR]") + " git was not found, please "
+                 "install git")
+
+    out, _ = process.communicate("\0".join(paths or []))
+
+    return process.returncode, out
+
+
+def check_git(args, paths=None):
+    """
+    Run a single git command and exit with its output when it fails
+    """
+    code, out = run_git(args, paths)
+
+    if code:
+        sys.exit(colors.yellow("[ERROR]") + " git %s failed: %s"
+                 % (args[0], out.strip()))
+
+    return out
+
+
+def init():
+    """
+    Create a git repository in the dotfiles folder, unless there is one.
+    Returns False when git isn't installed.
+    """
+    if is_repository():
+        return True
+
+    try:
+        code, out = run_git(["init", "-q"])
+    except SystemExit:
+        return False
+
+    if code:
+        return False
+
+    if not os.path.exists(".gitignore"):
+        gitignore = open(".gitignore", 'w')
+        gitignore.write(GITIGNORE)
+        gitignore.close()
+
+    return True
+
+
+def entry_paths(names):
+    """
+    Get the paths in the repository that belong to the entries
+    """
+    import store
+
+    paths = []
+    for name in names:
+        paths.append("files/" + name)
+        if os.path.exists(store.manifest_path(name)):
+            paths.append(store.manifest_path(name))
+
+    return paths
+
+
+def changed_entries(names):
+    """
+    Get the sorted names of the entries of which git reports uncommitted
+    changes in their files or store manifest, with a single 'git status'
+    """
+    import store
+
+    out = check_git(["status", "--porcelain", "-z", "--", "files/",
+                     store.MANIFESTS_DIR + "/"])
+
+    changed = set()
+    fields = iter(out.split("\0"))
+
+    for field in fields:
+        if len(field) < 4:
+            continue
+
+        # A rename is followed by the path it was renamed from
+        if field[0] in "RC":
+            next(fields, None)
+
+        path = field[3:]
+        if path.startswith("files/"):
+            changed.add(path.split("/")[1])
+        elif path.startswith(store.MANIFESTS_DIR + "/") and \
+                path.endswith(".json"):
+            changed.add(path[len(store.MANIFESTS_DIR) + 1:-len(".json")])
+
+    return sorted(name for name in changed if name in names)
+
+
+def commit_message(names):
+    if len(names) <= 3:
+        return "Update %s" % ", ".join(names)
+    return "Update %d entries" % len(names)
+
+
+def commit(names, message=None):
+    """
+    Stage the files of the changed entries with a single 'git add' and commit
+    only these with a single 'git commit'. Returns False when git had nothing
+    to commit.
+    """
+    paths = entry_paths(names)
+
+    check_git(["add", "-A"], paths)
+
+    code, out = run_git(["commit", "-q", "-m",
+                         message or commit_message(names)], paths)
+
+    if code and "nothing" in out:
+        return False
+
+    if code:
+        sys.exit(colors.yellow("[ERROR]") + " git commit failed: %s"
+                 % out.strip())
+
+    return True
+
+
+def push():
+    """
+    Push the commits with a single 'git push'
+    """
+    check_git(["push", "-q"])
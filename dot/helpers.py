@@ -1,31 +1,69 @@
 import os
 import sys
+import re
 import json
-import shutil
 import colors
+import output
+from index import ConfigIndex
+from errors import ConfigError, EntryError
 
 
-def make_and_move_to_dir(origin, new_dir):
+# Parsed .dotconfig documents, keyed by path. Each value is a tuple of the
+# (inode, mtime, size) signature of the file when it was parsed and the data
+_dotconfig_cache = {}
+
+# Number of times a .dotconfig file was actually read and decoded
+dotconfig_parse_count = 0
+
+# The config data the index was built for and the index itself, by home
+# folder
+_config_indexes = {}
+
+
+def dot_file(path, dot_path=None):
     """
-    Make a new folder when needed and moves files and folders to specified path
+    Get the path of a file or folder in the dotfiles folder, e.g. 'files'.
+    Without dot_path it's relative to the working directory, from which the
+    commands are run.
     """
-    if not os.path.exists(new_dir):
-        print colors.blue("[NOTICE]") + \
-            " creating new folder for: %s" % os.path.basename(new_dir)
+    if dot_path is None:
+        return path
+    return dot_path + "/" + path
 
-        os.mkdir(new_dir)
 
-    print colors.blue("[NOTICE]") + \
-        " moving %s to %s" % (os.path.basename(origin), new_dir)
+def make_and_move_to_dir(origin, new_dir, exists=None):
+    """
+    Make a new folder when needed and moves files and folders to specified path.
+    When it's already known whether new_dir exists, pass it as exists to skip
+    the check.
+    """
+    # Only imported here, most commands never move anything
+    import shutil
+    import move
+
+    if exists is None:
+        exists = os.path.exists(new_dir)
+
+    if not exists:
+        output.notice("creating new folder for: %s" %
+                      os.path.basename(new_dir))
+
+        os.makedirs(new_dir)
+
+    output.notice("moving %s to %s" % (os.path.basename(origin), new_dir))
 
     try:
-        shutil.move(origin, new_dir)
+        stats = move.move(origin, new_dir + "/" + os.path.basename(origin))
     except IOError:
         sys.exit(colors.yellow("[ERROR]") + " not able to find file")
     except shutil.Error:
         sys.exit(colors.yellow("[ERROR]") + " %s already present in %s. "
                  "Please remove the file." % (origin, new_dir))
 
+    if stats.cross_device:
+        output.notice("moved %s across devices: %s" % (
+            os.path.basename(origin), format_throughput(stats)))
+
 
 def create_symlink(origin, new_dir):
     """
@@ -37,14 +75,39 @@ def create_symlink(origin, new_dir):
         src = os.path.abspath(new_dir) + "/" + os.path.basename(origin)
         dst = origin
 
-        print colors.blue("[NOTICE]") + \
-            " creating symlink for: %s to %s" % (os.path.basename(origin), src)
+        output.notice("creating symlink for: %s to %s" %
+                      (os.path.basename(origin), src))
 
         os.symlink(src, dst)
     except OSError:
         sys.exit(colors.yellow("[ERROR]") + " symlinking failed, file exists")
 
 
+def format_bytes(size):
+    """
+    Format a number of bytes for humans
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = "TB"
+
+    if unit == "B":
+        return "%d %s" % (size, unit)
+    return "%.1f %s" % (size, unit)
+
+
+def format_throughput(stats):
+    """
+    Describe how much data a move copied and how fast
+    """
+    return "%s in %.2fs (%s/s)" % (
+        format_bytes(stats.bytes), stats.seconds,
+        format_bytes(stats.bytes / max(stats.seconds, 0.000001)))
+
+
 def check_args(args, expected):
     """
     Check if the list of the arguments is of the correct length
@@ -58,15 +121,66 @@ def check_args(args, expected):
         return True
 
 
-def check_backup_and_files_folders():
+def check_jobs(jobs):
+    """
+    Check if the number of parallel jobs is a positive number and return it
+    """
+    if jobs is None:
+        return 1
+
+    try:
+        jobs = int(jobs)
+    except ValueError:
+        jobs = 0
+
+    if jobs < 1:
+        sys.exit(colors.red("[ERROR]") + " number of jobs should be a "
+                 "positive number, given %r" % jobs)
+
+    return jobs
+
+
+def read_manifest(lines):
+    """
+    Read the name and path pairs of a manifest, one pair separated by a tab or
+    spaces on every line. Empty lines and lines starting with a '#' are
+    skipped.
+    """
+    pairs = []
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if "\t" in line:
+            fields = [field.strip() for field in line.split("\t")]
+        else:
+            fields = line.split(None, 1)
+
+        if len(fields) != 2 or not all(fields):
+            sys.exit(colors.red("[ERROR]") + " expected a name and a path "
+                     "on line %d of the manifest" % number)
+
+        pairs.append((fields[0], os.path.expanduser(fields[1])))
+
+    if not pairs:
+        sys.exit(colors.red("[ERROR]") + " no entries found in the manifest")
+
+    return pairs
+
+
+def check_backup_and_files_folders(dot_path=None):
     """
-    Check if the backup and files folders are present
+    Check if the backup and files folders are present, in dot_path or else
+    in the dotfiles folder of the config
     """
-    if not os.path.exists(get_dot_path() + "/backup") or \
-            not os.path.exists(get_dot_path() + "/files"):
-        sys.exit(colors.blue("[NOTICE]") +
-                 " no backup and/or files folder found, please run the"
-                 " command 'dot init'")
+    dot_path = dot_path or get_dot_path()
+
+    if not os.path.exists(dot_path + "/backup") or \
+            not os.path.exists(dot_path + "/files"):
+        raise ConfigError("no backup and/or files folder found, please run "
+                          "the command 'dot init'")
     else:
         return True
 
@@ -78,6 +192,9 @@ def create_config_file():
 
     config_location = os.path.expanduser("~") + "/.dotconfig"
 
+    if not isinstance(get_config_backend(), JsonConfig):
+        return True
+
     if not os.path.exists(config_location):
         data = """
         {
@@ -92,27 +209,68 @@ def create_config_file():
             dotconfig.close()
             return True
         except IOError:
-            sys.exit(
-                colors.yellow("[ERROR]") + " not able to write to data file")
+            raise ConfigError("not able to write to data file")
     else:
         return True
 
 
+def _dotconfig_signature(path):
+    """
+    Return the (inode, mtime, size) signature of the file located at path, or
+    None when the file can't be stat'ed
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return (st.st_ino, st.st_mtime, st.st_size)
+
+
+def clear_dotconfig_cache(path=None):
+    """
+    Drop the cached .dotconfig data for path, or for every path when no path
+    is given
+    """
+    if path is None:
+        _dotconfig_cache.clear()
+    else:
+        _dotconfig_cache.pop(os.path.abspath(path), None)
+
+
 def get_dotconfig(path=None):
     """
     Get the data from the .dotconfig file
+
+    The parsed data is cached per process and is only read again when the
+    inode, modification time or size of the file changes. Callers that
+    modify the returned data are expected to persist it with set_dotconfig().
     """
+    global dotconfig_parse_count
+
     if not path:
         path = os.path.expanduser("~") + "/.dotconfig"
 
+    key = os.path.abspath(path)
+    signature = _dotconfig_signature(key)
+
+    cached = _dotconfig_cache.get(key)
+    if signature is not None and cached and cached[0] == signature:
+        return cached[1]
+
     try:
         data_file = open(path)
         data = json.load(data_file)
         data_file.close()
     except IOError:
-        sys.exit(colors.yellow("[ERROR]") + " not able to find data file")
+        raise ConfigError("not able to find data file")
     except ValueError:
-        sys.exit(colors.yellow("[ERROR]") + " not able to parse data file")
+        raise ConfigError("not able to parse data file")
+
+    dotconfig_parse_count += 1
+
+    if signature is not None:
+        _dotconfig_cache[key] = (signature, data)
 
     return data
 
@@ -124,26 +282,471 @@ def set_dotconfig(data, path=None):
     if not path:
         path = os.path.expanduser("~") + "/.dotconfig"
 
+    clear_dotconfig_cache(path)
+
     try:
         write_data = json.dumps(data, sort_keys=True, indent=4)
         data_file = open(path, 'w')
         data_file.write(write_data)
         data_file.close()
     except IOError:
-        sys.exit(colors.yellow("[ERROR]") + " not able to write to data file")
+        raise ConfigError("not able to write to data file")
+
+    # the data that was just written is what the file holds now
+    signature = _dotconfig_signature(path)
+    if signature is not None:
+        _dotconfig_cache[os.path.abspath(path)] = (signature, data)
+
+
+class JsonConfig(object):
+    """
+    The .dotconfig file as a single JSON document, every change rewrites the
+    whole file
+    """
+
+    def __init__(self, path=None, home=None):
+        self.path = path
+        self.home = home
+
+    def load(self):
+        return get_dotconfig(self.path)
+
+    def save(self, data):
+        set_dotconfig(data, self.path)
+
+    def update_files(self, added=None, removed=()):
+        data = self.load()
+        index = get_index(data, self.home)
+
+        for name in removed:
+            index.remove(name)
+        for name, path in (added or {}).iteritems():
+            index.add(name, path)
+
+        self.save(data)
+
+    def set_dot_path(self, path):
+        data = self.load()
+
+        try:
+            data.update({'dot_path': path})
+        except AttributeError:
+            raise ConfigError("not able to update .dotconfig file. Check the "
+                              "integrity of the file.")
+
+        self.save(data)
+
+
+class SqliteConfig(object):
+    """
+    The config in an SQLite database, every change only writes the rows of
+    the entries involved
+    """
+
+    def __init__(self, path, home=None):
+        self.path = path
+        self.home = home
+        self.connection = None
+        self.data = None
+        self.data_version = None
+
+    def _connect(self):
+        if self.connection is not None:
+            return self.connection
+
+        import sqlite3
+
+        try:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    name TEXT PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tags (
+                    name TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (name, tag)
+                );
+            """)
+        except sqlite3.Error:
+            self.connection = None
+            raise ConfigError("not able to open data file %s" % self.path)
+
+        return self.connection
+
+    def _write(self, statements):
+        """
+        Run the statements in a single transaction
+        """
+        import sqlite3
+
+        connection = self._connect()
+
+        try:
+            with connection:
+                for statement, params in statements:
+                    connection.execute(statement, params)
+        except sqlite3.IntegrityError as e:
+            raise ConfigError("not able to update data file, %s" % e)
+        except sqlite3.Error:
+            raise ConfigError("not able to write to data file")
+
+    def load(self):
+        connection = self._connect()
+
+        # data_version changes when another connection modified the database
+        data_version = connection.execute("PRAGMA data_version").fetchone()
+        if self.data is not None and data_version == self.data_version:
+            return self.data
+
+        dot_path = connection.execute(
+            "SELECT value FROM settings WHERE key = 'dot_path'").fetchone()
+
+        self.data = {
+            "files": dict(connection.execute("SELECT name, path FROM files")),
+            "dot_path": dot_path[0] if dot_path else "",
+        }
+
+        tags = {}
+        for name, tag in connection.execute(
+                "SELECT name, tag FROM tags ORDER BY name, tag"):
+            tags.setdefault(name, []).append(tag)
+        if tags:
+            self.data["tags"] = tags
+        self.data_version = data_version
+
+        return self.data
+
+    def save(self, data):
+        statements = [("DELETE FROM files", ())]
+        statements.extend(
+            ("INSERT INTO files (name, path) VALUES (?, ?)", item)
+            for item in data['files'].iteritems())
+        statements.append((
+            "INSERT OR REPLACE INTO settings (key, value) "
+            "VALUES ('dot_path', ?)", (data.get('dot_path') or "",)))
+        statements.append(("DELETE FROM tags", ()))
+        statements.extend(
+            ("INSERT INTO tags (name, tag) VALUES (?, ?)", (name, tag))
+            for name, tags in (data.get('tags') or {}).iteritems()
+            for tag in tags)
+
+        self.data = None
+        self._write(statements)
+
+    def update_files(self, added=None, removed=()):
+        added = added or {}
+
+        # an entry that is replaced is deleted first, so a path tracked under
+        # another name still violates the unique constraint
+        statements = [("DELETE FROM files WHERE name = ?", (name,))
+                      for name in list(removed) + added.keys()]
+        statements.extend(("DELETE FROM tags WHERE name = ?", (name,))
+                          for name in removed)
+        statements.extend(
+            ("INSERT INTO files (name, path) VALUES (?, ?)", item)
+            for item in added.iteritems())
+
+        self._write(statements)
+
+        # keep the loaded data and its index in line with the database
+        if self.data is not None:
+            index = get_index(self.data, self.home)
+            for name in removed:
+                index.remove(name)
+            for name, path in added.iteritems():
+                index.add(name, path)
+
+    def set_dot_path(self, path):
+        self._write([(
+            "INSERT OR REPLACE INTO settings (key, value) "
+            "VALUES ('dot_path', ?)", (path,))])
+
+        if self.data is not None:
+            self.data['dot_path'] = path
+
+
+# A percent-escaped character in the file name of a shard. urllib isn't used
+# to unescape them, importing it takes longer than starting dot
+_ESCAPED = re.compile("%([0-9A-Fa-f]{2})")
+
+
+def _shard_filename(name):
+    """
+    Get the file name of the shard of an entry. A %, a / and a leading . are
+    percent-escaped, so every name is a single file in the folder and never
+    a hidden one like the root shard.
+    """
+    if not name:
+        raise EntryError("an entry needs a name")
+
+    filename = name.replace("%", "%25").replace("/", "%2F")
+    if filename.startswith("."):
+        filename = "%2E" + filename[1:]
+    return filename + ".json"
+
+
+def _shard_name(filename):
+    """
+    Get the name of the entry of a shard, None for files that aren't shards
+    of an entry
+    """
+    if filename.startswith(".") or not filename.endswith(".json"):
+        return None
+    return _ESCAPED.sub(lambda match: chr(int(match.group(1), 16)),
+                        filename[:-len(".json")])
 
 
-def get_dot_path():
+class ShardedConfig(object):
+    """
+    The config as a folder with a small JSON file per entry, <name>.json
+    with its path and tags, and a .root.json file with the dot path. Every
+    change only writes the files of the entries involved, so configs of
+    different machines merge without conflicts.
+    """
+
+    ROOT = ".root.json"
+
+    def __init__(self, path, home=None):
+        self.path = path
+        self.home = home
+        self.data = None
+        self.signature = None
+
+    def _signature(self):
+        # Every shard is written with a rename, which changes the folder
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime)
+
+    def _read(self, filename):
+        try:
+            shard = open(self.path + "/" + filename)
+            try:
+                return json.load(shard)
+            finally:
+                shard.close()
+        except IOError:
+            raise ConfigError("not able to read %s/%s" % (self.path, filename))
+        except ValueError:
+            raise ConfigError("not able to parse %s/%s"
+                              % (self.path, filename))
+
+    def _write(self, filename, content):
+        """
+        Write a shard to a temporary file and rename it, so it's never left
+        half written
+        """
+        path = self.path + "/" + filename
+
+        try:
+            shard = open(path + ".tmp", 'w')
+            shard.write(json.dumps(content, sort_keys=True, indent=4) + "\n")
+            shard.close()
+            os.rename(path + ".tmp", path)
+        except (IOError, OSError):
+            raise ConfigError("not able to write to %s" % path)
+
+    def _remove(self, name):
+        try:
+            os.unlink(self.path + "/" + _shard_filename(name))
+        except OSError:
+            pass
+
+    def _write_entry(self, name, path, tags=None):
+        content = {"path": path}
+        if tags:
+            content["tags"] = tags
+        self._write(_shard_filename(name), content)
+
+    def load(self):
+        signature = self._signature()
+        if self.data is not None and signature == self.signature:
+            return self.data
+
+        try:
+            filenames = os.listdir(self.path)
+        except OSError:
+            raise ConfigError("not able to read %s" % self.path)
+
+        files = {}
+        tags = {}
+
+        for filename in filenames:
+            name = _shard_name(filename)
+            if name is None:
+                continue
+
+            content = self._read(filename)
+            files[name] = content["path"]
+            if content.get("tags"):
+                tags[name] = content["tags"]
+
+        root = self._read(self.ROOT) if self.ROOT in filenames else {}
+
+        self.data = {"files": files, "dot_path": root.get("dot_path", "")}
+        if tags:
+            self.data["tags"] = tags
+        self.signature = signature
+
+        return self.data
+
+    def save(self, data):
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+
+        tags = data.get('tags') or {}
+        for name, path in data['files'].iteritems():
+            self._write_entry(name, path, tags.get(name))
+
+        for filename in os.listdir(self.path):
+            name = _shard_name(filename)
+            if name is not None and name not in data['files']:
+                self._remove(name)
+
+        self._write(self.ROOT, {"dot_path": data.get('dot_path') or ""})
+        self.data = None
+
+    def update_files(self, added=None, removed=()):
+        added = added or {}
+        data = self.load()
+        tags = data.get('tags') or {}
+
+        for name in removed:
+            self._remove(name)
+        for name, path in added.iteritems():
+            self._write_entry(name, path, tags.get(name))
+
+        # keep the loaded data and its index in line with the shards
+        index = get_index(data, self.home)
+        for name in removed:
+            index.remove(name)
+        for name, path in added.iteritems():
+            index.add(name, path)
+        self.signature = self._signature()
+
+    def set_dot_path(self, path):
+        data = self.load()
+        self._write(self.ROOT, {"dot_path": path})
+
+        data['dot_path'] = path
+        self.signature = self._signature()
+
+
+# Config backends that are in use, keyed by path
+_config_backends = {}
+
+
+def get_config_backend(home=None, path=None):
+    """
+    Get the backend that holds the config of the home folder, the one of the
+    user when it's None. When there is a ~/.dotconfig.db database it's used,
+    otherwise the ~/.dotconfig.d folder when there is one and else the
+    ~/.dotconfig JSON file. A config at another path is given with path, a
+    folder is read as a ~/.dotconfig.d folder and a .db file as a database.
+    """
+    if path is not None:
+        if os.path.isdir(path):
+            return get_sharded_config(home, path)
+        if path.endswith(".db"):
+            return get_sqlite_config(home, path)
+        return JsonConfig(path, home)
+
+    folder = home or os.path.expanduser("~")
+
+    if os.path.isfile(folder + "/.dotconfig.db"):
+        return get_sqlite_config(home)
+
+    if os.path.isdir(folder + "/.dotconfig.d"):
+        return get_sharded_config(home)
+
+    if home is None:
+        return JsonConfig()
+    return JsonConfig(home + "/.dotconfig", home)
+
+
+def get_sqlite_config(home=None, path=None):
+    """
+    Get the backend for the ~/.dotconfig.db database, or the one at path, the
+    database is created when it doesn't exist yet
+    """
+    database = path or (home or os.path.expanduser("~")) + "/.dotconfig.db"
+
+    if database not in _config_backends:
+        _config_backends[database] = SqliteConfig(database, home)
+    return _config_backends[database]
+
+
+def get_sharded_config(home=None, path=None):
+    """
+    Get the backend for the ~/.dotconfig.d folder, or the one at path, the
+    folder is created by the first save()
+    """
+    folder = path or (home or os.path.expanduser("~")) + "/.dotconfig.d"
+
+    if folder not in _config_backends:
+        _config_backends[folder] = ShardedConfig(folder, home)
+    return _config_backends[folder]
+
+
+def load_config(backend=None):
+    """
+    Get the data of the config, whatever the backend, the one of the user by
+    default
+    """
+    return (backend or get_config_backend()).load()
+
+
+def get_index(data=None, home=None):
+    """
+    Get the index over the tracked entries of the config, with the paths
+    relative to home, the home folder of the user when it's None. The index
+    is built once for the loaded config data and kept up to date by
+    update_files().
+    """
+    if data is None:
+        data = load_config()
+
+    home = home or os.path.expanduser("~")
+    cached = _config_indexes.get(home)
+    if cached is not None and cached[0] is data:
+        return cached[1]
+
+    index = ConfigIndex(data['files'], home=home, tags=data.get('tags'))
+    _config_indexes[home] = (data, index)
+
+    return index
+
+
+def update_files(added=None, removed=()):
+    """
+    Add or replace the entries in added and remove the names in removed from
+    the config
+    """
+    get_config_backend().update_files(added, removed)
+
+
+def get_dot_path(data=None, home=None):
     """
     Get the path of where the dotfiles are located. This is the location of the
-    files and backup folders.
+    files and backup folders. It's taken from the config data, the one of the
+    user by default, and is relative to home, the home folder of the user by
+    default.
     """
-    data = get_dotconfig()
+    if data is None:
+        data = load_config()
 
-    if not data['dot_path']:
-        sys.exit(colors.yellow("[ERROR]") + " path not found in config file")
+    if not data.get('dot_path'):
+        raise ConfigError("path not found in config file")
 
-    return (os.path.expanduser("~") + data['dot_path'])
+    return (home or os.path.expanduser("~")) + data['dot_path']
 
 
 def set_dot_path(path):
@@ -151,14 +754,6 @@ def set_dot_path(path):
     Set the path of where the dotfiles are located. This will be the location
     of the files and backup folders.
     """
-    data = get_dotconfig()
-
-    try:
-        data.update({'dot_path': path})
-    except AttributeError:
-        sys.exit(colors.yellow("[ERROR]") + " not able to update .dotconfig"
-                               "file. Check if the integrity of the file.")
-
-    set_dotconfig(data)
+    get_config_backend().set_dot_path(path)
 
-    print colors.blue("[NOTICE]") + " set %s as path in .dotconfig" % path
+    output.notice("set %s as path in .dotconfig" % path)
@@ -0,0 +1,223 @@
+import os
+import re
+import bisect
+import fnmatch
+
+_WILDCARD = re.compile(r"[*?[]")
+
+
+def _literal(pattern):
+    """
+    Get the part of a glob pattern before its first wildcard
+    """
+    return _WILDCARD.split(pattern, 1)[0]
+
+
+class ConfigIndex(object):
+    """
+    Index over the tracked entries of the config that maps names to paths and
+    paths to names. Paths are compared in their canonical form, see
+    canonical(). Changes should go through add() and remove(), which update
+    the files of the config and the index together.
+    """
+
+    def __init__(self, files, home=None, tags=None):
+        self.files = files
+        self.tags = tags if tags is not None else {}
+        self.home = home or os.path.expanduser("~")
+        self.real_home = os.path.realpath(self.home)
+
+        # realpath of the folders seen so far, most entries share a folder
+        self._real_dirs = {}
+
+        self.by_path = {}
+        for name, path in sorted(files.iteritems()):
+            self.by_path.setdefault(self._canonical_entry(path), name)
+
+        # The names in sorted order, to find names by prefix with a binary
+        # search. Built on first use, most commands never need it.
+        self._names = None
+
+        # tag -> names with that tag
+        self.by_tag = {}
+        for name, entry_tags in self.tags.iteritems():
+            for tag in entry_tags:
+                self.by_tag.setdefault(tag, set()).add(name)
+
+    def _resolve(self, path):
+        """
+        Get a path absolute with the folders resolved, but not the last part
+        of the path, as tracked paths are symlinks themselves
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        dirname, basename = os.path.split(path)
+
+        real_dir = self._real_dirs.get(dirname)
+        if real_dir is None:
+            real_dir = self._real_dirs[dirname] = os.path.realpath(dirname)
+
+        return os.path.join(real_dir, basename)
+
+    def _in_home(self, path):
+        """
+        Get a resolved path relative to the home folder, or None when it's not
+        in there
+        """
+        for prefix in (self.real_home, self.home):
+            if path.startswith(prefix.rstrip("/") + "/"):
+                return path[len(prefix.rstrip("/")):]
+
+        return None
+
+    def canonical(self, path):
+        """
+        Get the canonical form of a path: absolute, with the folders resolved
+        and relative to the home folder when it's in there. The last part of
+        the path isn't resolved, as tracked paths are symlinks themselves.
+        """
+        path = self._resolve(path)
+        relative = self._in_home(path)
+
+        return path if relative is None else relative
+
+    def home_path(self, path):
+        """
+        Get the canonical form of a path as it's stored in the config,
+        relative to the home folder, or None when the path isn't in the home
+        folder
+        """
+        return self._in_home(self._resolve(path))
+
+    def _canonical_entry(self, path):
+        """
+        Get the canonical form of a path as it's stored in the config
+        """
+        return self.canonical(self.home + "/" + path.lstrip("/"))
+
+    def name_for(self, path):
+        """
+        Get the name under which a path is tracked, or None
+        """
+        return self.by_path.get(self.canonical(path))
+
+    def path_for(self, name):
+        """
+        Get the path that is tracked under a name, or None
+        """
+        return self.files.get(name)
+
+    def add(self, name, path):
+        """
+        Track path, relative to the home folder, under name
+        """
+        if name in self.files:
+            self.remove(name)
+
+        self.files[name] = path
+        self.by_path.setdefault(self._canonical_entry(path), name)
+
+        if self._names is not None:
+            bisect.insort(self._names, name)
+
+    def remove(self, name):
+        """
+        Stop tracking the path under name
+        """
+        path = self.files.pop(name)
+        canonical = self._canonical_entry(path)
+
+        if self.by_path.get(canonical) == name:
+            del self.by_path[canonical]
+
+        if self._names is not None:
+            del self._names[bisect.bisect_left(self._names, name)]
+
+        for tag in self.tags.pop(name, ()):
+            self.by_tag[tag].discard(name)
+
+    def names(self):
+        """
+        Get all the names in sorted order
+        """
+        if self._names is None:
+            self._names = sorted(self.files)
+        return self._names
+
+    def names_with_prefix(self, prefix):
+        """
+        Get the names that start with prefix in sorted order. Only the names
+        with the prefix are looked at, they're found with a binary search.
+        """
+        names = self.names()
+        start = bisect.bisect_left(names, prefix)
+
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+
+        return names[start:end]
+
+    def match(self, pattern):
+        """
+        Get the names that match the glob pattern. Only the names starting
+        with the part of the pattern before its first wildcard are matched.
+        """
+        return [name for name in self.names_with_prefix(_literal(pattern))
+                if fnmatch.fnmatchcase(name, pattern)]
+
+    def select(self, only=None, tags=None, exclude=None):
+        """
+        Get the names selected by glob patterns and tags: the names matching
+        one of the patterns in only or having one of the tags, without the
+        ones matching or tagged with one of exclude. Without only and tags
+        every name is selected.
+        """
+        if only or tags:
+            selected = set()
+            for pattern in only or ():
+                selected.update(self.match(pattern))
+            for tag in tags or ():
+                selected.update(self.by_tag.get(tag, ()))
+        else:
+            selected = set(self.files)
+
+        for pattern in exclude or ():
+            selected.difference_update(self.match(pattern))
+            selected.difference_update(self.by_tag.get(pattern, ()))
+
+        return selected
+
+    def find(self, prefix=None, pattern=None, under=None):
+        """
+        Get the names in sorted order that start with prefix, match the glob
+        pattern and of which the path is in the folder under. Any filter that
+        is None is left out. Like match(), only the names starting with the
+        part of the pattern before its first wildcard are matched.
+        """
+        prefix = prefix or ""
+
+        if pattern is not None:
+            literal = _literal(pattern)
+            if literal.startswith(prefix):
+                prefix = literal
+            elif not prefix.startswith(literal):
+                return []
+
+        if prefix:
+            names = self.names_with_prefix(prefix)
+        else:
+            names = self.names()
+
+        if pattern is not None:
+            names = [name for name in names
+                     if fnmatch.fnmatchcase(name, pattern)]
+
+        if under is not None:
+            # The folder itself is resolved too, unlike a tracked path
+            folder = self.canonical(os.path.realpath(
+                os.path.expanduser(under))).rstrip("/") + "/"
+            names = [name for name in names
+                     if (self._canonical_entry(self.files[name]) +
+                         "/").startswith(folder)]
+
+        return list(names)
@@ -1,79 +1,275 @@
 import os
 import sys
-import shutil
+import json
 import colors
+import output
 import helpers
+from errors import DotError, EntryError, ConflictError
 
+# The other modules of dot are imported by the commands that need them, as
+# dot is often run at login where every import counts
+
+# The commands known to dispatch()
+COMMANDS = ("init", "add", "rm", "list", "which", "import-json",
+            "export-json", "plan", "apply", "watch", "store", "fsck",
+            "backup", "status", "verify", "commit", "push", "diff")
+
+
+def run_command(cmd, args, options=None):
+    options = options or {}
+    profile_path = os.environ.get("DOT_PROFILE")
+    show_timings = options.get('--timings')
+
+    if show_timings:
+        import timings
+        timings.enable()
+
+    output_format = options.get('--format') or "text"
+
+    if output_format not in output.FORMATS:
+        sys.exit(colors.red("[ERROR]") + " format should be one of: %s"
+                 % ", ".join(output.FORMATS))
+
+    output.start(quiet_mode=options.get('--quiet', False),
+                 summary_mode=options.get('--summary', False),
+                 output_format=output_format)
+
+    try:
+        if profile_path:
+            import timings
+            timings.profile(profile_path, dispatch, cmd, args, options)
+        else:
+            dispatch(cmd, args, options)
+    except DotError as e:
+        output.event("error", message=str(e))
+        exit_on_error(e)
+    except SystemExit as e:
+        if isinstance(e.code, basestring):
+            output.event("error", message=e.code)
+        raise
+    finally:
+        output.finish()
+
+        if show_timings:
+            timings.report()
+
+
+def dispatch(cmd, args, options):
+    jobs = helpers.check_jobs(options.get('--jobs'))
+    selectors = get_selectors(options)
 
-def run_command(cmd, args):
     if not cmd:
-        run()
+        run(jobs=jobs, incremental=options.get('--incremental', False),
+            selectors=selectors)
 
     elif cmd == "init":
         init()
 
     elif cmd == "add":
-        add(args)
+        add(args, jobs=jobs)
 
     elif cmd == "rm":
-        remove(args)
+        remove(args, jobs=jobs)
 
     elif cmd == "list":
-        show_list()
+        show_list(args)
+
+    elif cmd == "which":
+        which(args)
+
+    elif cmd == "import-json":
+        import_json(args)
+
+    elif cmd == "export-json":
+        export_json(args)
+
+    elif cmd == "plan":
+        show_plan(selectors)
+
+    elif cmd == "apply":
+        apply_plan(args, jobs=jobs, selectors=selectors)
+
+    elif cmd == "watch":
+        import watch
+        watch.watch(jobs=jobs)
+
+    elif cmd == "store":
+        store_files(args)
+
+    elif cmd == "fsck":
+        fsck(args)
+
+    elif cmd == "backup":
+        backups(args)
+
+    elif cmd in ("status", "verify"):
+        check_status(args, jobs=jobs, selectors=selectors)
+
+    elif cmd == "commit":
+        commit(args, jobs=jobs)
+
+    elif cmd == "diff":
+        show_diff(args, jobs=jobs, selectors=selectors)
+
+    elif cmd == "push":
+        commit(args, jobs=jobs)
+        push()
 
     else:
         sys.exit(colors.yellow("[ERROR]") + " command was not recognized")
 
 
-def run():
+def get_selectors(options):
     """
-    Main function that will run the script
+    Get the selectors given with '--only', '--tag' and '--except', each a
+    comma separated list, or None when no entries are selected
     """
-    helpers.check_backup_and_files_folders()
+    selectors = {}
 
-    data = helpers.get_dotconfig()
+    for option, key in (('--only', 'only'), ('--tag', 'tags'),
+                        ('--except', 'exclude')):
+        if options.get(option):
+            selectors[key] = [value for value in
+                              options[option].split(",") if value]
 
-    for key, value in data['files'].iteritems():
+    return selectors or None
 
-        print colors.red("***") + \
-            colors.green(" Creating references for: %s " % key) + \
-            colors.red("***")
 
-        origin = os.path.expanduser('~') + value
+def exit_on_error(error):
+    """
+    Exit with the message of a DotError raised by the core of dot
+    """
+    sys.exit(colors.yellow("[ERROR]") + " %s" % error)
 
-        if not os.path.exists(origin):
-            print colors.blue("[NOTICE]") + \
-                " %s does not exist for %s" % (value, key)
-            continue
 
-        if os.path.islink(origin):
-            print colors.blue("[NOTICE]") + \
-                " symlink is already present for: %s" % key
-            continue
+def local_repository():
+    """
+    Get the repository of the home folder of the user, which prints what it
+    does. The commands that link or check entries go through it, like the
+    programs using dot as a library.
+    """
+    from repository import DotRepository
 
-        """
-        When we are running this script on a machine, we want to make sure
-        that files that are present in the files folder, but not yet symlinked
-        on the machine, are moved to a backup folder and symlinks are created
-        to the correct files path
-        """
+    return DotRepository(os.path.expanduser("~"), verbose=True)
 
-        if os.path.exists("files/" + key):
-            print colors.blue("[NOTICE]") + " backing up: %s" % key
 
-            new_dir = "backup/" + key
-            helpers.make_and_move_to_dir(origin, new_dir)
+def run(jobs=1, incremental=False, selectors=None):
+    """
+    Main function that will run the script. Entries are linked by at most
+    jobs threads, an entry nested in another tracked entry is only linked after
+    its parent. Failing entries don't stop the others, they're reported at
+    the end. Only the entries picked by the selectors are linked.
 
-            helpers.create_symlink(origin, "files/" + key)
-        else:
-            new_dir = "files/" + key
-            helpers.make_and_move_to_dir(origin, new_dir)
+    When incremental is set, only the entries that changed since the last
+    incremental run are checked, see DotRepository.run().
+    """
+    try:
+        helpers.check_backup_and_files_folders()
+        results = local_repository().run(jobs, incremental, selectors)
+    except DotError as e:
+        exit_on_error(e)
 
-            helpers.create_symlink(origin, new_dir)
+    report_results(results)
 
     return True
 
 
+def report_results(results):
+    """
+    Print the entries that failed and exit when there are any
+    """
+    failed = [result for result in results if result.error]
+
+    for result in results:
+        output.record(result.outcome)
+
+    if failed:
+        for result in failed:
+            output.error("%s (%s)" % (result.error, result.name), label="")
+            output.event("error", name=result.name, message=result.error)
+
+        sys.exit(colors.yellow("[ERROR]") + " %d of %d entries failed" %
+                 (len(failed), len(results)))
+
+
+def show_plan(selectors=None):
+    """
+    This will show what running dot would do, without changing anything. Exits
+    with an error when there are conflicts.
+    """
+    import plan
+
+    try:
+        actions = local_repository().plan(selectors)
+    except DotError as e:
+        exit_on_error(e)
+
+    if plan.show_plan(actions):
+        sys.exit(colors.yellow("[ERROR]") + " conflicts found, nothing will "
+                 "be changed by 'dot apply'")
+
+
+def apply_plan(args=None, jobs=1, selectors=None):
+    """
+    This will plan all the entries first and only change the file system when
+    no conflicts are found. With '--homes <home>...' or '--homes-from <file>'
+    the entries are linked in every given home folder instead, by a pool of
+    jobs processes.
+    """
+    repository = local_repository()
+
+    try:
+        if args:
+            helpers.check_backup_and_files_folders(repository.dot_path)
+            apply_homes(args, repository.select(selectors), jobs)
+            return True
+
+        results = repository.apply(jobs, selectors)
+    except ConflictError as e:
+        for action in e.actions:
+            output.error("%s: %s" % (action.name, action.reason),
+                         label="[CONFLICT]")
+            output.event("conflict", name=action.name, path=action.path,
+                         reason=action.reason)
+
+        exit_on_error(e)
+    except DotError as e:
+        exit_on_error(e)
+
+    report_results(results)
+
+    return True
+
+
+def apply_homes(args, entries, jobs=1):
+    """
+    This will link the entries in many home folders, given after '--homes' or
+    in the file given with '--homes-from'
+    """
+    import fleet
+
+    if args[0] == "--homes" and len(args) > 1:
+        homes = args[1:]
+    elif args[0] == "--homes-from" and len(args) == 2:
+        try:
+            homes_file = open(args[1])
+        except IOError:
+            sys.exit(colors.red("[ERROR]") + " not able to read %s" % args[1])
+
+        homes = fleet.read_homes(homes_file)
+        homes_file.close()
+    else:
+        sys.exit(colors.red("[ERROR]") + " expected '--homes <home>...' or "
+                 "'--homes-from <file>' after 'dot apply'")
+
+    if not homes:
+        sys.exit(colors.red("[ERROR]") + " no home folders given")
+
+    homes = [os.path.abspath(os.path.expanduser(home)) for home in homes]
+
+    fleet.apply_homes(entries, homes, jobs)
+
+
 def init():
     """
     This function will initialize the backup and files folder
@@ -89,105 +285,771 @@ def init():
         current_directory.replace(os.path.expanduser("~"), ""))
 
     if not os.path.exists("backup"):
-        print colors.blue("[NOTICE]") + " creating backup folder"
+        output.notice("creating backup folder")
         os.mkdir("backup")
         f = open('backup/.gitignore', 'w')
         f.write('# Ignore everything in this directory\n*\n\
             # Except this file\n!.gitignore')
         f.close()
     else:
-        print colors.blue("[NOTICE]") + " backup folder found."
+        output.notice("backup folder found.")
 
     if not os.path.exists("files"):
-        print colors.blue("[NOTICE]") + " creating files folder"
+        output.notice("creating files folder")
         os.mkdir("files")
         open("files/.gitkeep", "w").close()
     else:
-        print colors.blue("[NOTICE]") + " files folder found."
+        output.notice("files folder found.")
 
+    import gitrepo
 
-def add(args):
+    if not gitrepo.is_repository():
+        if gitrepo.init():
+            output.notice("creating git repository")
+        else:
+            output.notice("git was not found, no git repository created")
+
+
+def add(args, jobs=1):
     """
-    This will add a file or folder that needs to be tracked in the
-    scribconfig file
+    This will add files or folders that need to be tracked in the .dotconfig
+    file. Either a single name and path are given, a manifest file with a name
+    and path on every line is given with '--from', or, without arguments, the
+    names and paths are read from stdin. All the entries are checked before
+    the .dotconfig file is written once.
     """
-    helpers.check_args(args, 2)
+    if args and args[0] == "--from":
+        helpers.check_args(args, 2)
 
-    name = args[0]
-    path = args[1]
-    path_without_home_prefix = path.replace(os.path.expanduser('~'), "")
+        try:
+            manifest = open(args[1])
+        except IOError:
+            sys.exit(colors.red("[ERROR]") + " not able to read %s" % args[1])
+
+        pairs = helpers.read_manifest(manifest)
+        manifest.close()
+    elif not args and not sys.stdin.isatty():
+        pairs = helpers.read_manifest(sys.stdin)
+    else:
+        helpers.check_args(args, 2)
+        pairs = [(args[0], args[1])]
+
+    try:
+        added = new_entries(pairs, jobs=jobs)
+    except EntryError as e:
+        check_add_errors(e.problems, len(pairs))
+
+    helpers.update_files(added=added)
+
+    for name, path in sorted(added.iteritems()):
+        output.event("added", name=name, path=path)
+
+    if len(pairs) == 1:
+        output.notice("%s added to the .dotconfig file, run 'dot' to "
+                      "symlink the files" % pairs[0][0])
+    else:
+        output.notice("%d entries added to the .dotconfig file, run 'dot' "
+                      "to symlink the files" % len(pairs))
+
+
+def new_entries(pairs, index=None, jobs=1):
+    """
+    Check the entries to add, (name, path) pairs, against each other and the
+    index, the one of the config of the user by default, and get the paths
+    to store in the config by name. The paths are checked with at most jobs
+    threads. Raises an EntryError with every problem found.
+    """
+    import engine
+
+    errors = []
+
+    names = [name for name, path in pairs]
+    paths = [path for name, path in pairs]
+
+    for path, exists in zip(paths, engine.map_jobs(os.path.exists, paths,
+                                                   jobs)):
+        if not exists:
+            errors.append("file does not exist or file path is not in the "
+                          "correct format: %s" % path)
 
-    if not os.path.exists(path):
-        sys.exit(colors.red("[ERROR]") + " file does not exist or file path"
-                 " is not in the correct format")
+    for name in sorted(set(names)):
+        if names.count(name) > 1:
+            errors.append("the name %s is given more than once" % name)
 
-    data = helpers.get_dotconfig()
+    _check_new_entries(errors, len(pairs))
 
-    if path in data['files'].values():
-            sys.exit(
-                colors.blue("[NOTICE]") +
-                "the file %s is already being tracked" % path)
+    if index is None:
+        index = helpers.get_index()
+    seen = {}
+    added = {}
 
-    data['files'].update({name: path_without_home_prefix})
+    for name, path in pairs:
+        # Stored in the form the index compares, so a path given relative
+        # to the working directory or through a symlinked home works too
+        canonical = index.home_path(path)
 
-    helpers.set_dotconfig(data)
+        if canonical is None:
+            errors.append("the file %s is not in the home folder %s"
+                          % (path, index.home))
+            continue
+
+        tracked_as = index.by_path.get(canonical) or seen.get(canonical)
+
+        if tracked_as is not None:
+            errors.append("the file %s is already being tracked as %s"
+                          % (path, tracked_as))
+        seen[canonical] = name
+        added[name] = canonical
 
-    print colors.blue("[NOTICE]") + \
-        " %s added to the .dotconfig file, run 'dot' to symlink the files" \
-        % name
+    _check_new_entries(errors, len(pairs))
 
+    return added
 
-def remove(args):
+
+def _check_new_entries(errors, count):
     """
-    This will remove a file or folder that needs to be untracked from the
-    .dotconfig file and reset the files or folders to the prior destination
+    Raise the problems found with the entries to add, see check_add_errors()
     """
-    helpers.check_args(args, 1)
+    if not errors:
+        return
 
-    name = args[0]
-    data = helpers.get_dotconfig()
+    if count == 1:
+        raise EntryError(errors[0])
+
+    raise EntryError("nothing was added, %d problems found" % len(errors),
+                     errors)
+
+
+def check_add_errors(errors, count):
+    """
+    Exit when problems were found with the entries to add. For a single entry
+    the problem is the error message, otherwise all problems are listed.
+    """
+    if not errors:
+        return
+
+    if count == 1:
+        sys.exit(colors.red("[ERROR]") + " " + errors[0])
+
+    for error in errors:
+        output.error(error)
+
+    sys.exit(colors.red("[ERROR]") + " nothing was added, %d problems found"
+             % len(errors))
+
+
+def restore_entry(name, path, dot_path, home=None):
+    """
+    Move the tracked file or folder of an entry back to its prior destination
+    """
+    import shutil
+    import move
+
+    dst = (home or os.path.expanduser('~')) + path
+    src_dir = dot_path + "/files/" + name + "/"
+    src = src_dir + os.path.basename(dst)
 
-    dst = os.path.expanduser('~') + data['files'][name]
-    src_dir = helpers.get_dot_path() + "/files/" + name + "/"
-    src = helpers.get_dot_path() + "/files/" + name + "/" + os.path.basename(dst)
+    # Entries that were never linked are only removed from the .dotconfig
+    if not os.path.islink(dst):
+        return 'untracked'
+
+    import store
 
     # Set the file back in the correct location
     try:
+        if store.is_enabled(dot_path):
+            store.unshare_entry(name, dot_path)
+
         os.unlink(dst)              # remove symlink first
-        shutil.move(src, dst)       # move source to symlink location
+        move.move(src, dst)         # move source to symlink location
         shutil.rmtree(src_dir)      # remove source folder
-    except IOError:
-        sys.exit(colors.yellow("[ERROR]") + " not able to find file")
+    except (IOError, OSError):
+        raise EntryError("not able to find file")
+
+    return 'restored'
+
+
+def remove(args, jobs=1):
+    """
+    This will remove files or folders that need to be untracked from the
+    .dotconfig file and reset the files or folders to the prior destination.
+    All names are checked first, the files are restored by at most jobs
+    threads and the .dotconfig file is written once.
+    """
+    import engine
+
+    if args and args[0] == "--path":
+        args = args[1:]
+        by_path = True
+    else:
+        by_path = False
 
-    # Remove reference from .dotconfig
-    if name in data['files']:
-        del data['files'][name]
+    if not args:
+        helpers.check_args(args, 1)
+
+    index = helpers.get_index()
+
+    if by_path:
+        names = [index.name_for(path) for path in args]
+        unknown = [path for path, name in zip(args, names) if name is None]
     else:
+        names = args
+        unknown = [name for name in names if index.path_for(name) is None]
+
+    if unknown:
         sys.exit(colors.yellow("[ERROR]") +
-                 " not able to find file in .dotconfig. Use 'dot list' to see "
-                 "the files")
+                 " not able to find %s in .dotconfig. Use 'dot list' to see "
+                 "the files" % ", ".join(unknown))
+
+    dot_path = helpers.get_dot_path()
+    entries = dict((name, index.path_for(name)) for name in names)
+
+    results = engine.run_entries(
+        entries, lambda name, path: restore_entry(name, path, dot_path), jobs)
+
+    # Remove references from .dotconfig
+    removed = [result.name for result in results if not result.error]
+    outcomes = dict((result.name, result.outcome) for result in results)
+
+    if removed:
+        helpers.update_files(removed=removed)
+
+    for name in sorted(removed):
+        output.notice("%s removed from .dotconfig file and moved to prior "
+                      "destination" % name)
+        output.event("removed", name=name, path=entries[name],
+                     restored=outcomes[name] == 'restored')
+
+    report_results(results)
+
+
+def store_files(args=None):
+    """
+    This will keep the files in a content-addressed store, every file that
+    is the same as one stored already shares its data with it. Without
+    reflinks files are only shared as hardlinks after '--hardlinks', which
+    '--no-hardlinks' turns off again.
+    """
+    import store
+
+    if args and args not in (["--hardlinks"], ["--no-hardlinks"]):
+        sys.exit(colors.red("[ERROR]") + " unknown argument %s, only "
+                 "'--hardlinks' or '--no-hardlinks' is accepted"
+                 % " ".join(args))
+
+    helpers.check_backup_and_files_folders()
+
+    if not store.is_enabled():
+        output.notice("creating store folder")
+
+    hardlinks = None
+    if args:
+        hardlinks = args == ["--hardlinks"]
+    store.enable(hardlinks)
+
+    data = helpers.load_config()
+    names = [name for name in sorted(data['files'])
+             if os.path.isdir("files/" + name)]
+    saved = 0
+
+    for name in names:
+        if hardlinks is False:
+            store.unshare_entry(name, forget=False)
+        saved += store.store_entry(name)
+        output.event("stored", name=name)
+
+    output.notice("%d entries stored, %s saved"
+                  % (len(names), helpers.format_bytes(saved)))
+
+
+def fsck(args):
+    """
+    This will check the files against the store. Unreferenced objects are
+    removed with '--prune'.
+    """
+    import store
+
+    if not store.is_enabled():
+        sys.exit(colors.yellow("[ERROR]") + " no store found, run "
+                 "'dot store' to create one")
+
+    data = helpers.load_config()
+    problems, unreferenced = store.fsck(data['files'])
 
-    helpers.set_dotconfig(data)
+    for name, problem in problems:
+        output.error(problem if name is None else "%s: %s" % (name, problem))
+        output.event("problem", name=name, message=problem)
 
-    print colors.blue("[NOTICE]") + \
-        " %s removed from .dotconfig file and moved to prior destination" \
-        % name
+    if unreferenced and args and args[0] == "--prune":
+        store.prune(unreferenced)
+        output.notice("%d unreferenced objects removed" % len(unreferenced))
+    elif unreferenced:
+        output.notice("%d unreferenced objects, remove them with 'dot fsck "
+                      "--prune'" % len(unreferenced))
 
+    if problems:
+        sys.exit(colors.yellow("[ERROR]") + " %d problems found"
+                 % len(problems))
 
-def show_list():
+    output.notice("no problems found")
+
+
+def backups(args):
+    """
+    This will list, restore or prune the backed up generations of the
+    entries: 'list [<name>...]', 'restore <name> [<stamp>] [--to <folder>]'
+    or 'prune [--keep <n>] [--keep-days <days>] [<name>...]'
     """
-    This will list all the entries that are currently present in the
-    .dotconfig file
+    helpers.check_backup_and_files_folders()
+
+    if not args or args[0] not in ("list", "restore", "prune"):
+        sys.exit(colors.red("[ERROR]") + " expected 'list', 'restore' or "
+                 "'prune' after 'dot backup'")
+
+    command, args = args[0], args[1:]
+    options, names = _split_options(args, ("--to", "--keep", "--keep-days"))
+
+    if command == "list":
+        show_backups(names)
+    elif command == "restore":
+        restore_backup(names, options.get("--to"))
+    else:
+        prune_backups(names, _number(options.get("--keep")),
+                      _number(options.get("--keep-days")))
+
+
+def _split_options(args, known):
     """
-    data = helpers.get_dotconfig()
+    Split arguments into the given options, that all take a value, and the
+    other arguments
+    """
+    options = {}
+    rest = []
+
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in known:
+            if not args:
+                sys.exit(colors.red("[ERROR]") + " %s needs a value" % arg)
+            options[arg] = args.pop(0)
+        elif arg.startswith("--"):
+            sys.exit(colors.red("[ERROR]") + " unknown option %s" % arg)
+        else:
+            rest.append(arg)
+
+    return options, rest
+
+
+def _number(value):
+    if value is None:
+        return None
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+
+    if number < 0:
+        sys.exit(colors.red("[ERROR]") + " %s should be a number" % value)
+
+    return number
+
+
+def show_backups(names):
+    """
+    This will list the backed up generations, of the given entries or all
+    """
+    import backup
+
+    if names:
+        found = [generation for name in names
+                 for generation in backup.generations(name)]
+    else:
+        found = backup.all_generations()
+
+    if not found:
+        output.notice("no backups found")
+        return
+
+    output.header("The following backups are kept")
+
+    for generation in found:
+        kind = "archive" if generation.archived else \
+            "legacy" if generation.legacy else "folder"
+        size = backup.size(generation)
+
+        output.line("%s %s %s %s" % (
+            colors.red(generation.name), colors.blue(generation.stamp), kind,
+            helpers.format_bytes(size)))
+        output.event("backup", name=generation.name, stamp=generation.stamp,
+                     storage=kind, path=generation.path, bytes=size)
+
+
+def restore_backup(args, folder=None):
+    """
+    This will put the files of a backed up generation, the newest one unless
+    a stamp is given, back in the folder they came from or in folder
+    """
+    import backup
+
+    if len(args) not in (1, 2):
+        helpers.check_args(args, 1)
+
+    name = args[0]
+    found = backup.generations(name)
 
-    if data['files']:
-        print colors.red("***") + \
-            colors.green(" The following files are being tracked ") + \
-            colors.red("***")
+    if len(args) == 2:
+        found = [generation for generation in found
+                 if generation.stamp == args[1]]
+
+    if not found:
+        sys.exit(colors.yellow("[ERROR]") + " no backup found for %s, use "
+                 "'dot backup list' to see the backups" % " ".join(args))
+
+    generation = found[-1]
+
+    if folder is None:
+        path = helpers.get_index().path_for(name)
+        if path is None:
+            sys.exit(colors.yellow("[ERROR]") + " %s is not tracked, give the "
+                     "folder to restore to with '--to'" % name)
+        folder = os.path.dirname(os.path.expanduser("~") + path)
+
+    backup.restore(generation, os.path.abspath(os.path.expanduser(folder)))
+
+    output.notice("restored the backup of %s from %s to %s"
+                  % (name, generation.stamp, folder))
+    output.event("restored", name=name, stamp=generation.stamp,
+                 destination=folder)
+
+
+def prune_backups(names, keep=None, keep_days=None):
+    """
+    This will remove the backed up generations that the retention policy
+    doesn't keep and pack the older ones that are kept into archives
+    """
+    import backup
+
+    names = names or sorted(
+        name for name in os.listdir(backup.BACKUP_DIR)
+        if os.path.isdir(backup.BACKUP_DIR + "/" + name))
+
+    removed = archived = 0
+
+    for name in names:
+        expired, packed = backup.prune(name, keep, keep_days)
+
+        for generation in expired:
+            output.event("pruned", name=name, stamp=generation.stamp)
+        for generation in packed:
+            output.event("archived", name=name, stamp=generation.stamp,
+                         path=generation.path)
+
+        removed += len(expired)
+        archived += len(packed)
+
+    output.notice("%d backups removed, %d archived" % (removed, archived))
+
+
+def check_status(args, jobs=1, selectors=None):
+    """
+    This will check every entry is linked to its file in the files folder,
+    with at most jobs threads, without changing anything. With '--fix' the
+    broken entries are linked again. Exits with 1 when entries aren't linked
+    yet and 2 when entries are broken, so it can be used as a check.
+    """
+    import status
+
+    if args and args != ["--fix"]:
+        sys.exit(colors.red("[ERROR]") + " unknown argument %s, only '--fix' "
+                 "is accepted" % " ".join(args))
+
+    repository = local_repository()
+
+    try:
+        if args:
+            for result in repository.fix(jobs, selectors):
+                if result.error:
+                    output.error("%s (%s)" % (result.error, result.name),
+                                 label="")
+                else:
+                    output.notice("fixed %s: %s" % (result.name,
+                                                     result.outcome))
+
+        entries = repository.select(selectors)
+        statuses = repository.status(jobs, selectors)
+    except DotError as e:
+        exit_on_error(e)
+
+    counts = {}
+    for entry in statuses:
+        counts[entry.state] = counts.get(entry.state, 0) + 1
+        output.event("status", name=entry.name, path=entry.path,
+                     state=entry.state, expected=entry.expected,
+                     target=entry.target)
+
+        if entry.state == status.LINKED:
+            continue
+
+        message = "%s: %s" % (entry.name, entry.path)
+        if entry.target is not None:
+            message += " -> %s" % entry.target
+        output.line(colors.yellow("[%s]" % entry.state.upper()) + " " +
+                    message)
+
+    output.line(colors.blue("[NOTICE]") + " " + ", ".join(
+        "%d %s" % (counts.get(state, 0), state) for state in (
+            status.LINKED, status.UNLINKED, status.MISSING,
+            status.LINKED_ELSEWHERE, status.DANGLING, status.REPO_MISSING)))
+
+    import gitrepo
+
+    if gitrepo.is_repository():
+        for name in gitrepo.changed_entries(entries):
+            output.line(colors.blue("[CHANGED]") + " %s: not committed" % name)
+            output.event("changed", name=name)
+
+    code = status.exit_code(statuses)
+    if code:
+        sys.exit(code)
+
+
+def show_diff(args, jobs=1, selectors=None):
+    """
+    This will show how the config and the files differ from the manifest of
+    the last run, or from the manifest file given
+    with '--against <file>', without changing anything. Exits with 1 when
+    there are differences.
+    """
+    import diff
+    import state
+
+    options, rest = _split_options(args, ("--against",))
+
+    if rest:
+        sys.exit(colors.red("[ERROR]") + " unknown argument %s"
+                 % " ".join(rest))
+
+    path = options.get("--against", state.MANIFEST_FILE)
+
+    if not os.path.isfile(path):
+        sys.exit(colors.yellow("[ERROR]") + " %s not found, run dot first to "
+                 "record the manifest" % path)
+
+    manifest = state.load_manifest(path)
+    if manifest is None:
+        sys.exit(colors.yellow("[ERROR]") + " not able to read the manifest "
+                 "in %s" % path)
+
+    try:
+        entries = local_repository().select(selectors)
+    except DotError as e:
+        exit_on_error(e)
+
+    if selectors:
+        manifest = dict((name, record) for name, record
+                        in manifest.iteritems() if name in entries)
+
+    changes = diff.compare(entries, manifest, jobs)
+    marks = {diff.ADDED: "+", diff.REMOVED: "-", diff.RETARGETED: "~",
+             diff.CONTENT_CHANGED: "M"}
+
+    for change in changes:
+        if change.kind == diff.ADDED:
+            text = change.new
+        elif change.kind == diff.REMOVED:
+            text = change.old
+        elif change.kind == diff.RETARGETED:
+            text = "%s => %s" % (change.old, change.new)
+        else:
+            text = ", ".join(change.detail)
+
+        output.line(colors.yellow(marks[change.kind]) + " %s: %s"
+                    % (colors.red(change.name), text))
+        output.event("diff", name=change.name, change=change.kind,
+                     old=change.old, new=change.new, files=change.detail)
+
+    counts = dict((kind, len([change for change in changes
+                              if change.kind == kind]))
+                  for kind in diff.KINDS)
+
+    output.line(colors.blue("[NOTICE]") + " " + ", ".join(
+        "%d %s" % (counts[kind], kind) for kind in diff.KINDS))
+
+    if changes:
+        sys.exit(1)
+
+
+def commit(args, jobs=1):
+    """
+    This will commit the files of the entries that changed since the last
+    commit by dot. The changed entries are found by comparing the size and
+    modification time of their files, only files that differ are hashed. A
+    message is given with '-m <message>'.
+    """
+    import state
+    import gitrepo
+
+    options, rest = _split_options(args, ("-m", "--message"))
+
+    if rest:
+        sys.exit(colors.red("[ERROR]") + " unknown argument %s"
+                 % " ".join(rest))
+
+    helpers.check_backup_and_files_folders()
+
+    if not gitrepo.is_repository():
+        sys.exit(colors.yellow("[ERROR]") + " no git repository found, run "
+                 "'dot init' to create one")
+
+    data = helpers.load_config()
+    last_state = state.load_state()
+    changed, records = state.scan_files(data['files'], last_state, jobs)
+
+    if not changed:
+        output.notice("nothing to commit")
+        return
+
+    message = options.get("-m") or options.get("--message")
+
+    if gitrepo.commit(changed, message):
+        for name in changed:
+            output.event("committed", name=name)
+        output.notice("%d entries committed" % len(changed))
+    else:
+        output.notice("nothing to commit")
+
+    state.save_state(state.record_files(last_state, records))
+
+
+def push():
+    """
+    This will push the commits to the remote repository
+    """
+    import gitrepo
+
+    gitrepo.push()
+
+    output.notice("pushed the commits")
+    output.event("pushed")
+
+
+def which(args):
+    """
+    This will show the names under which paths are tracked
+    """
+    if not args:
+        helpers.check_args(args, 1)
+
+    index = helpers.get_index()
+    untracked = []
+
+    for path in args:
+        name = index.name_for(path)
+
+        if name is None:
+            untracked.append(path)
+        else:
+            output.line(colors.red(name) + " " +
+                        colors.blue(index.path_for(name)))
+            output.event("entry", name=name, path=index.path_for(name))
+
+    if untracked:
+        sys.exit(colors.yellow("[ERROR]") + " %s not being tracked" %
+                 ", ".join(untracked))
+
+
+def show_list(args=None):
+    """
+    This will list the entries that are currently present in the .dotconfig
+    file, sorted by name or with '--sort path' by path. The entries are
+    filtered with '--prefix <prefix>', '--glob <pattern>' and '--path-under
+    <folder>' and paged with '--limit <n>' and '--offset <n>'. With '--count'
+    only the number of entries is shown.
+    """
+    args = list(args or [])
+    count_only = "--count" in args
+    if count_only:
+        args.remove("--count")
+
+    options, rest = _split_options(args, (
+        "--prefix", "--glob", "--path-under", "--sort", "--limit",
+        "--offset"))
+
+    if rest:
+        sys.exit(colors.red("[ERROR]") + " unknown argument %s"
+                 % " ".join(rest))
+
+    sort = options.get("--sort", "name")
+    if sort not in ("name", "path"):
+        sys.exit(colors.red("[ERROR]") + " --sort should be name or path")
+
+    data = helpers.load_config()
+
+    if not data['files']:
+        output.notice("No files are being tracked, add them with 'dot add'")
+        return
+
+    names = helpers.get_index(data).find(
+        prefix=options.get("--prefix"), pattern=options.get("--glob"),
+        under=options.get("--path-under"))
+
+    if count_only:
+        output.line(str(len(names)))
+        output.event("count", count=len(names))
+        return
+
+    if sort == "path":
+        names.sort(key=lambda name: (data['files'][name], name))
+
+    offset = _number(options.get("--offset")) or 0
+    limit = _number(options.get("--limit"))
+    page = names[offset:None if limit is None else offset + limit]
+
+    output.header("The following files are being tracked")
+
+    for name in page:
+        output.line(colors.red(name) + " " + colors.blue(data['files'][name]))
+        output.event("entry", name=name, path=data['files'][name])
+
+
+def import_json(args):
+    """
+    This will copy a JSON config file, ~/.dotconfig by default, into the
+    ~/.dotconfig.db database, or with '--sharded' into the ~/.dotconfig.d
+    folder with a file per entry. From then on that is used as config.
+    """
+    args = list(args or [])
+    sharded = "--sharded" in args
+    if sharded:
+        args.remove("--sharded")
+
+    path = args[0] if args else os.path.expanduser("~") + "/.dotconfig"
+    data = helpers.get_dotconfig(path)
+
+    if sharded:
+        helpers.get_sharded_config().save(data)
+        destination = "~/.dotconfig.d"
+    else:
+        helpers.get_sqlite_config().save(data)
+        destination = "~/.dotconfig.db"
+
+    output.notice("%d entries imported from %s into %s"
+                  % (len(data['files']), path, destination))
+
+
+def export_json(args):
+    """
+    This will write the config as a JSON file, or to stdout when no file is
+    given
+    """
+    data = helpers.load_config()
 
-        for k, v in data['files'].iteritems():
-            print colors.red(k), colors.blue(v)
+    if args:
+        helpers.set_dotconfig(data, path=args[0])
+        output.notice("%d entries exported to %s"
+                      % (len(data['files']), args[0]))
     else:
-        print colors.blue("[NOTICE]") + "No files are being tracked, add " \
-            "them with 'dot add'"
+        output.line(json.dumps(data, sort_keys=True, indent=4))
+        output.event("config", config=data)
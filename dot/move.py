@@ -0,0 +1,295 @@
+import os
+import stat
+import time
+import errno
+import shutil
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import engine
+
+
+# Number of files that are copied at the same time when a folder is moved to
+# another device
+MOVE_JOBS = 8
+
+# ioctl to share the data of a file instead of copying it (btrfs, xfs)
+FICLONE = 0x40049409
+
+# Outcome of a move, cross_device is set when the data had to be copied
+MoveStats = namedtuple('MoveStats', ['bytes', 'seconds', 'cross_device'])
+
+# Errors after which a copy method is known not to work for the files at hand
+_UNSUPPORTED = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTTY, errno.EBADF, errno.EPERM)
+
+_CHUNK_SIZE = 1 << 30
+
+
+def _load_libc():
+    # ctypes takes a while to import, it's only needed to copy across devices
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None, None
+
+    copy_file_range = getattr(libc, "copy_file_range", None)
+    if copy_file_range is not None:
+        copy_file_range.argtypes = [
+            ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+            ctypes.c_size_t, ctypes.c_uint]
+        copy_file_range.restype = ctypes.c_ssize_t
+
+    sendfile = getattr(libc, "sendfile", None)
+    if sendfile is not None:
+        sendfile.argtypes = [
+            ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+        sendfile.restype = ctypes.c_ssize_t
+
+    return copy_file_range, sendfile
+
+
+# copy_file_range and sendfile of libc, loaded by _get_libc() on first use
+_libc = None
+
+# Copy methods that failed with an unsupported error are switched off for the
+# rest of the process
+_disabled = set()
+
+
+def _get_libc():
+    global _libc
+
+    if _libc is None:
+        _libc = _load_libc()
+    return _libc
+
+
+def _kernel_copy(call, src_fd, dst_fd):
+    """
+    Keep calling a kernel copy function that uses the file offsets of both
+    file descriptors until the end of the source file
+    """
+    import ctypes
+
+    copied = 0
+    while True:
+        count = call(src_fd, dst_fd)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            raise OSError(err, os.strerror(err))
+        if count == 0:
+            return copied
+        copied += count
+
+
+def _reflink(src_fd, dst_fd):
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd, dst_fd):
+    return _kernel_copy(
+        lambda src, dst: _get_libc()[0](
+            src, None, dst, None, _CHUNK_SIZE, 0),
+        src_fd, dst_fd)
+
+
+def _sendfile(src_fd, dst_fd):
+    return _kernel_copy(
+        lambda src, dst: _get_libc()[1](dst, src, None, _CHUNK_SIZE),
+        src_fd, dst_fd)
+
+
+def _available_methods():
+    copy_file_range, sendfile = _get_libc()
+
+    methods = []
+    if fcntl is not None:
+        methods.append(("reflink", _reflink))
+    if copy_file_range is not None:
+        methods.append(("copy_file_range", _copy_file_range))
+    if sendfile is not None:
+        methods.append(("sendfile", _sendfile))
+    return [method for method in methods if method[0] not in _disabled]
+
+
+def copy_file(src, dst):
+    """
+    Copy the data of a regular file. The data is shared with a reflink when
+    the file system supports it, otherwise it's copied by the kernel with
+    copy_file_range or sendfile, and only when neither works it's copied
+    through Python.
+    """
+    src_file = open(src, 'rb')
+    try:
+        dst_file = open(dst, 'wb')
+        try:
+            src_fd = src_file.fileno()
+            dst_fd = dst_file.fileno()
+
+            for name, method in _available_methods():
+                try:
+                    method(src_fd, dst_fd)
+                    return
+                except (IOError, OSError) as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    _disabled.add(name)
+                    # start over, a method may have failed half way through
+                    os.lseek(src_fd, 0, os.SEEK_SET)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    os.ftruncate(dst_fd, 0)
+
+            shutil.copyfileobj(src_file, dst_file, 1 << 20)
+        finally:
+            dst_file.close()
+    finally:
+        src_file.close()
+
+
+def _copy_metadata(src, dst, st):
+    """
+    Copy the permissions, timestamps and when possible the ownership
+    """
+    try:
+        os.lchown(dst, st.st_uid, st.st_gid)
+    except OSError:
+        pass
+
+    if not stat.S_ISLNK(st.st_mode):
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+        os.utime(dst, (st.st_atime, st.st_mtime))
+
+
+def _copy_entry(src, dst, st):
+    """
+    Copy a single file, symlink, FIFO or device with its metadata, returns
+    the number of bytes copied. Raises a shutil.SpecialFileError for sockets
+    and other files that can't be copied.
+    """
+    if stat.S_ISLNK(st.st_mode):
+        os.symlink(os.readlink(src), dst)
+        _copy_metadata(src, dst, st)
+        return 0
+
+    # Opening a FIFO would wait for a writer, it's created again instead
+    if stat.S_ISFIFO(st.st_mode):
+        os.mkfifo(dst, stat.S_IMODE(st.st_mode))
+        _copy_metadata(src, dst, st)
+        return 0
+
+    if stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+        os.mknod(dst, st.st_mode, st.st_rdev)
+        _copy_metadata(src, dst, st)
+        return 0
+
+    if not stat.S_ISREG(st.st_mode):
+        raise shutil.SpecialFileError("`%s` is a socket" % src
+                                      if stat.S_ISSOCK(st.st_mode) else
+                                      "`%s` is a special file" % src)
+
+    copy_file(src, dst)
+    _copy_metadata(src, dst, st)
+    return st.st_size
+
+
+def copy_tree(src, dst, jobs=MOVE_JOBS):
+    """
+    Copy a folder with all its contents and metadata. The folders are created
+    first, the files are then copied by at most jobs threads. Returns the
+    number of bytes copied. Files that can't be copied, like sockets, are
+    collected and raised in a shutil.Error once the others are copied, like
+    shutil.copytree() does.
+    """
+    folders = []
+    files = []
+    errors = []
+
+    for root, dirs, filenames in os.walk(src):
+        target = dst + root[len(src):]
+        os.mkdir(target)
+        folders.append((root, target, os.lstat(root)))
+
+        # os.walk lists symlinks to folders as folders, they're copied as
+        # symlinks instead of followed
+        for name in list(dirs):
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                dirs.remove(name)
+                filenames.append(name)
+
+        for name in filenames:
+            path = os.path.join(root, name)
+            files.append((path, os.path.join(target, name), os.lstat(path)))
+
+    def copy(args):
+        try:
+            return _copy_entry(*args)
+        except shutil.SpecialFileError as e:
+            errors.append((args[0], args[1], str(e)))
+            return 0
+
+    copied = sum(engine.map_jobs(copy, files, jobs))
+
+    if errors:
+        raise shutil.Error(errors)
+
+    # the timestamps of a folder change while it's filled, so set them last
+    for root, target, st in reversed(folders):
+        _copy_metadata(root, target, st)
+
+    return copied
+
+
+def move(src, dst, jobs=MOVE_JOBS):
+    """
+    Move a file or folder to dst, which shouldn't exist yet. On the same device
+    this is a rename, otherwise the data is copied with copy_tree() and the
+    source is removed afterwards. Raises an IOError when src doesn't exist and
+    a shutil.Error when dst already exists.
+    """
+    if os.path.lexists(dst):
+        raise shutil.Error("Destination path '%s' already exists" % dst)
+
+    start = time.time()
+
+    try:
+        os.rename(src, dst)
+        return MoveStats(0, time.time() - start, False)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise IOError(e.errno, e.strerror, src)
+        if e.errno != errno.EXDEV:
+            raise
+
+    st = os.lstat(src)
+
+    try:
+        if stat.S_ISDIR(st.st_mode):
+            copied = copy_tree(src, dst, jobs)
+        else:
+            copied = _copy_entry(src, dst, st)
+    except BaseException:
+        # don't leave a partial copy behind, the source is still intact
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            shutil.rmtree(dst, ignore_errors=True)
+        elif os.path.lexists(dst):
+            os.unlink(dst)
+        raise
+
+    if stat.S_ISDIR(st.st_mode):
+        shutil.rmtree(src)
+    else:
+        os.unlink(src)
+
+    return MoveStats(copied, time.time() - start, True)
+
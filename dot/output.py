@@ -0,0 +1,214 @@
+import sys
+import json
+import time
+import threading
+
+import colors
+
+
+# Number of lines kept in the buffer before they're written in one go
+BUFFER_LINES = 512
+
+# Formats of the output: text for people, or a JSON object per event on every
+# line for other programs
+FORMATS = ("text", "ndjson")
+
+quiet = False
+summary = False
+format = "text"
+
+_lock = threading.Lock()
+_buffer = []
+_buffering = False
+_stream = None
+_colors = None
+
+# outcome -> number of entries, shown with --summary
+counts = {}
+
+# Set for the threads of which all output is dropped, see silence()
+_silenced = threading.local()
+
+
+class Discard(object):
+    """
+    Stream that drops everything written to it, for code that runs without
+    anyone to read its output
+    """
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def silence(enabled=True):
+    """
+    Drop all the output of the current thread, errors and events included,
+    or write it again. The output of other threads is left alone, so a
+    program can call dot without changing what its own threads write.
+    Returns whether the output was dropped before.
+    """
+    previous = is_silenced()
+    _silenced.enabled = enabled
+    return previous
+
+
+def is_silenced():
+    """
+    Check whether the output of the current thread is dropped
+    """
+    return getattr(_silenced, "enabled", False)
+
+
+def start(quiet_mode=False, summary_mode=False, stream=None,
+          output_format="text"):
+    """
+    Start buffering the output of a command. With quiet_mode only errors are
+    written, with summary_mode the notices about single entries are replaced
+    by the number of entries per outcome at the end. Colours are only used
+    when the output goes to a terminal.
+
+    With output_format "ndjson" only the events are written, see event().
+    """
+    global quiet, summary, format, _buffering, _stream, _colors
+
+    quiet = quiet_mode
+    summary = summary_mode
+    format = output_format
+    _stream = stream
+    _buffering = True
+    _colors = format == "text" and \
+        colors.stream_supports_colors(_get_stream())
+
+    colors.use_colors(_colors)
+    counts.clear()
+
+
+def finish():
+    """
+    Write the summary when asked for and everything that's still buffered,
+    and go back to writing output directly
+    """
+    global quiet, summary, format, _buffering, _stream
+
+    if summary and counts and not quiet:
+        line(colors.blue("[SUMMARY]") + " " + ", ".join(
+            "%d %s" % (count, outcome)
+            for outcome, count in sorted(counts.iteritems())))
+
+    if counts:
+        event("summary", counts=dict(counts))
+
+    flush()
+
+    quiet = summary = _buffering = False
+    format = "text"
+    _stream = None
+    counts.clear()
+    colors.use_colors(True)
+
+
+def _get_stream():
+    # Looked up on every write, so a replaced sys.stdout is respected
+    return _stream or sys.stdout
+
+
+def _write(text):
+    if format != "text" or is_silenced():
+        return
+
+    if not _buffering:
+        _get_stream().write(text + "\n")
+        return
+
+    with _lock:
+        _buffer.append(text)
+        full = len(_buffer) >= BUFFER_LINES
+
+    if full:
+        flush()
+
+
+def flush():
+    """
+    Write the buffered lines at once
+    """
+    with _lock:
+        if not _buffer:
+            return
+        text = "\n".join(_buffer) + "\n"
+        del _buffer[:]
+
+    stream = _get_stream()
+    stream.write(text)
+    stream.flush()
+
+
+def line(text):
+    """
+    Write a line that is the result of a command, like an entry of 'dot list'
+    """
+    if not quiet:
+        _write(text)
+
+
+def notice(text):
+    """
+    Write a notice about the progress of a command
+    """
+    if not quiet and not summary:
+        _write(colors.blue("[NOTICE]") + " " + text)
+
+
+def header(text):
+    """
+    Write the header that starts the output of a single entry
+    """
+    if not quiet and not summary:
+        _write(colors.red("***") + colors.green(" %s " % text) +
+               colors.red("***"))
+
+
+def error(text, label="[ERROR]"):
+    """
+    Write an error, these are written in every mode
+    """
+    if label:
+        text = colors.yellow(label) + " " + text
+    _write(text)
+
+
+def record(outcome):
+    """
+    Count an entry with the given outcome for the summary
+    """
+    if is_silenced():
+        return
+
+    with _lock:
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+
+def event(kind, **fields):
+    """
+    Write an event as a JSON object on a single line when the format is
+    ndjson, in any other format nothing is written. The kind of event is
+    stored under "event" and the time under "time". Events are written as
+    they happen, so they can be read as a stream.
+    """
+    if format != "ndjson" or is_silenced():
+        return
+
+    fields["event"] = kind
+    fields["time"] = round(time.time(), 6)
+    text = json.dumps(fields, sort_keys=True) + "\n"
+
+    with _lock:
+        stream = _get_stream()
+        stream.write(text)
+        stream.flush()
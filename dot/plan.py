@@ -0,0 +1,260 @@
+import os
+import sys
+import stat
+import time
+from collections import namedtuple
+
+import colors
+import output
+import helpers
+import engine
+import probe
+import store
+import backup
+
+
+SKIP_MISSING = 'skip-missing'
+SKIP_LINKED = 'skip-linked'
+BACKUP_AND_LINK = 'backup-and-link'
+IMPORT_AND_LINK = 'import-and-link'
+CONFLICT = 'conflict'
+
+# What will be done for a single entry. origin is moved into move_dir (which
+# has to be created first when make_dir is set) and linked to
+# link_dir/<basename of origin>. size is the estimated number of bytes that
+# will be moved, cross_device is set when the move can't be a rename
+Action = namedtuple('Action', [
+    'name', 'path', 'kind', 'origin', 'move_dir', 'link_dir', 'make_dir',
+    'size', 'cross_device', 'reason'])
+
+
+def _is_dir(st):
+    return st is not None and stat.S_ISDIR(st.st_mode)
+
+
+def _is_link(st):
+    return st is not None and stat.S_ISLNK(st.st_mode)
+
+
+def build_plan(entries, home=None, dot_path=None, backup_path=None):
+    """
+    Inspect the file system for every entry and decide what has to be done,
+    without changing anything. All the paths involved are probed in a
+    single pass, see probe.lstat_all(). The paths are relative to home, the
+    home folder of the user by default. The files and backup folders are
+    the ones in dot_path, or in the working directory, unless another
+    backup folder is given. Returns a list of actions sorted by name.
+    """
+    home = home or os.path.expanduser('~')
+    files = helpers.dot_file("files", dot_path)
+    backups = backup_path or helpers.dot_file("backup", dot_path)
+
+    # Files that are in the way are backed up in a new generation, which is
+    # the same for all entries planned together
+    stamp = backup.new_stamp()
+
+    paths = [files, backups]
+    for name, path in entries.iteritems():
+        basename = os.path.basename(home + path)
+        paths.extend([
+            home + path,
+            files + "/" + name,
+            files + "/" + name + "/" + basename,
+            backups + "/" + name])
+
+    stats = probe.lstat_all(paths)
+
+    actions = []
+    for name, path in sorted(entries.iteritems()):
+        origin = home + path
+        basename = os.path.basename(origin)
+        origin_st = stats[origin]
+
+        files_dir = files + "/" + name
+        backup_dir = backups + "/" + name
+
+        kind = None
+        reason = None
+
+        if origin_st is None:
+            kind = SKIP_MISSING
+        elif _is_link(origin_st):
+            kind = SKIP_LINKED
+        elif stats[files_dir] is not None:
+            kind = BACKUP_AND_LINK
+            move_dir = backup.generation_dir(name, stamp, backups)
+
+            if not _is_dir(stats[files_dir]):
+                reason = "%s is not a folder" % files_dir
+            elif stats[files_dir + "/" + basename] is None:
+                reason = "%s is missing in %s" % (basename, files_dir)
+            elif stats[backup_dir] is not None and \
+                    not _is_dir(stats[backup_dir]):
+                reason = "%s is not a folder" % backup_dir
+        else:
+            kind = IMPORT_AND_LINK
+            move_dir = files_dir
+
+        if kind not in (BACKUP_AND_LINK, IMPORT_AND_LINK):
+            actions.append(Action(name, path, kind, origin, None, None,
+                                  False, 0, False, None))
+            continue
+
+        # A new generation never exists yet
+        move_dir_st = stats.get(move_dir)
+        if reason is None and move_dir_st is not None:
+            if not _is_dir(move_dir_st):
+                reason = "%s is not a folder" % move_dir
+            elif stats[move_dir + "/" + basename] is not None:
+                reason = "%s already present in %s" % (basename, move_dir)
+
+        if reason is not None:
+            actions.append(Action(name, path, CONFLICT, origin, move_dir,
+                                  files_dir, False, 0, False, reason))
+            continue
+
+        dst_st = move_dir_st or \
+            stats[files if kind == IMPORT_AND_LINK else backups]
+        cross_device = dst_st is not None and \
+            dst_st.st_dev != origin_st.st_dev
+
+        actions.append(Action(name, path, kind, origin, move_dir, files_dir,
+                              move_dir_st is None,
+                              probe.tree_size(origin, origin_st), cross_device,
+                              None))
+
+    return actions
+
+
+def apply_action(action, dot_path=None):
+    """
+    Carry out a single planned action and return the outcome. No checks are
+    done on the file system, everything was already decided while planning.
+    """
+    output.header("Creating references for: %s" % action.name)
+    output.event("checked", name=action.name, path=action.path,
+                 action=action.kind)
+
+    if action.kind == SKIP_MISSING:
+        output.notice("%s does not exist for %s" % (action.path, action.name))
+        output.event("skipped", name=action.name, path=action.path,
+                     reason="missing")
+        return 'missing'
+
+    if action.kind == SKIP_LINKED:
+        output.notice("symlink is already present for: %s" % action.name)
+        output.event("skipped", name=action.name, path=action.path,
+                     reason="linked")
+        return 'linked'
+
+    if action.kind == CONFLICT:
+        output.event("conflict", name=action.name, path=action.path,
+                     reason=action.reason)
+        sys.exit(colors.yellow("[ERROR]") + " %s. Please remove the file." %
+                 action.reason)
+
+    """
+    When we are running this script on a machine, we want to make sure
+    that files that are present in the files folder, but not yet symlinked
+    on the machine, are moved to a backup folder and symlinks are created
+    to the correct files path
+    """
+    if action.kind == BACKUP_AND_LINK:
+        output.notice("backing up: %s" % action.name)
+
+    start = time.time()
+    helpers.make_and_move_to_dir(action.origin, action.move_dir,
+                                 exists=not action.make_dir)
+
+    destination = action.move_dir + "/" + os.path.basename(action.origin)
+    output.event("backed-up" if action.kind == BACKUP_AND_LINK else "moved",
+                 name=action.name, path=action.path, origin=action.origin,
+                 destination=os.path.abspath(destination), bytes=action.size,
+                 cross_device=action.cross_device,
+                 duration=round(time.time() - start, 6))
+
+    start = time.time()
+    helpers.create_symlink(action.origin, action.link_dir)
+
+    target = action.link_dir + "/" + os.path.basename(action.origin)
+    output.event("linked", name=action.name, path=action.path,
+                 origin=action.origin, target=os.path.abspath(target),
+                 duration=round(time.time() - start, 6))
+
+    # Stored after linking, so a failure to store never leaves the entry
+    # without its link in the home folder
+    if action.kind == IMPORT_AND_LINK and store.is_enabled(dot_path):
+        saved = store.store_entry(action.name, dot_path)
+        if saved:
+            output.notice("%s of %s already stored" % (
+                helpers.format_bytes(saved), action.name))
+
+    if action.kind == BACKUP_AND_LINK:
+        return 'backed-up'
+    return 'imported'
+
+
+def apply_plan(actions, jobs=1, dot_path=None):
+    """
+    Carry out the planned actions with at most jobs threads, returns the list
+    of results. dot_path is the dotfiles folder the plan was made for.
+    """
+    by_name = dict((action.name, action) for action in actions)
+
+    return engine.run_entries(
+        dict((action.name, action.path) for action in actions),
+        lambda name, path: apply_action(by_name[name], dot_path),
+        jobs)
+
+
+def show_plan(actions):
+    """
+    Print the planned actions together with a summary, returns the number of
+    conflicts
+    """
+    counts = {}
+    size = 0
+    cross_device = 0
+
+    for action in actions:
+        counts[action.kind] = counts.get(action.kind, 0) + 1
+
+        if action.kind in (SKIP_MISSING, SKIP_LINKED):
+            output.event("planned", name=action.name, path=action.path,
+                         action=action.kind)
+            continue
+
+        if action.kind == CONFLICT:
+            output.error("%s: %s" % (action.name, action.reason),
+                         label="[CONFLICT]")
+            output.event("conflict", name=action.name, path=action.path,
+                         reason=action.reason)
+            continue
+
+        size += action.size
+        cross_device += action.cross_device
+
+        output.event("planned", name=action.name, path=action.path,
+                     action=action.kind, destination=action.move_dir,
+                     bytes=action.size, cross_device=action.cross_device)
+
+        output.line(colors.green("[%s]" % action.kind.upper()) +
+                    " %s: %s to %s (%s%s)" % (
+                        action.name, action.path, action.move_dir,
+                        helpers.format_bytes(action.size),
+                        ", cross-device" if action.cross_device else ""))
+
+    # The totals are the result of the plan, so they're also shown in summary
+    # mode
+    output.line(colors.blue("[NOTICE]") +
+                " %d to import, %d to back up, %d already linked, %d missing, "
+                "%d conflicts" % (
+                    counts.get(IMPORT_AND_LINK, 0),
+                    counts.get(BACKUP_AND_LINK, 0),
+                    counts.get(SKIP_LINKED, 0), counts.get(SKIP_MISSING, 0),
+                    counts.get(CONFLICT, 0)))
+    output.line(colors.blue("[NOTICE]") +
+                " %s to move, %d cross-device moves" % (
+                    helpers.format_bytes(size), cross_device))
+
+    return counts.get(CONFLICT, 0)
@@ -0,0 +1,170 @@
+import os
+import stat
+
+# os.scandir is only part of Python 3.5 and newer, the scandir package brings
+# it to older versions. Without either, folders are read with os.listdir.
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# A folder is only read when at least this many paths in it are probed,
+# otherwise the paths are looked up one by one
+GROUP_MIN = 2
+
+
+class ProbedPath(object):
+    """
+    A path found while probing, with the attributes of its lstat result. The
+    type of the path is taken from the folder listing when it's known there,
+    any other attribute is read with a single lstat when it's first needed.
+    """
+
+    __slots__ = ("path", "_mode", "_dir_entry", "_stat")
+
+    def __init__(self, path, mode=None, dir_entry=None, st=None):
+        self.path = path
+        self._mode = mode
+        self._dir_entry = dir_entry
+        self._stat = st
+
+    def lstat(self):
+        if self._stat is None:
+            if self._dir_entry is not None:
+                self._stat = self._dir_entry.stat(follow_symlinks=False)
+            else:
+                self._stat = os.lstat(self.path)
+        return self._stat
+
+    @property
+    def st_mode(self):
+        if self._stat is None and self._mode is not None:
+            return self._mode
+        return self.lstat().st_mode
+
+    def __getattr__(self, name):
+        if name.startswith("st_"):
+            return getattr(self.lstat(), name)
+        raise AttributeError(name)
+
+
+def _type_of(dir_entry):
+    if dir_entry.is_symlink():
+        return stat.S_IFLNK
+    if dir_entry.is_dir(follow_symlinks=False):
+        return stat.S_IFDIR
+    if dir_entry.is_file(follow_symlinks=False):
+        return stat.S_IFREG
+    return None
+
+
+def _lstat(path):
+    try:
+        return ProbedPath(path, st=os.lstat(path))
+    except OSError:
+        return None
+
+
+def _read_folder(folder):
+    """
+    Read the names in a folder, returns a dict with the name and what's known
+    about it from the listing, or None when the folder can't be read
+    """
+    try:
+        if scandir is not None:
+            return dict((dir_entry.name, dir_entry)
+                        for dir_entry in scandir(folder or "."))
+        return dict.fromkeys(os.listdir(folder or "."))
+    except OSError:
+        return None
+
+
+def _depth(folder):
+    return folder.rstrip("/").count("/")
+
+
+def lstat_all(paths):
+    """
+    Probe every path once, returns a dict with a ProbedPath for every path that
+    exists and None for the ones that don't.
+
+    The paths are grouped by their folder and every folder with several paths
+    is read once, instead of looking up every path on its own. Paths in a
+    folder that was probed itself and doesn't exist aren't looked up at all.
+    """
+    folders = {}
+    for path in paths:
+        folders.setdefault(os.path.dirname(path), {})[
+            os.path.basename(path)] = path
+
+    probed = {}
+
+    # Parents first, so their paths are probed before their contents
+    for folder in sorted(folders, key=_depth):
+        names = folders[folder]
+        parent = probed.get(folder, False)
+
+        if parent is None or (parent and not (
+                stat.S_ISDIR(parent.st_mode) or
+                stat.S_ISLNK(parent.st_mode))):
+            probed.update(dict.fromkeys(names.itervalues()))
+            continue
+
+        listing = None
+        if len(names) >= GROUP_MIN:
+            listing = _read_folder(folder)
+
+        if listing is None:
+            for path in names.itervalues():
+                probed[path] = _lstat(path)
+            continue
+
+        for name, path in names.iteritems():
+            if name not in listing:
+                probed[path] = None
+            elif listing[name] is None:
+                probed[path] = ProbedPath(path)
+            else:
+                dir_entry = listing[name]
+                probed[path] = ProbedPath(path, _type_of(dir_entry),
+                                          dir_entry)
+
+    return probed
+
+
+def tree_size(path, st):
+    """
+    Estimate the number of bytes in a file or folder. Every folder is read
+    once and every file in it looked up once, without the extra stat calls
+    of os.walk.
+    """
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_size
+
+    size = 0
+    folders = [path]
+
+    while folders:
+        folder = folders.pop()
+        listing = _read_folder(folder)
+
+        for name, dir_entry in (listing or {}).iteritems():
+            child = os.path.join(folder, name)
+            try:
+                if dir_entry is not None:
+                    child_st = dir_entry.stat(follow_symlinks=False)
+                else:
+                    child_st = os.lstat(child)
+            except OSError:
+                continue
+
+            if stat.S_ISDIR(child_st.st_mode):
+                folders.append(child)
+            else:
+                size += child_st.st_size
+
+    return size
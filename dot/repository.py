@@ -0,0 +1,261 @@
+import os
+
+import output
+import helpers
+
+# The errors are raised by the rest of dot as well, they're importable from
+# here for the programs using a repository
+from errors import DotError, ConfigError, EntryError, ConflictError
+
+
+class DotRepository(object):
+    """
+    The dotfiles of a single home folder, for programs that manage many of
+    them in one process. Nothing is read from the environment: the home
+    folder, the config and the dotfiles folder are given. Nothing is printed
+    either, unless verbose is set, the methods return results and raise a
+    DotError. The commands of dot use a verbose repository of the home folder
+    of the user.
+
+    The config is the one of the home folder, whatever its backend, see
+    helpers.get_config_backend(), or the one at config_path. The dotfiles
+    folder is the one in its dot_path by default. The parsed config is kept
+    until it changes. The working directory and the output of other threads
+    are left alone, so repositories can be used from many threads at once.
+    """
+
+    def __init__(self, home, config_path=None, dot_path=None, verbose=False):
+        self.home = os.path.abspath(home)
+        self.backend = helpers.get_config_backend(self.home, config_path)
+        self.config_path = self.backend.path
+        self.verbose = verbose
+        self._dot_path = dot_path
+
+    def __repr__(self):
+        return "DotRepository(%r)" % self.home
+
+    def config(self):
+        """
+        Get the data of the config, it's only read again when it changed
+        """
+        data = helpers.load_config(self.backend)
+
+        if not isinstance(data, dict) or \
+                not isinstance(data.get("files"), dict):
+            raise ConfigError("no files found in %s" % self.config_path)
+
+        return data
+
+    def save_config(self, data):
+        """
+        Write the config, see the save() of the backend
+        """
+        self.backend.save(data)
+
+    @property
+    def dot_path(self):
+        """
+        The dotfiles folder, with the files and backup folders
+        """
+        if self._dot_path is not None:
+            return os.path.abspath(self._dot_path)
+
+        return helpers.get_dot_path(self.config(), self.home)
+
+    def entries(self):
+        """
+        Get the tracked entries, path by name
+        """
+        return dict(self.config()["files"])
+
+    def index(self):
+        """
+        Get the index over the tracked entries, see ConfigIndex
+        """
+        return helpers.get_index(self.config(), self.home)
+
+    def select(self, selectors=None):
+        """
+        Get the entries picked by the selectors, the keyword arguments of
+        ConfigIndex.select(), path by name. Without selectors every entry is
+        picked. The names are looked up in the index, so only the selected
+        entries are handled.
+        """
+        files = self.config()["files"]
+
+        if not selectors:
+            return dict(files)
+
+        names = self.index().select(**selectors)
+
+        if not names:
+            raise EntryError("no entries selected")
+
+        return dict((name, files[name]) for name in names)
+
+    def _run(self, func, *args, **kwargs):
+        """
+        Call one of the functions of dot, with the output of this thread
+        dropped unless the repository is verbose. The function is given the
+        dotfiles folder as its dot_path.
+        """
+        dot_path = self.dot_path
+
+        helpers.check_backup_and_files_folders(dot_path)
+
+        if self.verbose:
+            return func(*args, dot_path=dot_path, **kwargs)
+
+        silenced = output.silence()
+
+        try:
+            return func(*args, dot_path=dot_path, **kwargs)
+        finally:
+            output.silence(silenced)
+
+    def _record(self, names, jobs=1):
+        """
+        Record the applied entries in the manifest 'dot diff' compares with
+        """
+        import state
+
+        self._run(state.record_run, self.config()["files"], names, jobs,
+                  home=self.home)
+
+    def add(self, name, path):
+        """
+        Track path under name, the path is absolute or relative to the home
+        folder, like the paths in the config. The file is linked by the next
+        apply().
+        """
+        import main
+
+        index = self.index()
+
+        if index.path_for(name) is not None:
+            raise EntryError("the name %s is already in use" % name)
+
+        if not os.path.isabs(path) or index.home_path(path) is None:
+            path = self.home + "/" + path.lstrip("/")
+
+        self.backend.update_files(main.new_entries([(name, path)], index))
+
+    def remove(self, name):
+        """
+        Stop tracking name and move its file back from the files folder.
+        Returns the outcome, 'restored' or 'untracked' when it was never
+        linked.
+        """
+        import main
+
+        path = self.index().path_for(name)
+        if path is None:
+            raise EntryError("not able to find %s" % name)
+
+        try:
+            outcome = self._run(main.restore_entry, name, path,
+                                home=self.home)
+        except EntryError as e:
+            raise EntryError("%s: %s" % (name, e))
+
+        self.backend.update_files(removed=[name])
+
+        return outcome
+
+    def plan(self, selectors=None):
+        """
+        Decide what apply() would do, returns the actions, see plan.Action
+        """
+        import plan
+
+        return self._run(plan.build_plan, self.select(selectors), self.home)
+
+    def run(self, jobs=1, incremental=False, selectors=None):
+        """
+        Link the selected entries with at most jobs threads, see select().
+        Unlike apply() a conflict only fails its own entry. When incremental
+        is set, only the entries that changed since the last incremental run
+        are checked, with a check of all entries every
+        state.FULL_VERIFY_INTERVAL runs. Returns the results, see
+        engine.Result.
+        """
+        return self._run(self._link, self.select(selectors), jobs,
+                         incremental)
+
+    def _link(self, selected, jobs, incremental, dot_path):
+        import plan
+        import state
+
+        files = self.config()["files"]
+        state_path = helpers.dot_file(state.STATE_FILE, dot_path)
+        entries = selected
+
+        if incremental:
+            last_state = state.load_state(state_path)
+
+            if not state.needs_full_verify(last_state):
+                entries = state.changed_entries(selected, last_state,
+                                                self.home)
+
+                output.notice("%d of %d entries changed since the last run"
+                              % (len(entries), len(selected)))
+
+        results = plan.apply_plan(
+            plan.build_plan(entries, self.home, dot_path), jobs, dot_path)
+
+        if incremental:
+            state.save_state(state.update_state(last_state, files, results,
+                                                self.home), state_path)
+
+        # The manifest 'dot diff' compares with
+        state.record_run(files, selected, jobs, self.home, dot_path)
+
+        return results
+
+    def apply(self, jobs=1, selectors=None):
+        """
+        Link the selected entries, with at most jobs threads, but only when
+        no conflicts are planned. Returns the results, see engine.Result, of
+        which the failed ones hold an error.
+        """
+        import plan
+
+        actions = self.plan(selectors)
+        conflicts = [action for action in actions
+                     if action.kind == plan.CONFLICT]
+
+        if conflicts:
+            raise ConflictError("%d conflicts found, nothing was changed"
+                                % len(conflicts), conflicts)
+
+        results = self._run(plan.apply_plan, actions, jobs)
+        self._record([action.name for action in actions], jobs)
+
+        return results
+
+    def status(self, jobs=1, selectors=None):
+        """
+        Check the state of the selected entries, returns the states, see
+        status.Status
+        """
+        import status
+
+        return self._run(status.check_entries, self.select(selectors), jobs,
+                         self.home)
+
+    def fix(self, jobs=1, selectors=None):
+        """
+        Link the selected entries that aren't linked correctly, returns the
+        results
+        """
+        import status
+
+        selected = self.select(selectors)
+        statuses = [entry for entry in self._run(status.check_entries,
+                                                 selected, jobs, self.home)
+                    if entry.state != status.LINKED]
+
+        results = self._run(status.fix, statuses, jobs, self.home)
+        self._record(selected, jobs)
+
+        return results
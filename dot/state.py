@@ -0,0 +1,351 @@
+import os
+import json
+import stat
+
+import output
+import helpers
+
+
+# The state file is kept in the dotfiles folder, next to the files and backup
+# folders
+STATE_FILE = ".dotstate"
+
+# The manifest 'dot diff' compares with, kept apart from the state so a run
+# that changes nothing doesn't have to write it
+MANIFEST_FILE = ".dotmanifest"
+
+# Every this many incremental runs, all the entries are checked again
+FULL_VERIFY_INTERVAL = 20
+
+# Outcomes after which the origin is a symlink into the files folder
+LINKED_OUTCOMES = ('linked', 'imported', 'backed-up')
+
+
+def load_state(path=STATE_FILE):
+    """
+    Get the state of the last incremental run, an empty state is returned when
+    there is no (readable) state file
+    """
+    try:
+        state_file = open(path)
+        state = json.load(state_file)
+        state_file.close()
+    except (IOError, ValueError):
+        return {"runs": 0, "entries": {}}
+
+    if not isinstance(state, dict) or \
+            not isinstance(state.get("entries"), dict):
+        return {"runs": 0, "entries": {}}
+
+    return state
+
+
+def save_state(state, path=STATE_FILE):
+    """
+    Write the state file. It's written to a temporary file first and renamed
+    so an interrupted run can't leave a partial state behind.
+    """
+    try:
+        state_file = open(path + ".tmp", 'w')
+        state_file.write(json.dumps(state, sort_keys=True))
+        state_file.close()
+        os.rename(path + ".tmp", path)
+    except (IOError, OSError):
+        output.notice("not able to write state file %s" % path)
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """
+    Get the manifest of the last run, see record_run(), None when there is
+    no (readable) manifest file
+    """
+    try:
+        manifest_file = open(path)
+        manifest = json.load(manifest_file)
+        manifest_file.close()
+    except (IOError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict):
+        return None
+
+    return manifest
+
+
+def _signature(st):
+    return [st.st_dev, st.st_ino, st.st_mtime]
+
+
+def needs_full_verify(state):
+    """
+    Check if this run should verify all entries instead of only the changed
+    ones
+    """
+    return state.get("runs", 0) % FULL_VERIFY_INTERVAL == 0
+
+
+def changed_entries(entries, state, home=None):
+    """
+    Get the entries that changed since the last run. An entry is unchanged
+    when its path in the .dotconfig file is the same and its origin still has
+    the same device, inode and modification time. Only a single lstat is done
+    for every entry.
+    """
+    home = home or os.path.expanduser('~')
+    known = state["entries"]
+    changed = {}
+
+    for name, path in entries.iteritems():
+        recorded = known.get(name)
+
+        if recorded is not None and recorded.get("path") == path:
+            try:
+                st = os.lstat(home + path)
+            except OSError:
+                st = None
+
+            if st is not None and _signature(st) == recorded.get("origin"):
+                continue
+
+        changed[name] = path
+
+    return changed
+
+
+def update_state(state, entries, results, home=None):
+    """
+    Record the origin and the link target of every entry that was handled
+    successfully, entries that failed or are missing are forgotten so they're
+    checked on the next run.
+    """
+    home = home or os.path.expanduser('~')
+    known = state["entries"]
+
+    for name in known.keys():
+        if name not in entries:
+            del known[name]
+
+    for result in results:
+        known.pop(result.name, None)
+
+        if result.outcome not in LINKED_OUTCOMES:
+            continue
+
+        origin = home + entries[result.name]
+        try:
+            st = os.lstat(origin)
+            target = os.readlink(origin)
+        except OSError:
+            continue
+
+        known[result.name] = {
+            "path": entries[result.name],
+            "origin": _signature(st),
+            "target": target,
+        }
+
+    state["runs"] = state.get("runs", 0) + 1
+
+    return state
+
+
+def _kind(mode):
+    """
+    Get the kind of a file that is neither a regular file nor a symlink
+    """
+    if stat.S_ISFIFO(mode):
+        return "fifo"
+    if stat.S_ISSOCK(mode):
+        return "socket"
+    if stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
+        return "device"
+    return "other"
+
+
+def _file_record(path, st, recorded):
+    """
+    Get the record of a file in the files folder: its size, modification
+    time, mode and hash. The hash of the recorded file is reused when the
+    rest didn't change, so only changed files are read. Only regular files
+    are read, symlinks are recorded by their target and sockets, fifos and
+    devices by their kind. The hash of a file that can't be read is None.
+    """
+    signature = [st.st_size, st.st_mtime, stat.S_IMODE(st.st_mode)]
+
+    if recorded is not None and recorded[:3] == signature and \
+            recorded[3] is not None:
+        return recorded
+
+    try:
+        if stat.S_ISLNK(st.st_mode):
+            digest = "link:" + os.readlink(path)
+        elif stat.S_ISREG(st.st_mode):
+            import store
+            digest = store.hash_file(path)
+        else:
+            digest = "kind:" + _kind(st.st_mode)
+    except (IOError, OSError):
+        digest = None
+
+    return signature + [digest]
+
+
+def _scan_entry(name, recorded, dot_path=None):
+    """
+    Record the files of a single entry, returns the records by path relative
+    to files/<name> and whether they differ from the recorded ones. Files
+    that disappear while the folder is read are left out. Every file is
+    looked at with a single lstat, symlinks to folders are recorded like
+    files and not followed.
+    """
+    root = helpers.dot_file("files/" + name, dot_path)
+    records = {}
+    folders = [""]
+
+    while folders:
+        folder = folders.pop()
+
+        try:
+            children = os.listdir(root + "/" + folder)
+        except OSError:
+            continue
+
+        for child in children:
+            relative = folder + child
+            path = root + "/" + relative
+
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+
+            if stat.S_ISDIR(st.st_mode):
+                folders.append(relative + "/")
+            else:
+                records[relative] = _file_record(
+                    path, st, (recorded or {}).get(relative))
+
+    if recorded is None:
+        return records, bool(records)
+
+    changed = set(records) != set(recorded) or any(
+        records[relative][2:] != recorded[relative][2:]
+        for relative in records)
+
+    return records, changed
+
+
+def scan_files(names, state, jobs=1):
+    """
+    Find the entries of which the files in the files folder changed since
+    they were last recorded with record_files(). Files are compared on their
+    size, modification time and mode first and only hashed when one of those
+    changed. Entries that were recorded but are gone count as changed too.
+    Returns the sorted names of the changed entries and the new records.
+    """
+    import engine
+
+    known = state.get("files", {})
+    names = sorted(names)
+
+    scanned = engine.map_jobs(
+        lambda name: _scan_entry(name, known.get(name)), names, jobs)
+
+    changed = [name for name, (records, differs) in zip(names, scanned)
+               if differs]
+    records = dict((name, found) for name, (found, differs)
+                   in zip(names, scanned) if found)
+
+    changed.extend(name for name in known if name not in records)
+
+    return sorted(changed), records
+
+
+def record_files(state, records):
+    """
+    Remember the records of scan_files(), for instance once the files were
+    committed
+    """
+    state["files"] = records
+
+    return state
+
+
+def _origin_record(name, path, recorded, home, dot_path=None):
+    """
+    Record an entry as it is now: its path, what its origin is, where a
+    symlink points to and the records of its files in the files folder
+    """
+    origin = home + path
+
+    try:
+        st = os.lstat(origin)
+    except OSError:
+        st = None
+
+    if st is None:
+        kind, target = None, None
+    elif stat.S_ISLNK(st.st_mode):
+        kind, target = "link", os.readlink(origin)
+    elif stat.S_ISDIR(st.st_mode):
+        kind, target = "folder", None
+    else:
+        kind, target = "file", None
+
+    files = _scan_entry(name, (recorded or {}).get("files"), dot_path)[0]
+
+    return {"path": path, "kind": kind, "target": target, "files": files}
+
+
+def build_manifest(entries, manifest=None, jobs=1, home=None,
+                   dot_path=None):
+    """
+    Record every entry, see _origin_record(). Files of which the size,
+    modification time and mode are the same as in manifest aren't hashed
+    again. Returns the new manifest.
+    """
+    import engine
+
+    home = home or os.path.expanduser('~')
+    manifest = manifest or {}
+    names = sorted(entries)
+
+    records = engine.map_jobs(
+        lambda name: _origin_record(name, entries[name], manifest.get(name),
+                                    home, dot_path), names, jobs)
+
+    return dict(zip(names, records))
+
+
+def record_run(entries, selected, jobs=1, home=None, dot_path=None,
+               path=None):
+    """
+    Record the selected entries in the manifest after they were applied, see
+    build_manifest(). Every selected entry is checked, but only the files of
+    which the size, modification time or mode changed are hashed again, and
+    the manifest is only written when an entry changed. Entries that are no
+    longer in entries are forgotten. The manifest is the one in the dotfiles
+    folder dot_path, unless path is given. Returns whether it was written.
+    """
+    path = path or helpers.dot_file(MANIFEST_FILE, dot_path)
+    exists = os.path.exists(path)
+    manifest = (load_manifest(path) if exists else None) or {}
+
+    current = build_manifest(
+        dict((name, entries[name]) for name in selected if name in entries),
+        manifest, jobs, home, dot_path)
+
+    changed = [name for name, record in current.iteritems()
+               if manifest.get(name) != record]
+    forgotten = [name for name in manifest if name not in entries]
+
+    if exists and not changed and not forgotten:
+        return False
+
+    for name in forgotten:
+        del manifest[name]
+    manifest.update(current)
+
+    save_state(manifest, path)
+
+    return True
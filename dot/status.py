@@ -0,0 +1,168 @@
+import os
+import stat
+from collections import namedtuple
+
+import output
+import helpers
+import engine
+
+
+LINKED = 'linked'
+LINKED_ELSEWHERE = 'linked-elsewhere'
+DANGLING = 'dangling'
+UNLINKED = 'unlinked'
+MISSING = 'missing'
+REPO_MISSING = 'repo-missing'
+
+# Exit codes of 'dot status', in the way monitoring checks use them: all
+# entries linked, entries not linked yet, and entries that are broken
+EXIT_OK = 0
+EXIT_UNLINKED = 1
+EXIT_BROKEN = 2
+
+EXIT_CODES = {
+    LINKED: EXIT_OK,
+    UNLINKED: EXIT_UNLINKED,
+    MISSING: EXIT_UNLINKED,
+    LINKED_ELSEWHERE: EXIT_BROKEN,
+    DANGLING: EXIT_BROKEN,
+    REPO_MISSING: EXIT_BROKEN,
+}
+
+# The state of a single entry. expected is the symlink target create_symlink()
+# would make, target is what the symlink points to now, if it is one
+Status = namedtuple('Status', [
+    'name', 'path', 'state', 'origin', 'expected', 'target'])
+
+
+def _lstat(path):
+    try:
+        return os.lstat(path)
+    except OSError:
+        return None
+
+
+def expected_target(name, origin, dot_path=None):
+    """
+    Get the path a tracked entry should link to, the same one
+    helpers.create_symlink() links to
+    """
+    return os.path.abspath(helpers.dot_file("files/" + name, dot_path)) + \
+        "/" + os.path.basename(origin)
+
+
+def check_entry(name, path, home=None, dot_path=None):
+    """
+    Find the state of an entry, without changing anything
+    """
+    home = home or os.path.expanduser("~")
+    origin = home + path
+    expected = expected_target(name, origin, dot_path)
+
+    origin_st = _lstat(origin)
+    repo_present = _lstat(expected) is not None
+    target = None
+
+    if origin_st is None:
+        state = MISSING if repo_present else REPO_MISSING
+    elif not stat.S_ISLNK(origin_st.st_mode):
+        state = UNLINKED
+    else:
+        target = os.readlink(origin)
+        absolute = os.path.normpath(
+            os.path.join(os.path.dirname(origin), target))
+
+        if absolute == os.path.normpath(expected):
+            state = LINKED if repo_present else REPO_MISSING
+        elif os.path.exists(origin):
+            state = LINKED_ELSEWHERE
+        else:
+            state = DANGLING
+
+    return Status(name, path, state, origin, expected, target)
+
+
+def check_entries(entries, jobs=1, home=None, dot_path=None):
+    """
+    Find the state of every entry with at most jobs threads, sorted by name
+    """
+    home = home or os.path.expanduser("~")
+
+    return engine.map_jobs(
+        lambda item: check_entry(item[0], item[1], home, dot_path),
+        sorted(entries.iteritems()), jobs)
+
+
+def exit_code(statuses):
+    """
+    Get the exit code for the states, the worst one counts
+    """
+    return max([EXIT_OK] + [EXIT_CODES[status.state]
+                            for status in statuses])
+
+
+def fix_entry(status, backup_path=None):
+    """
+    Repair a single entry. A missing entry is linked, a symlink to somewhere
+    else or to nothing is moved into a new backup generation, in the backup
+    folder backup_path, and replaced. Returns the outcome.
+    """
+    import backup
+
+    files_dir = os.path.dirname(status.expected)
+
+    if status.state == MISSING:
+        folder = os.path.dirname(status.origin)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        helpers.create_symlink(status.origin, files_dir)
+        return 'linked'
+
+    if status.state in (LINKED_ELSEWHERE, DANGLING):
+        helpers.make_and_move_to_dir(
+            status.origin, backup.generation_dir(
+                status.name, backup.new_stamp(),
+                backup_path or backup.BACKUP_DIR))
+        helpers.create_symlink(status.origin, files_dir)
+        return 'relinked'
+
+    return 'unchanged'
+
+
+def fix(statuses, jobs=1, home=None, dot_path=None, backup_path=None):
+    """
+    Repair the entries that are not linked correctly. Unlinked files are
+    handled like a run of dot would, entries of which the files are missing
+    in the repository are left alone. Files in the way are backed up in
+    backup_path, the backup folder in dot_path by default. Returns the
+    results.
+    """
+    import plan
+
+    backup_path = backup_path or helpers.dot_file("backup", dot_path)
+
+    unlinked = dict((status.name, status.path) for status in statuses
+                    if status.state == UNLINKED)
+    # A symlink is only replaced when there is a file in the repository to
+    # link to
+    broken = dict((status.name, status) for status in statuses
+                  if status.state in (MISSING, LINKED_ELSEWHERE, DANGLING) and
+                  os.path.lexists(status.expected))
+
+    results = []
+
+    if unlinked:
+        results.extend(plan.apply_plan(
+            plan.build_plan(unlinked, home, dot_path, backup_path), jobs,
+            dot_path))
+
+    if broken:
+        results.extend(engine.run_entries(
+            dict((name, status.path) for name, status in broken.iteritems()),
+            lambda name, path: fix_entry(broken[name], backup_path), jobs))
+
+    for result in results:
+        output.event("fixed", name=result.name, outcome=result.outcome,
+                     error=result.error)
+
+    return results
@@ -0,0 +1,401 @@
+import os
+import json
+import stat
+import errno
+import thread
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import helpers
+
+
+# The store is kept in the dotfiles folder, next to the files and backup
+# folders. It's only used when this folder exists, see 'dot store'. The
+# functions that take a dot_path find it there, the others in the working
+# directory.
+STORE_DIR = "store"
+OBJECTS_DIR = STORE_DIR + "/objects"
+MANIFESTS_DIR = STORE_DIR + "/manifests"
+
+# When this file exists, files are shared as hardlinks on file systems
+# without reflinks, see 'dot store --hardlinks'. A file changed in place
+# then changes all the files with the same contents, so it's not the default.
+HARDLINKS_FILE = STORE_DIR + "/hardlinks"
+
+# ioctl to share the data of a file instead of copying it (btrfs, xfs)
+FICLONE = 0x40049409
+
+_READ_SIZE = 1 << 20
+
+
+def is_enabled(dot_path=None):
+    """
+    Check whether the files are kept in the store
+    """
+    return os.path.isdir(helpers.dot_file(STORE_DIR, dot_path))
+
+
+def uses_hardlinks(dot_path=None):
+    """
+    Check whether files are shared as hardlinks when reflinks aren't
+    supported
+    """
+    return os.path.exists(helpers.dot_file(HARDLINKS_FILE, dot_path))
+
+
+def enable(hardlinks=None):
+    """
+    Create the store folders, the objects are kept out of git as git already
+    stores identical contents once. hardlinks turns sharing files as
+    hardlinks on or off, None leaves it as it is.
+    """
+    for folder in (STORE_DIR, OBJECTS_DIR, MANIFESTS_DIR):
+        if not os.path.isdir(folder):
+            os.mkdir(folder)
+
+    if hardlinks:
+        open(HARDLINKS_FILE, 'w').close()
+    elif hardlinks is not None and os.path.exists(HARDLINKS_FILE):
+        os.unlink(HARDLINKS_FILE)
+
+    gitignore = open(STORE_DIR + "/.gitignore", 'w')
+    gitignore.write("# The objects are rebuilt from the files folder\n"
+                    "/objects\n"
+                    "# Whether hardlinks are used depends on the machine\n"
+                    "/hardlinks\n")
+    gitignore.close()
+
+
+def hash_file(path):
+    """
+    Get the SHA-1 hash of the contents of a file
+    """
+    import hashlib
+
+    digest = hashlib.sha1()
+    data_file = open(path, 'rb')
+    try:
+        while True:
+            data = data_file.read(_READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    finally:
+        data_file.close()
+    return digest.hexdigest()
+
+
+def object_path(digest, dot_path=None):
+    return helpers.dot_file("%s/%s/%s" % (OBJECTS_DIR, digest[:2], digest[2:]),
+                            dot_path)
+
+
+def manifest_path(name, dot_path=None):
+    return helpers.dot_file("%s/%s.json" % (MANIFESTS_DIR, name), dot_path)
+
+
+def load_manifest(name, dot_path=None):
+    """
+    Get the manifest of an entry: the hash, mode and size of every file in
+    files/<name>, by path relative to that folder. None when there is none.
+    """
+    try:
+        manifest_file = open(manifest_path(name, dot_path))
+    except IOError:
+        return None
+
+    try:
+        return json.load(manifest_file)
+    except ValueError:
+        return None
+    finally:
+        manifest_file.close()
+
+
+def _save_manifest(name, manifest, dot_path=None):
+    path = manifest_path(name, dot_path)
+    manifest_file = open(path + ".tmp", 'w')
+    manifest_file.write(json.dumps(manifest, sort_keys=True, indent=4))
+    manifest_file.close()
+    os.rename(path + ".tmp", path)
+
+
+def _entry_files(name, dot_path=None):
+    """
+    Get the regular files of an entry with their lstat result, by path
+    relative to files/<name>
+    """
+    root = helpers.dot_file("files/" + name, dot_path)
+    found = {}
+
+    for folder, dirs, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            st = os.lstat(path)
+            if stat.S_ISREG(st.st_mode):
+                found[path[len(root) + 1:]] = st
+
+    return found
+
+
+def _reflink(src, dst):
+    src_file = open(src, 'rb')
+    try:
+        dst_file = open(dst, 'wb')
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        finally:
+            dst_file.close()
+    finally:
+        src_file.close()
+
+
+def _add_object(path, obj, st, hardlinks=False):
+    """
+    Store a file as a new object, as a reflink of the file when the file
+    system supports it, so the file can be changed without changing the
+    object. Otherwise it's a hardlink when hardlinks is set and a copy when
+    it isn't. Entries are stored on several threads, so another one can add
+    the same object at the same time. Returns False when the object was
+    already there.
+    """
+    if not os.path.isdir(os.path.dirname(obj)):
+        try:
+            os.mkdir(os.path.dirname(obj))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    if fcntl is not None or not hardlinks:
+        # Every thread writes its own temporary file
+        tmp = "%s.%d-%d.tmp" % (obj, os.getpid(), thread.get_ident())
+        try:
+            if hardlinks:
+                _reflink(path, tmp)
+            else:
+                # Tries a reflink first
+                import move
+                move.copy_file(path, tmp)
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.rename(tmp, obj)
+            return True
+        except (IOError, OSError):
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            if not hardlinks:
+                raise
+
+    try:
+        os.link(path, obj)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        return False
+
+    return True
+
+
+def _share(obj, path, st, hardlinks=False):
+    """
+    Replace the file at path by one sharing its data with the object: a
+    reflink when the file system supports it, otherwise a hardlink when
+    hardlinks is set. Returns False when the data couldn't be shared.
+    """
+    tmp = path + ".dot-tmp"
+
+    if fcntl is not None:
+        try:
+            _reflink(obj, tmp)
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.utime(tmp, (st.st_atime, st.st_mtime))
+            os.rename(tmp, path)
+            return True
+        except (IOError, OSError):
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+
+    if not hardlinks:
+        return False
+
+    # A hardlink shares the permissions too, only link files that have the
+    # same ones
+    if stat.S_IMODE(os.lstat(obj).st_mode) != stat.S_IMODE(st.st_mode):
+        return False
+
+    try:
+        os.link(obj, tmp)
+        os.rename(tmp, path)
+    except OSError:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        return False
+
+    return True
+
+
+def store_entry(name, dot_path=None):
+    """
+    Put the files of an entry in the store. Files of which the contents are
+    already stored share their data with the stored object, the others are
+    added as new objects. Returns the number of bytes saved.
+
+    Without reflinks nothing is shared, unless hardlinks are turned on. Then
+    the files are hardlinks of the objects, so a file that is changed in
+    place changes all the files with the same contents. 'dot fsck' finds
+    these.
+    """
+    hardlinks = uses_hardlinks(dot_path)
+    manifest = {}
+    saved = 0
+
+    for relative, st in sorted(_entry_files(name, dot_path).iteritems()):
+        path = helpers.dot_file("files/%s/%s" % (name, relative), dot_path)
+        digest = hash_file(path)
+        obj = object_path(digest, dot_path)
+
+        manifest[relative] = {
+            "hash": digest,
+            "mode": stat.S_IMODE(st.st_mode),
+            "size": st.st_size,
+        }
+
+        try:
+            obj_st = os.lstat(obj)
+        except OSError:
+            obj_st = None
+
+        if obj_st is None and not _add_object(path, obj, st, hardlinks):
+            obj_st = os.lstat(obj)
+
+        if obj_st is not None and obj_st.st_ino != st.st_ino and \
+                _share(obj, path, st, hardlinks):
+            saved += st.st_size
+
+    _save_manifest(name, manifest, dot_path)
+
+    return saved
+
+
+def unshare_entry(name, dot_path=None, forget=True):
+    """
+    Give every file of an entry its own data again, before it's moved out of
+    the files folder or when hardlinks are turned off, and forget its
+    manifest unless forget is unset
+    """
+    manifest = load_manifest(name, dot_path) or {}
+
+    for relative in manifest:
+        path = helpers.dot_file("files/%s/%s" % (name, relative), dot_path)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+
+        if st.st_nlink > 1:
+            tmp = path + ".dot-tmp"
+            source = open(path, 'rb')
+            target = open(tmp, 'wb')
+            while True:
+                data = source.read(_READ_SIZE)
+                if not data:
+                    break
+                target.write(data)
+            source.close()
+            target.close()
+            os.chmod(tmp, stat.S_IMODE(st.st_mode))
+            os.utime(tmp, (st.st_atime, st.st_mtime))
+            os.rename(tmp, path)
+
+    if not forget:
+        return
+
+    try:
+        os.unlink(manifest_path(name, dot_path))
+    except OSError:
+        pass
+
+
+def _objects():
+    """
+    Get the paths of all stored objects by their hash
+    """
+    found = {}
+
+    if not os.path.isdir(OBJECTS_DIR):
+        return found
+
+    for prefix in os.listdir(OBJECTS_DIR):
+        folder = OBJECTS_DIR + "/" + prefix
+        if not os.path.isdir(folder):
+            continue
+        for rest in os.listdir(folder):
+            found[prefix + rest] = folder + "/" + rest
+
+    return found
+
+
+def fsck(names):
+    """
+    Check the store against the files of the given entries. Returns a list
+    of (name, problem) tuples for the problems and the hashes of the objects
+    that no manifest refers to.
+    """
+    problems = []
+    referenced = set()
+
+    for name in sorted(names):
+        manifest = load_manifest(name)
+
+        if not os.path.isdir("files/" + name):
+            if manifest is not None:
+                problems.append((name, "manifest without files folder"))
+            continue
+
+        if manifest is None:
+            problems.append((name, "not in the store"))
+            continue
+
+        present = _entry_files(name)
+
+        for relative, recorded in sorted(manifest.iteritems()):
+            referenced.add(recorded["hash"])
+            path = "files/%s/%s" % (name, relative)
+
+            if relative not in present:
+                problems.append((name, "%s is missing" % relative))
+                continue
+
+            if hash_file(path) != recorded["hash"]:
+                problems.append((name, "%s was changed, run 'dot store' to "
+                                 "store it again" % relative))
+            elif not os.path.exists(object_path(recorded["hash"])):
+                problems.append((name, "object of %s is missing" % relative))
+
+        for relative in sorted(set(present) - set(manifest)):
+            problems.append((name, "%s is not in the manifest" % relative))
+
+    objects = _objects()
+
+    for digest, path in sorted(objects.iteritems()):
+        if digest in referenced and hash_file(path) != digest:
+            problems.append((None, "object %s is corrupt" % digest))
+
+    unreferenced = [digest for digest in sorted(objects)
+                    if digest not in referenced]
+
+    return problems, unreferenced
+
+
+def prune(digests):
+    """
+    Remove the given objects from the store
+    """
+    for digest in digests:
+        try:
+            os.unlink(object_path(digest))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
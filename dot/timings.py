@@ -0,0 +1,180 @@
+import os
+import sys
+import time
+import threading
+
+import colors
+import helpers
+import plan
+import move
+
+
+# File system functions of which the calls are counted
+FS_CALLS = ("stat", "lstat", "readlink", "symlink", "rename", "mkdir",
+            "rmdir", "unlink", "listdir", "chmod", "utime", "lchown")
+
+# Number of slowest entries shown in the report
+SLOWEST_ENTRIES = 10
+
+enabled = False
+
+_lock = threading.Lock()
+_originals = []
+_started = None
+
+# phase name -> [calls, seconds]
+phases = {}
+# entry name -> seconds
+entries = {}
+# file system function name -> calls
+fs_calls = {}
+moved = {"moves": 0, "cross_device": 0, "bytes": 0}
+
+
+def _patch(module, attribute, make_wrapper):
+    original = getattr(module, attribute)
+    _originals.append((module, attribute, original))
+    setattr(module, attribute, make_wrapper(original))
+
+
+def _add_phase(phase, seconds):
+    with _lock:
+        totals = phases.setdefault(phase, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+
+def _timed(phase):
+    def make_wrapper(original):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                _add_phase(phase, time.time() - start)
+        return wrapper
+    return make_wrapper
+
+
+def _counted(name):
+    def make_wrapper(original):
+        def wrapper(*args, **kwargs):
+            with _lock:
+                fs_calls[name] = fs_calls.get(name, 0) + 1
+            return original(*args, **kwargs)
+        return wrapper
+    return make_wrapper
+
+
+def _timed_entry(original):
+    def wrapper(action, *args, **kwargs):
+        start = time.time()
+        try:
+            return original(action, *args, **kwargs)
+        finally:
+            with _lock:
+                entries[action.name] = time.time() - start
+    return wrapper
+
+
+def _measured_move(original):
+    def wrapper(*args, **kwargs):
+        stats = original(*args, **kwargs)
+        with _lock:
+            moved["moves"] += 1
+            moved["cross_device"] += stats.cross_device
+            moved["bytes"] += stats.bytes
+        return stats
+    return wrapper
+
+
+def enable():
+    """
+    Start recording the time spent per phase and per entry, the number of
+    file system calls and the bytes moved. The functions involved are only
+    wrapped while recording, so there is no cost when it's not enabled.
+    """
+    global enabled, _started
+
+    if enabled:
+        return
+
+    _patch(helpers, "load_config", _timed("config"))
+    _patch(plan, "build_plan", _timed("plan"))
+    _patch(plan, "apply_action", _timed_entry)
+    _patch(helpers, "make_and_move_to_dir", _timed("move"))
+    _patch(helpers, "create_symlink", _timed("link"))
+    _patch(move, "move", _measured_move)
+
+    for name in FS_CALLS:
+        if hasattr(os, name):
+            _patch(os, name, _counted(name))
+
+    enabled = True
+    _started = time.time()
+
+
+def disable():
+    """
+    Stop recording and forget everything that was recorded
+    """
+    global enabled
+
+    while _originals:
+        module, attribute, original = _originals.pop()
+        setattr(module, attribute, original)
+
+    phases.clear()
+    entries.clear()
+    fs_calls.clear()
+    moved.update({"moves": 0, "cross_device": 0, "bytes": 0})
+
+    enabled = False
+
+
+def report(stream=None):
+    """
+    Write a summary of what was recorded, to stderr by default so it doesn't
+    mix with the output of the command. The time of a phase is summed over
+    all threads, so with --jobs it can exceed the total.
+    """
+    stream = stream or sys.stderr
+    lines = [colors.red("***") + colors.green(" Timings ") + colors.red("***")]
+
+    lines.append("%-10s %8s %10s" % ("phase", "calls", "seconds"))
+    for phase, (calls, seconds) in sorted(phases.iteritems()):
+        lines.append("%-10s %8d %10.4f" % (phase, calls, seconds))
+
+    if _started is not None:
+        lines.append("%-10s %8s %10.4f" % ("total", "",
+                                           time.time() - _started))
+
+    if entries:
+        slowest = sorted(entries.iteritems(), key=lambda item: -item[1])
+        lines.append("slowest entries:")
+        for name, seconds in slowest[:SLOWEST_ENTRIES]:
+            lines.append("  %-30s %10.4f" % (name, seconds))
+
+    if fs_calls:
+        lines.append("file system calls: " + ", ".join(
+            "%s %d" % item for item in sorted(fs_calls.iteritems())))
+
+    lines.append("moved: %d (%d cross-device), %s copied" % (
+        moved["moves"], moved["cross_device"],
+        helpers.format_bytes(moved["bytes"])))
+
+    stream.write("\n".join(lines) + "\n")
+
+
+def profile(path, func, *args):
+    """
+    Run func under cProfile and write the statistics to path, they can be read
+    with the pstats module
+    """
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(path)
@@ -0,0 +1,356 @@
+import os
+import sys
+import errno
+import select
+import struct
+
+import colors
+import output
+import helpers
+import plan
+
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+IN_NONBLOCK = 04000
+IN_CLOEXEC = 02000000
+
+# Events on the entries of a watched folder that can change what dot has to
+# do for them
+FOLDER_EVENTS = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                 IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF |
+                 IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Seconds without new events before the collected events are handled
+DEBOUNCE = 0.05
+
+_ENCODING = sys.getfilesystemencoding() or "utf-8"
+
+
+class Inotify(object):
+    """
+    Minimal inotify binding through ctypes, watches folders and reads the
+    events of all of them from a single file descriptor
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"),
+                                 use_errno=True)
+
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.fd = self._check(self._libc.inotify_init1(IN_NONBLOCK |
+                                                      IN_CLOEXEC))
+
+    def _check(self, result):
+        if result < 0:
+            err = self._ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return result
+
+    def add_watch(self, path, mask=FOLDER_EVENTS):
+        """
+        Watch a folder, returns the watch descriptor. Watching a folder
+        twice returns the same descriptor.
+        """
+        if isinstance(path, unicode):
+            path = path.encode(_ENCODING)
+
+        return self._check(self._libc.inotify_add_watch(self.fd, path, mask))
+
+    def remove_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        """
+        Wait at most timeout seconds for events and return them as a list of
+        (wd, mask, name) tuples, the list is empty when the time is up
+        """
+        try:
+            ready = select.select([self.fd], [], [], timeout)[0]
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip("\0").decode(
+                _ENCODING, "replace")
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher(object):
+    """
+    Keeps the entries of the config linked. The config file or folder, the
+    files folder and the folders the tracked entries are in are watched, and
+    only the entries affected by an event are planned and applied again.
+    """
+
+    def __init__(self, jobs=1, inotify=None):
+        self.jobs = jobs
+        self.inotify = inotify or Inotify()
+        self.home = os.path.expanduser("~")
+        self.files_dir = os.path.abspath("files")
+
+        # The ~/.dotconfig.d folder, when the config is kept in it
+        self.config_dir = None
+
+        # wd -> folder, and folder -> wd
+        self.folders = {}
+        self.watches = {}
+
+        self.entries = {}
+        # absolute path of an entry -> names of the entries
+        self.by_origin = {}
+
+    def load(self):
+        """
+        Load the config and watch every folder involved, returns the names
+        of the entries that were added or changed since the last load
+        """
+        files = helpers.load_config()['files']
+
+        backend = helpers.get_config_backend()
+        self.config_dir = None
+        if isinstance(backend, helpers.ShardedConfig):
+            self.config_dir = backend.path
+
+        changed = set(name for name, path in files.iteritems()
+                      if self.entries.get(name) != path)
+
+        self.entries = dict(files)
+        self.by_origin = {}
+        for name, path in files.iteritems():
+            self.by_origin.setdefault(self.home + path, set()).add(name)
+
+        self.watch_folders()
+
+        return changed
+
+    def watch_folders(self):
+        """
+        Watch the folders that exist and aren't watched yet: the home
+        folder and the ~/.dotconfig.d folder for the config, the files
+        folder, the folder of every entry in it and the folder of every
+        tracked path
+        """
+        folders = set([self.home, self.files_dir])
+        if self.config_dir:
+            folders.add(self.config_dir)
+        folders.update(os.path.dirname(origin) for origin in self.by_origin)
+        folders.update(self.files_dir + "/" + name for name in self.entries)
+
+        for folder in folders:
+            if folder in self.watches:
+                continue
+
+            try:
+                wd = self.inotify.add_watch(folder)
+            except OSError:
+                # Missing for now, the folder is watched once it shows up
+                continue
+
+            self.watches[folder] = wd
+            self.folders[wd] = folder
+
+    def affected(self, events):
+        """
+        Get the names of the entries affected by a list of events, or None
+        when everything has to be checked again because events were lost
+        """
+        names = set()
+
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                return None
+
+            folder = self.folders.get(wd)
+            if folder is None:
+                continue
+
+            if mask & IN_IGNORED:
+                del self.folders[wd]
+                del self.watches[folder]
+                continue
+
+            # files/<name> itself, or anything in it
+            if folder == self.files_dir:
+                entry = name
+            elif os.path.dirname(folder) == self.files_dir:
+                entry = os.path.basename(folder)
+            else:
+                entry = None
+
+            if entry in self.entries:
+                names.add(entry)
+
+            if name:
+                names.update(self.by_origin.get(folder + "/" + name, ()))
+            else:
+                names.update(self.by_origin.get(folder, ()))
+
+        return names
+
+    def is_config_event(self, events):
+        for wd, mask, name in events:
+            folder = self.folders.get(wd)
+            if folder == self.home and name.startswith(".dotconfig"):
+                return True
+            # Shards are written to a temporary file first
+            if folder is not None and folder == self.config_dir and \
+                    name.endswith(".json"):
+                return True
+        return False
+
+    def converge(self, names=None):
+        """
+        Plan the given entries, or all of them, and apply the ones that need
+        a change. Failures are reported without stopping. Most events are
+        caused by dot itself, for those the plan finds nothing to do and
+        nothing is written. The planned entries are recorded in the manifest
+        'dot diff' compares with, see state.record_run().
+        """
+        import state
+
+        entries = self.entries
+        if names is not None:
+            entries = dict((name, self.entries[name]) for name in names
+                           if name in self.entries)
+
+        actions = [action for action in plan.build_plan(entries)
+                   if action.kind not in (plan.SKIP_MISSING, plan.SKIP_LINKED)]
+
+        if not actions:
+            state.record_run(self.entries, entries, self.jobs)
+            return []
+
+        output.notice("%d entries changed: %s" % (
+            len(actions), ", ".join(action.name for action in actions)))
+
+        results = plan.apply_plan(actions, self.jobs)
+
+        # Linking creates the folders of the entries in the files folder
+        self.watch_folders()
+
+        for result in results:
+            output.record(result.outcome)
+            if result.error:
+                output.error("%s (%s)" % (result.error, result.name),
+                             label="")
+                output.event("error", name=result.name, message=result.error)
+
+        state.record_run(self.entries, entries, self.jobs)
+
+        output.flush()
+
+        return results
+
+    def collect(self, timeout=None, debounce=DEBOUNCE):
+        """
+        Wait for events and keep collecting them until none came in for
+        debounce seconds
+        """
+        events = self.inotify.read(timeout)
+
+        if events:
+            while True:
+                more = self.inotify.read(debounce)
+                if not more:
+                    break
+                events.extend(more)
+
+        return events
+
+    def step(self, timeout=None, debounce=DEBOUNCE):
+        """
+        Handle a single batch of events, returns the results of the entries
+        that were applied again
+        """
+        events = self.collect(timeout, debounce)
+        if not events:
+            return []
+
+        names = self.affected(events)
+
+        if self.is_config_event(events):
+            helpers.clear_dotconfig_cache()
+            changed = self.load()
+            if names is not None:
+                names.update(changed)
+        else:
+            self.watch_folders()
+
+        return self.converge(names)
+
+    def close(self):
+        self.inotify.close()
+
+
+def watch(jobs=1, debounce=DEBOUNCE, should_stop=None):
+    """
+    Link all the entries once and keep them linked until interrupted, or
+    until should_stop returns True
+    """
+    helpers.check_backup_and_files_folders()
+
+    try:
+        watcher = Watcher(jobs)
+    except (OSError, AttributeError):
+        sys.exit(colors.yellow("[ERROR]") + " 'dot watch' needs inotify, "
+                 "which is only available on Linux")
+
+    try:
+        watcher.load()
+        watcher.converge()
+
+        output.notice("watching %d entries in %d folders"
+                      % (len(watcher.entries), len(watcher.watches)))
+        output.flush()
+
+        # With should_stop, wake up now and then to call it
+        timeout = 0.1 if should_stop else None
+
+        while not (should_stop and should_stop()):
+            watcher.step(timeout, debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -16,6 +16,7 @@ setup(
     version='0.1b3',
     license='MIT',
     install_requires=['nose', 'docopt'],
+    extras_require={'scandir': ['scandir']},
     packages=['dot'],
     scripts=['bin/dot'],
     classifiers=[
@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import backup
+
+
+class TestCaseBackup():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles folder with three generations
+        of a backup, the oldest from before generations existed.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        os.makedirs(self.home + "/dotfiles/files/bashrc")
+        os.makedirs(self.home + "/dotfiles/backup/bashrc")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {"bashrc": "/.bashrc"}, "dot_path": "/dotfiles"}))
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        open("backup/bashrc/.bashrc", "w").write("legacy")
+        os.utime("backup/bashrc/.bashrc", (1000000000, 1000000000))
+
+        self.stamps = [backup.new_stamp(time.time() - days * 86400)
+                       for days in (10, 1)]
+        for number, stamp in enumerate(self.stamps):
+            os.mkdir(backup.generation_dir("bashrc", stamp))
+            open(backup.generation_dir("bashrc", stamp) + "/.bashrc",
+                 "w").write("generation %d" % number)
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_generations(self):
+        """
+        Test generations()
+
+        The generations should be found oldest first, a legacy backup is the
+        oldest
+        """
+        found = backup.generations("bashrc")
+
+        assert_equal(3, len(found))
+        assert_true(found[0].legacy)
+        assert_equal("backup/bashrc/.bashrc", found[0].path)
+        assert_equal(self.stamps, [generation.stamp
+                                   for generation in found[1:]])
+
+    def test_select_expired(self):
+        """
+        Test select_expired()
+
+        Generations should be kept by number or by age, the newest always
+        """
+        found = backup.generations("bashrc")
+
+        assert_equal(found[:2], backup.select_expired(found, keep=1))
+        assert_equal(found[:1], backup.select_expired(found, keep_days=30))
+        assert_equal(found[:2], backup.select_expired(found, keep_days=0))
+        assert_equal([], backup.select_expired(found, keep=3))
+
+    def test_prune(self):
+        """
+        Test prune()
+
+        The expired generations should be removed and the kept ones, except
+        the newest, archived
+        """
+        expired, archived = backup.prune("bashrc", keep=2)
+
+        assert_equal(1, len(expired))
+        assert_false(os.path.exists("backup/bashrc/.bashrc"))
+        assert_equal(1, len(archived))
+        assert_true(os.path.isfile(archived[0].path))
+
+        found = backup.generations("bashrc")
+        assert_equal([True, False], [generation.archived
+                                     for generation in found])
+
+    def test_restore_archive(self):
+        """
+        Test restore() of an archive
+
+        The files should be extracted and the archive removed
+        """
+        generation = backup.archive(backup.generations("bashrc")[1])
+        backup.restore(generation, self.home)
+
+        assert_equal("generation 0", open(self.home + "/.bashrc").read())
+        assert_false(os.path.exists(generation.path))
+
+    def test_restore_in_the_way(self):
+        """
+        Test restore() when the file is present
+
+        Nothing should be overwritten
+        """
+        open(self.home + "/.bashrc", "w").write("Make it so")
+
+        with assert_raises(SystemExit) as cm:
+            backup.restore(backup.generations("bashrc")[-1], self.home)
+        assert_in("already exists", cm.exception.args[0])
+
+    def test_command_backup(self):
+        """
+        Test command 'backup'
+
+        The generations should be listed, the newest restored and the rest
+        pruned
+        """
+        main.run_command("backup", ["list"])
+        assert_in("legacy", self.output.getvalue())
+        assert_in(self.stamps[1] + " folder", self.output.getvalue())
+
+        main.run_command("backup", ["restore", "bashrc"])
+        assert_equal("generation 1", open(self.home + "/.bashrc").read())
+
+        main.run_command("backup", ["prune", "--keep", "1"])
+        assert_in("1 backups removed, 0 archived", self.output.getvalue())
+        assert_equal(1, len(backup.generations("bashrc")))
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("backup", ["prune", "--keep", "all"])
+        assert_in("all should be a number", cm.exception.args[0])
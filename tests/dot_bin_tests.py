@@ -0,0 +1,75 @@
+import os
+import imp
+import sys
+import subprocess
+
+from nose.tools import *
+from mock import patch
+from docopt import docopt
+
+
+BIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), "bin", "dot")
+
+
+class TestCaseBin():
+
+    def setup(self):
+        self.cli = imp.load_source("dot_cli", BIN)
+
+    def test_fast_path(self):
+        """
+        Test parsing the arguments without docopt
+
+        The options and arguments should be the same as the ones docopt would
+        return
+        """
+        keys = list(self.cli.DEFAULT_OPTIONS) + ['<command>', '<args>']
+
+        for argv in ([], ["list"], ["rm", "Picard", "Riker"],
+                     ["add", "--from", "manifest"], ["rm", "--path", "~/.x"],
+                     ["-q"], ["--incremental"], ["-j", "4", "--summary"],
+                     ["-j8", "--format=ndjson", "plan"],
+                     ["--jobs", "2", "--format", "ndjson", "-q", "list"],
+                     ["--only=vim*", "--tag", "shell", "--except=zsh",
+                      "--timings", "status", "--fix"]):
+            expected = docopt(self.cli.__doc__, argv=argv, options_first=True)
+            with patch.dict(sys.modules, {"docopt": None}):
+                args = self.cli.parse_args(argv)
+
+            for key in keys:
+                assert_equal(expected[key], args[key])
+
+    def test_docopt(self):
+        """
+        Test parsing arguments that can't be split by hand
+
+        Abbreviated options, --help and unknown commands should be left to
+        docopt
+        """
+        for argv in (["--incr"], ["--help"], ["-qj4"], ["-j"], ["engage"]):
+            assert_is_none(self.cli.parse_options(argv))
+
+        args = self.cli.parse_args(["--incr", "--sum", "plan"])
+        assert_true(args['--incremental'])
+        assert_true(args['--summary'])
+        assert_equal("plan", args['<command>'])
+
+    def test_lazy_imports(self):
+        """
+        Test the modules imported at start up
+
+        Importing dot.main shouldn't import the modules that are only used
+        by some commands
+        """
+        script = ("import sys; from dot import main; "
+                  "print ' '.join(sorted(sys.modules))")
+        process = subprocess.Popen(
+            [sys.executable, "-c", script], stdout=subprocess.PIPE,
+            env=dict(os.environ, PYTHONPATH=os.path.dirname(
+                os.path.dirname(BIN))))
+        modules = process.communicate()[0].split()
+
+        for name in ("ctypes", "shutil", "docopt", "dot.move", "dot.plan",
+                     "dot.engine", "dot.timings"):
+            assert_not_in(name, modules)
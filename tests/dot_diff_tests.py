@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import socket
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import diff
+from dot import state
+
+
+class TestCaseDiff():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles folder with two entries and
+        links them with a run, which records the manifest.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        self.dotfiles = self.home + "/dotfiles"
+        os.makedirs(self.dotfiles + "/backup")
+        os.makedirs(self.dotfiles + "/files")
+        open(self.home + "/.bashrc", "w").write("bashrc")
+        open(self.home + "/.vimrc", "w").write("vimrc")
+        self.write_config({"bashrc": "/.bashrc", "vimrc": "/.vimrc"})
+        os.chdir(self.dotfiles)
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        main.run_command(None, [])
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def write_config(self, files):
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": files, "dot_path": "/dotfiles"}))
+
+    def test_manifest(self):
+        """
+        Test the manifest recorded by a run
+        """
+        manifest = state.load_manifest()
+
+        assert_equal(["bashrc", "vimrc"], sorted(manifest))
+        assert_equal("link", manifest["vimrc"]["kind"])
+        assert_equal(self.dotfiles + "/files/vimrc/.vimrc",
+                     manifest["vimrc"]["target"])
+        assert_equal([".vimrc"], list(manifest["vimrc"]["files"]))
+
+    def test_run_records_changed_entries(self):
+        """
+        Test the manifest recorded by later runs
+
+        A run that changes nothing shouldn't hash a file or write the
+        manifest, a run after a file was edited or the config changed should
+        record the new state and forget the entries that are no longer
+        tracked
+        """
+        with patch('dot.store.hash_file') as mock_hash_file:
+            with patch('dot.state.save_state') as mock_save_state:
+                main.run_command(None, [])
+
+        assert_equal(0, mock_hash_file.call_count)
+        assert_equal(0, mock_save_state.call_count)
+
+        open(self.home + "/.bashrc", "a").write("\nalias ll='ls -l'")
+        main.run_command(None, [])
+        main.run_command("diff", [])
+
+        open(self.home + "/.zshrc", "w").write("zshrc")
+        self.write_config({"bashrc": "/.bashrc", "zshrc": "/.zshrc"})
+        main.run_command(None, [])
+
+        assert_equal(["bashrc", "zshrc"], sorted(state.load_manifest()))
+
+    def test_other_runs_record(self):
+        """
+        Test the manifest after 'status --fix' and 'watch'
+
+        Every command that links entries should record them
+        """
+        os.unlink(self.home + "/.vimrc")
+        open("files/vimrc/.vimrc", "a").write("\nset number")
+
+        main.run_command("status", ["--fix"])
+        main.run_command("diff", [])
+
+        from dot import watch
+
+        open(self.home + "/.zshrc", "w").write("zshrc")
+        self.write_config({"bashrc": "/.bashrc", "vimrc": "/.vimrc",
+                           "zshrc": "/.zshrc"})
+        with patch('dot.watch.Inotify'):
+            watcher = watch.Watcher()
+            watcher.load()
+            watcher.converge()
+
+        assert_in("zshrc", state.load_manifest())
+        main.run_command("diff", [])
+
+    def test_no_changes(self):
+        """
+        Test the command 'diff' right after a run
+
+        Nothing should differ and no file should be hashed
+        """
+        with patch('dot.store.hash_file') as mock_hash_file:
+            main.run_command("diff", [])
+
+        assert_equal(0, mock_hash_file.call_count)
+        assert_in("0 added, 0 removed, 0 retargeted, 0 content-changed",
+                  self.output.getvalue())
+
+    def test_changes(self):
+        """
+        Test compare() after changing the config and the files
+
+        Every kind of change should be found
+        """
+        open(self.home + "/.zshrc", "w").write("zshrc")
+        self.write_config({"bashrc": "/.bash_profile", "zshrc": "/.zshrc"})
+        open("files/bashrc/.bashrc", "a").write("\nalias ll='ls -l'")
+
+        changes = diff.compare(
+            {"bashrc": "/.bashrc", "zshrc": "/.zshrc"},
+            state.load_manifest())
+
+        assert_equal([("bashrc", diff.CONTENT_CHANGED, None, None,
+                       [".bashrc"]),
+                      ("vimrc", diff.REMOVED, "/.vimrc -> %s/files/vimrc/"
+                       ".vimrc" % self.dotfiles, None, []),
+                      ("zshrc", diff.ADDED, None, "/.zshrc (file)", [])],
+                     changes)
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("diff", [])
+
+        assert_equal(1, cm.exception.code)
+        assert_in("bashrc: /.bashrc -> %s/files/bashrc/.bashrc => "
+                  "/.bash_profile (missing)" % self.dotfiles,
+                  self.output.getvalue())
+        assert_in("1 added, 1 removed, 1 retargeted, 1 content-changed",
+                  self.output.getvalue())
+
+    def test_against(self):
+        """
+        Test the command 'diff' against another manifest file
+        """
+        shutil.copy(state.MANIFEST_FILE, self.home + "/host.json")
+        os.unlink(self.home + "/.vimrc")
+
+        with assert_raises(SystemExit):
+            main.run_command("diff", ["--against", self.home + "/host.json"])
+        assert_in("/.vimrc (missing)", self.output.getvalue())
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("diff", ["--against", self.home + "/none.json"])
+        assert_in("none.json not found", cm.exception.code)
+
+    def test_special_files(self):
+        """
+        Test a run with a socket, a fifo and an unreadable file in the files
+        folder
+
+        Only regular files should be read, the others are recorded by their
+        kind and a file that can't be read doesn't stop the run
+        """
+        os.mkfifo("files/bashrc/fifo")
+        server = socket.socket(socket.AF_UNIX)
+        server.bind("files/bashrc/socket")
+        open("files/vimrc/secret", "w").write("secret")
+        os.unlink(state.MANIFEST_FILE)
+
+        def hash_file(path):
+            if path.endswith("secret"):
+                raise IOError(13, "Permission denied")
+            return "hash"
+
+        try:
+            with patch('dot.store.hash_file', side_effect=hash_file):
+                open(self.home + "/.zshrc", "w").write("zshrc")
+                self.write_config({"bashrc": "/.bashrc", "vimrc": "/.vimrc",
+                                   "zshrc": "/.zshrc"})
+                main.run_command(None, [])
+
+                changes = diff.compare(
+                    {"bashrc": "/.bashrc", "vimrc": "/.vimrc",
+                     "zshrc": "/.zshrc"}, state.load_manifest())
+        finally:
+            server.close()
+
+        files = state.load_manifest()["bashrc"]["files"]
+        assert_equal("kind:fifo", files["fifo"][3])
+        assert_equal("kind:socket", files["socket"][3])
+        assert_is_none(
+            state.load_manifest()["vimrc"]["files"]["secret"][3])
+        assert_equal([], changes)
@@ -0,0 +1,136 @@
+import sys
+import time
+import threading
+from StringIO import StringIO
+
+from nose.tools import *
+
+from dot import engine
+
+
+class TestCaseEngine():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.entries = {
+            "config": "/.config",
+            "nvim": "/.config/nvim",
+            "fish": "/.config/fish/config.fish",
+            "bashrc": "/.bashrc",
+        }
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+    def test_build_dependency_graph(self):
+        """
+        Test build_dependency_graph()
+
+        Entries nested in the path of another entry should have that entry as
+        parent, other entries have no parent.
+        """
+        parents, children = engine.build_dependency_graph(self.entries)
+
+        assert_equal(parents["nvim"], "config")
+        assert_equal(parents["fish"], "config")
+        assert_is_none(parents["config"])
+        assert_is_none(parents["bashrc"])
+        assert_equal(sorted(children["config"]), ["fish", "nvim"])
+
+    def test_run_entries_order(self):
+        """
+        Test run_entries() ordering
+
+        Whatever the number of jobs, a parent should be finished before its
+        children are started.
+        """
+        for jobs in (1, 4):
+            finished = []
+            lock = threading.Lock()
+
+            def func(name, path):
+                with lock:
+                    finished.append(name)
+                return 'linked'
+
+            results = engine.run_entries(self.entries, func, jobs)
+
+            assert_equal(len(results), 4)
+            assert_less(finished.index("config"), finished.index("nvim"))
+            assert_less(finished.index("config"), finished.index("fish"))
+
+    def test_run_entries_errors(self):
+        """
+        Test run_entries() when entries fail
+
+        A failing entry should be reported in its result and should not stop
+        the other entries from running.
+        """
+        def func(name, path):
+            if name == "config":
+                sys.exit("[ERROR] not able to find file")
+            if name == "bashrc":
+                raise OSError("Borg")
+            return 'linked'
+
+        results = dict((result.name, result)
+                       for result in engine.run_entries(self.entries, func, 2))
+
+        assert_equal(results["config"].outcome, 'error')
+        assert_in("not able to find file", results["config"].error)
+        assert_in("Borg", results["bashrc"].error)
+        assert_equal(results["nvim"].outcome, 'linked')
+        assert_is_none(results["nvim"].error)
+
+    def test_map_jobs(self):
+        """
+        Test map_jobs()
+
+        Whatever the number of jobs, the results should be in the order of the
+        items and no more than jobs items should be handled at the same time.
+        """
+        for jobs in (1, 3):
+            running = []
+            most = []
+            lock = threading.Lock()
+
+            def func(item):
+                with lock:
+                    running.append(item)
+                    most.append(len(running))
+                time.sleep(0.001)
+                with lock:
+                    running.remove(item)
+                return item * 2
+
+            assert_equal(range(0, 40, 2), engine.map_jobs(func, range(20),
+                                                          jobs))
+            assert_less_equal(max(most), jobs)
+
+        assert_equal([], engine.map_jobs(func, [], 4))
+
+    def test_map_jobs_errors(self):
+        """
+        Test map_jobs() when an item fails
+
+        The other items should still be handled before the exception is
+        raised again.
+        """
+        handled = []
+
+        def func(item):
+            if item == 3:
+                raise OSError("Borg")
+            handled.append(item)
+            return item
+
+        assert_raises(OSError, engine.map_jobs, func, range(10), 4)
+        assert_equal(range(10), sorted(handled + [3]))
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from nose.plugins.skip import SkipTest
+from mock import patch
+
+from dot import main
+from dot import fleet
+from dot import backup
+from dot import state
+
+
+class TestCaseFleet():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles folder and three homes: an
+        empty one, one with a file in the way and one with a linked file.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        self.dotfiles = self.home + "/dotfiles"
+        os.makedirs(self.dotfiles + "/backup")
+        os.makedirs(self.dotfiles + "/files/bashrc")
+        os.makedirs(self.dotfiles + "/files/nvim")
+        open(self.dotfiles + "/files/bashrc/.bashrc", "w").write("bashrc")
+        os.mkdir(self.dotfiles + "/files/nvim/nvim")
+
+        self.entries = {"bashrc": "/.bashrc", "nvim": "/.config/nvim",
+                        "vimrc": "/.vimrc"}
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": self.entries, "dot_path": "/dotfiles"}))
+        os.chdir(self.dotfiles)
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        self.homes = [self.home + "/users/" + user
+                      for user in ("picard", "riker", "troi")]
+        for home in self.homes:
+            os.makedirs(home)
+
+        open(self.homes[1] + "/.bashrc", "w").write("riker")
+        open(self.homes[1] + "/.vimrc", "w").write("riker")
+        os.symlink(self.dotfiles + "/files/bashrc/.bashrc",
+                   self.homes[2] + "/.bashrc")
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def check_homes(self):
+        for home in self.homes:
+            assert_equal(self.dotfiles + "/files/bashrc/.bashrc",
+                         os.readlink(home + "/.bashrc"))
+            assert_equal(self.dotfiles + "/files/nvim/nvim",
+                         os.readlink(home + "/.config/nvim"))
+
+        # Every home has its own manifest
+        for home in self.homes:
+            assert_equal(sorted(self.entries), sorted(state.load_manifest(
+                home + fleet.MANIFEST_FILE)))
+
+        # Files are never imported from the homes
+        assert_false(os.path.islink(self.homes[1] + "/.vimrc"))
+        assert_false(os.path.exists(self.dotfiles + "/files/vimrc"))
+
+        # The file in the way is backed up in the home
+        folder = self.homes[1] + fleet.BACKUP_DIR + "/bashrc"
+        generation = folder + "/" + os.listdir(folder)[-1]
+        assert_equal("riker", open(generation + "/.bashrc").read())
+        assert_equal([], backup.generations("bashrc"))
+
+    def test_link_homes(self):
+        """
+        Test link_homes()
+
+        Every home should be linked, by a pool or without
+        """
+        for jobs in (1, 3):
+            results = sorted(fleet.link_homes(self.entries, self.homes,
+                                              jobs))
+
+            self.check_homes()
+            assert_equal([2, 2, 2], [result.linked for result in results])
+            assert_equal([None] * 3, [result.error for result in results])
+
+        # Nothing is left to change on the second run
+        assert_equal([[]] * 3, [result.results for result in results])
+
+    def test_broken_home(self):
+        """
+        Test apply_homes() with a home that doesn't exist
+
+        The other homes should be linked and the broken one reported
+        """
+        with assert_raises(SystemExit) as cm:
+            main.run_command("apply", ["--homes"] + self.homes +
+                             [self.home + "/users/worf"], {"--jobs": "2"})
+
+        assert_in("1 of 4 homes failed", cm.exception.code)
+        self.check_homes()
+        assert_in("4 homes, 6 links", self.output.getvalue())
+
+    def test_homes_from(self):
+        """
+        Test the command 'apply' with the homes listed in a file
+        """
+        open(self.home + "/homes", "w").write(
+            "# crew\n\n" + "\n".join(self.homes) + "\n")
+
+        main.run_command("apply", ["--homes-from", self.home + "/homes"])
+
+        self.check_homes()
+        assert_in("[HOME] %s: 2 linked, 2 changed, 0 failed" % self.homes[0],
+                  self.output.getvalue())
+
+    def test_outside_home(self):
+        """
+        Test link_homes() with a folder of a home linked to outside of it
+
+        The entry should be refused and nothing created outside of the home
+        """
+        outside = self.home + "/outside"
+        os.mkdir(outside)
+        os.symlink(outside, self.homes[0] + "/.config")
+
+        result = list(fleet.link_homes(self.entries, self.homes[:1]))[0]
+
+        assert_equal([], os.listdir(outside))
+        assert_equal(1, result.linked)
+        assert_equal([("nvim", "error",
+                       "/.config/nvim is outside of the home")],
+                     [tuple(item) for item in result.results
+                      if item.error])
+
+    def test_owner(self):
+        """
+        Test link_homes() as root with a home of another user
+
+        The links and folders should be made by the owner of the home
+        """
+        if os.geteuid() != 0:
+            raise SkipTest("only root can switch to the owner of a home")
+
+        os.chmod(self.home, 0755)
+        for folder in (self.home + "/users", self.dotfiles):
+            os.chmod(folder, 0755)
+        os.chown(self.homes[0], 65534, 65534)
+
+        result = list(fleet.link_homes(self.entries, self.homes[:1]))[0]
+
+        assert_equal(None, result.error)
+        assert_equal(2, result.linked)
+        for path in ("/.bashrc", "/.config", "/.config/nvim"):
+            assert_equal(65534, os.lstat(self.homes[0] + path).st_uid)
+
+    def test_read_homes(self):
+        """
+        Test read_homes()
+        """
+        assert_equal(["/home/picard", "/home/riker"], fleet.read_homes(
+            ["# crew", "/home/picard", "", "  /home/riker  "]))
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import state
+from dot import store
+from dot import gitrepo
+
+
+class TestCaseGitRepo():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles repository with two entries
+        and a bare repository to push to.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        self.dotfiles = self.home + "/dotfiles"
+        os.makedirs(self.dotfiles + "/backup")
+        os.makedirs(self.dotfiles + "/files/bashrc")
+        os.makedirs(self.dotfiles + "/files/vimrc")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {"bashrc": "/.bashrc", "vimrc": "/.vimrc"},
+            "dot_path": "/dotfiles"}))
+        open(self.dotfiles + "/files/bashrc/.bashrc", "w").write("bashrc")
+        open(self.dotfiles + "/files/vimrc/.vimrc", "w").write("vimrc")
+        os.chdir(self.dotfiles)
+
+        self.environ = patch.dict(os.environ, {
+            "HOME": self.home,
+            "GIT_AUTHOR_NAME": "dot", "GIT_AUTHOR_EMAIL": "dot@example.com",
+            "GIT_COMMITTER_NAME": "dot",
+            "GIT_COMMITTER_EMAIL": "dot@example.com"})
+        self.environ.start()
+
+        assert_true(gitrepo.init())
+        subprocess.check_call(["git", "init", "-q", "--bare",
+                               self.home + "/remote.git"])
+        subprocess.check_call(["git", "remote", "add", "origin",
+                               self.home + "/remote.git"])
+        subprocess.check_call(["git", "config", "push.default", "current"])
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def committed(self, ref="HEAD"):
+        return subprocess.check_output(
+            ["git", "show", "--name-only", "--format=%s", ref]).split()
+
+    def test_scan_files(self):
+        """
+        Test scan_files()
+
+        Every entry should be changed before it was recorded, after that only
+        a file that changed its contents should be hashed and found
+        """
+        changed, records = state.scan_files(["bashrc", "vimrc"], {})
+        assert_equal(["bashrc", "vimrc"], changed)
+
+        recorded = state.record_files({}, records)
+        assert_equal([], state.scan_files(["bashrc", "vimrc"], recorded)[0])
+
+        # The same contents with another modification time isn't a change
+        os.utime("files/vimrc/.vimrc", (1000000000, 1000000000))
+        open("files/bashrc/.bashrc", "a").write("\nalias ll='ls -l'")
+
+        with patch('dot.store.hash_file',
+                   wraps=store.hash_file) as mock_hash_file:
+            changed, records = state.scan_files(["bashrc", "vimrc"],
+                                                recorded, jobs=2)
+
+        assert_equal(["bashrc"], changed)
+        assert_equal(2, mock_hash_file.call_count)
+
+    def test_removed_entry(self):
+        """
+        Test scan_files() for an entry that was removed
+
+        It should be changed, so the removal is committed
+        """
+        recorded = state.record_files(
+            {}, state.scan_files(["bashrc", "vimrc"], {})[1])
+        shutil.rmtree("files/vimrc")
+
+        assert_equal(["vimrc"], state.scan_files(["bashrc"], recorded)[0])
+
+    def test_commit_and_push(self):
+        """
+        Test the commands 'commit' and 'push'
+
+        Only the changed entries should be committed and pushed
+        """
+        main.run_command("commit", ["-m", "Add the dotfiles"])
+        assert_equal(["Add", "the", "dotfiles", "files/bashrc/.bashrc",
+                      "files/vimrc/.vimrc"], self.committed())
+
+        main.run_command("commit", [])
+        assert_in("nothing to commit", self.output.getvalue())
+
+        open("files/bashrc/.bashrc", "a").write("\nalias ll='ls -l'")
+        main.run_command("push", [])
+
+        assert_equal(["Update", "bashrc", "files/bashrc/.bashrc"],
+                     self.committed())
+        assert_equal(self.committed(), subprocess.check_output(
+            ["git", "--git-dir", self.home + "/remote.git", "show",
+             "--name-only", "--format=%s", "HEAD"]).split())
+
+    def test_status_changed(self):
+        """
+        Test check_status() after changing a committed file
+
+        The entry should be shown as changed
+        """
+        main.run_command("commit", [])
+        open("files/vimrc/.vimrc", "a").write("\nset number")
+
+        with assert_raises(SystemExit):
+            main.check_status([])
+
+        assert_in("vimrc: not committed", self.output.getvalue())
+        assert_not_in("bashrc: not committed", self.output.getvalue())
+
+    def test_status_git(self):
+        """
+        Test check_status() with files committed without dot
+
+        Git should tell which entries aren't committed, like 'dot commit'
+        """
+        subprocess.check_call(["git", "add", "files/bashrc"])
+        subprocess.check_call(["git", "commit", "-q", "-m", "bashrc"])
+        os.rename("files/bashrc/.bashrc", "files/bashrc/.bash_profile")
+
+        with patch('dot.store.hash_file') as mock_hash_file:
+            with assert_raises(SystemExit):
+                main.check_status([])
+
+        assert_equal(0, mock_hash_file.call_count)
+        assert_in("vimrc: not committed", self.output.getvalue())
+        assert_in("bashrc: not committed", self.output.getvalue())
+
+        subprocess.check_call(["git", "add", "-A", "files"])
+        subprocess.check_call(["git", "commit", "-q", "-m", "all"])
+        self.output.truncate(0)
+
+        with assert_raises(SystemExit):
+            main.check_status([])
+        assert_not_in("not committed", self.output.getvalue())
+
+        main.run_command("commit", [])
+        assert_in("nothing to commit", self.output.getvalue())
@@ -9,6 +9,7 @@ from nose.tools import *
 from mock import patch
 
 from dot import helpers
+from dot.errors import ConfigError, EntryError
 
 
 class TestCaseHelpers():
@@ -226,10 +227,10 @@ class TestCaseHelpers():
         """
         Test get_dotconfig() when there is no config file
 
-        When there is no dotconfig file it should raise a SystemExit and
-        display an error message
+        When there is no dotconfig file it should raise a ConfigError with
+        an error message
         """
-        with assert_raises(SystemExit) as cm:
+        with assert_raises(ConfigError) as cm:
             helpers.get_dotconfig(path="/Q/Continuum/")
         assert_in("not able to find data file", cm.exception.args[0])
 
@@ -238,14 +239,14 @@ class TestCaseHelpers():
         Test get_dotconfig() when parsing of the file fails
 
         When the data in the datafile is not parseable it should catch a
-        ValueError, raise a SystemError and display an error message
+        ValueError and raise a ConfigError with an error message
         """
         data = """ USS Stargazer """
         data_file = tempfile.NamedTemporaryFile()
         data_file.write(data)
         data_file.flush()
 
-        with assert_raises(SystemExit) as cm:
+        with assert_raises(ConfigError) as cm:
             helpers.get_dotconfig(path=data_file.name)
         assert_in("not able to parse data file", cm.exception.args[0])
 
@@ -267,9 +268,9 @@ class TestCaseHelpers():
         Test set_dotconfig() when it fails
 
         When it is not possible to write to the file, e.g. a wrong file path.
-        It should raise a SystemExit and display an error message.
+        It should raise a ConfigError with an error message.
         """
-        with assert_raises(SystemExit) as cm:
+        with assert_raises(ConfigError) as cm:
             helpers.set_dotconfig("Lore", path='doctor/noonien/soong/')
         assert_in("not able to write to data file", cm.exception.args[0])
 
@@ -292,12 +293,12 @@ class TestCaseHelpers():
         Test get_dot_path() when it's empty
 
         When the function can't find the path in the config file it should
-        raise a SystemExit and display an error message
+        raise a ConfigError with an error message
         """
         data = json.loads(self.dotconfig_non_tracking)
         mock_get_dotconfig.return_value = data
 
-        with assert_raises(SystemExit) as cm:
+        with assert_raises(ConfigError) as cm:
             helpers.get_dot_path()
         assert_in("path not found in config file", cm.exception.args[0])
 
@@ -316,3 +317,173 @@ class TestCaseHelpers():
         helpers.set_dot_path('path/to/dot/files')
 
         assert_in("set path/to/dot/files", self.output.getvalue())
+
+    def test_get_dotconfig_cached(self):
+        """
+        Test get_dotconfig() caching
+
+        Reading the same unchanged config file twice should only parse it
+        once and return the same data
+        """
+        count = helpers.dotconfig_parse_count
+
+        data = helpers.get_dotconfig(path=self.tempfile_tracking.name)
+        assert_is(data, helpers.get_dotconfig(
+            path=self.tempfile_tracking.name))
+        assert_equal(helpers.dotconfig_parse_count, count + 1)
+
+    def test_get_dotconfig_cache_invalidated(self):
+        """
+        Test get_dotconfig() cache invalidation
+
+        Writing the config file with set_dotconfig() should make the next
+        get_dotconfig() read the new data from the file
+        """
+        path = self.tempfile_non_tracking.name
+        helpers.get_dotconfig(path=path)
+
+        helpers.set_dotconfig({"files": {"Worf": "/.worf"}}, path=path)
+        assert_equal(helpers.get_dotconfig(path=path)['files'],
+                     {"Worf": "/.worf"})
+
+    def test_sqlite_config(self):
+        """
+        Test SqliteConfig
+
+        Entries and the dot path should be stored in the database and be
+        updated one by one
+        """
+        tempdir = tempfile.mkdtemp()
+        config = helpers.SqliteConfig(tempdir + "/.dotconfig.db")
+
+        config.save({"files": {"bashrc": "/.bashrc", "vimrc": "/.vimrc"},
+                     "dot_path": "/dotfiles"})
+        config.update_files(added={"zshrc": "/.zshrc"}, removed=["vimrc"])
+        config.set_dot_path("/enterprise")
+
+        data = helpers.SqliteConfig(tempdir + "/.dotconfig.db").load()
+        assert_equal(data, {"files": {"bashrc": "/.bashrc", "zshrc": "/.zshrc"},
+                            "dot_path": "/enterprise"})
+
+        shutil.rmtree(tempdir)
+
+    def test_sqlite_config_tags(self):
+        """
+        Test SqliteConfig with tags
+
+        The tags should be stored and forgotten with their entry
+        """
+        tempdir = tempfile.mkdtemp()
+        config = helpers.SqliteConfig(tempdir + "/.dotconfig.db")
+
+        config.save({"files": {"bashrc": "/.bashrc", "vimrc": "/.vimrc"},
+                     "tags": {"bashrc": ["shell"], "vimrc": ["editor"]},
+                     "dot_path": "/dotfiles"})
+        config.update_files(removed=["vimrc"])
+
+        data = helpers.SqliteConfig(tempdir + "/.dotconfig.db").load()
+        assert_equal(data["tags"], {"bashrc": ["shell"]})
+
+        shutil.rmtree(tempdir)
+
+    def test_sqlite_config_duplicate_path(self):
+        """
+        Test SqliteConfig with a path that is already tracked
+
+        A path can only be tracked once, it should raise a ConfigError with
+        an error message
+        """
+        tempdir = tempfile.mkdtemp()
+        config = helpers.SqliteConfig(tempdir + "/.dotconfig.db")
+        config.update_files(added={"bashrc": "/.bashrc"})
+
+        with assert_raises(ConfigError) as cm:
+            config.update_files(added={"bash": "/.bashrc"})
+        assert_in("not able to update data file", cm.exception.args[0])
+
+        shutil.rmtree(tempdir)
+
+    def test_sharded_config(self):
+        """
+        Test ShardedConfig
+
+        Every entry should get its own file, a change should only write the
+        files of the entries involved
+        """
+        tempdir = tempfile.mkdtemp()
+        config = helpers.ShardedConfig(tempdir + "/.dotconfig.d")
+
+        config.save({"files": {"bashrc": "/.bashrc", "vimrc": "/.vimrc"},
+                     "tags": {"vimrc": ["editor"]},
+                     "dot_path": "/dotfiles"})
+        assert_equal(sorted(os.listdir(tempdir + "/.dotconfig.d")),
+                     [".root.json", "bashrc.json", "vimrc.json"])
+
+        os.utime(tempdir + "/.dotconfig.d/bashrc.json", (0, 0))
+        config.update_files(added={"zshrc": "/.zshrc"}, removed=["vimrc"])
+        config.set_dot_path("/enterprise")
+
+        assert_equal(0, os.stat(
+            tempdir + "/.dotconfig.d/bashrc.json").st_mtime)
+        assert_equal(json.load(open(tempdir + "/.dotconfig.d/zshrc.json")),
+                     {"path": "/.zshrc"})
+
+        data = helpers.ShardedConfig(tempdir + "/.dotconfig.d").load()
+        assert_equal(data, {"files": {"bashrc": "/.bashrc", "zshrc": "/.zshrc"},
+                            "dot_path": "/enterprise"})
+
+        shutil.rmtree(tempdir)
+
+    def test_sharded_config_names(self):
+        """
+        Test ShardedConfig with names that aren't valid file names
+
+        The names should be escaped, so every entry is a file in the folder
+        and none of them replaces the root shard
+        """
+        tempdir = tempfile.mkdtemp()
+        config = helpers.ShardedConfig(tempdir + "/.dotconfig.d")
+        files = {".root": "/.root", "vim/colors": "/.vim/colors",
+                 "../escape": "/.escape", "100%": "/.percent"}
+
+        config.save({"files": files, "dot_path": "/dotfiles"})
+        assert_equal(sorted(os.listdir(tempdir + "/.dotconfig.d")), [
+            "%2E.%2Fescape.json", "%2Eroot.json", ".root.json",
+            "100%25.json", "vim%2Fcolors.json"])
+        assert_equal(sorted(os.listdir(tempdir)), [".dotconfig.d"])
+
+        data = helpers.ShardedConfig(tempdir + "/.dotconfig.d").load()
+        assert_equal(data, {"files": files, "dot_path": "/dotfiles"})
+
+        config.update_files(removed=["vim/colors"])
+        assert_false(os.path.exists(
+            tempdir + "/.dotconfig.d/vim%2Fcolors.json"))
+
+        with assert_raises(EntryError):
+            config.update_files(added={"": "/.empty"})
+
+        shutil.rmtree(tempdir)
+
+    def test_get_config_backend(self):
+        """
+        Test get_config_backend()
+
+        The JSON file should be used, unless there is a ~/.dotconfig.db
+        database or a ~/.dotconfig.d folder
+        """
+        tempdir = tempfile.mkdtemp()
+
+        with patch.dict(os.environ, {"HOME": tempdir}):
+            assert_is_instance(helpers.get_config_backend(),
+                               helpers.JsonConfig)
+
+            os.mkdir(tempdir + "/.dotconfig.d")
+            assert_is_instance(helpers.get_config_backend(),
+                               helpers.ShardedConfig)
+
+            helpers.get_sqlite_config().set_dot_path("/dotfiles")
+            assert_is_instance(helpers.get_config_backend(),
+                               helpers.SqliteConfig)
+            assert_equal(helpers.get_dot_path(), tempdir + "/dotfiles")
+
+        shutil.rmtree(tempdir)
@@ -0,0 +1,176 @@
+import os
+import shutil
+import fnmatch
+import tempfile
+
+from nose.tools import *
+from mock import patch
+
+from dot.index import ConfigIndex
+
+
+class TestCaseIndex():
+
+    def setup(self):
+        """
+        Creates a home folder with a folder that is reachable through a
+        symlink
+
+        home
+        |-.config
+        |-cfg -> .config
+        """
+        self.home = tempfile.mkdtemp()
+        os.mkdir(self.home + "/.config")
+        os.symlink(".config", self.home + "/cfg")
+
+        self.files = {"bashrc": "/.bashrc", "nvim": "/.config/nvim"}
+        self.index = ConfigIndex(self.files, home=self.home)
+
+    def teardown(self):
+        shutil.rmtree(self.home)
+
+    def test_canonical(self):
+        """
+        Test canonical()
+
+        Paths should be made relative to the home folder with the folders
+        resolved, but not the last part of the path
+        """
+        assert_equal(self.index.canonical(self.home + "/./.bashrc"),
+                     "/.bashrc")
+        assert_equal(self.index.canonical(self.home + "//cfg/nvim"),
+                     "/.config/nvim")
+        assert_equal(self.index.canonical(self.home + "/cfg"), "/cfg")
+        assert_equal(self.index.canonical("/etc/hosts"), "/etc/hosts")
+
+    def test_home_path(self):
+        """
+        Test home_path()
+
+        Paths in the home folder should get the form stored in the config, in
+        any form they're given, other paths none
+        """
+        cwd = os.getcwd()
+        os.chdir(self.home)
+
+        try:
+            assert_equal(self.index.home_path("./.bashrc"), "/.bashrc")
+            assert_equal(self.index.home_path("cfg/nvim"), "/.config/nvim")
+        finally:
+            os.chdir(cwd)
+
+        assert_equal(self.index.home_path(
+            os.path.realpath(self.home) + "/.bashrc"), "/.bashrc")
+        assert_is_none(self.index.home_path("/etc/hosts"))
+
+    def test_name_for(self):
+        """
+        Test name_for() and path_for()
+
+        Paths should be found by name and names by any form of the path
+        """
+        assert_equal(self.index.name_for(self.home + "/cfg/nvim"), "nvim")
+        assert_equal(self.index.path_for("nvim"), "/.config/nvim")
+        assert_is_none(self.index.name_for(self.home + "/.vimrc"))
+        assert_is_none(self.index.path_for("vimrc"))
+
+    def test_add_and_remove(self):
+        """
+        Test add() and remove()
+
+        Changes should update both the config files and the index
+        """
+        self.index.add("vimrc", "/.vimrc")
+        self.index.add("nvim", "/.config/neovim")
+        self.index.remove("bashrc")
+
+        assert_equal(self.files, {"vimrc": "/.vimrc",
+                                  "nvim": "/.config/neovim"})
+        assert_equal(self.index.name_for(self.home + "/.vimrc"), "vimrc")
+        assert_equal(self.index.name_for(self.home + "/cfg/neovim"), "nvim")
+        assert_is_none(self.index.name_for(self.home + "/.config/nvim"))
+        assert_is_none(self.index.name_for(self.home + "/.bashrc"))
+
+    def test_names_with_prefix(self):
+        """
+        Test names_with_prefix()
+
+        Only the names starting with the prefix should be found, also after
+        changes to the index
+        """
+        self.index.add("bash_profile", "/.bash_profile")
+        assert_equal(self.index.names_with_prefix("bash"),
+                     ["bash_profile", "bashrc"])
+
+        self.index.remove("bashrc")
+        self.index.add("vimrc", "/.vimrc")
+
+        assert_equal(self.index.names_with_prefix("bash"), ["bash_profile"])
+        assert_equal(self.index.names_with_prefix("x"), [])
+        assert_equal(self.index.names(), ["bash_profile", "nvim", "vimrc"])
+
+    def test_find(self):
+        """
+        Test find()
+
+        Names should be filtered by prefix, glob pattern and folder
+        """
+        self.index.add("neovim", "/.config/neovim")
+        self.index.add("config", "/.config")
+
+        assert_equal(self.index.find(), ["bashrc", "config", "neovim", "nvim"])
+        assert_equal(self.index.find(prefix="n"), ["neovim", "nvim"])
+        assert_equal(self.index.find(pattern="*rc"), ["bashrc"])
+        assert_equal(self.index.find(under=self.home + "/cfg"),
+                     ["config", "neovim", "nvim"])
+        assert_equal(self.index.find(prefix="n", pattern="*vim",
+                                     under=self.home + "/.config"),
+                     ["neovim", "nvim"])
+
+    def test_find_pattern_prefix(self):
+        """
+        Test find() with a glob pattern that starts with a literal part
+
+        Only the names starting with that part should be matched
+        """
+        self.index.add("neovim", "/.config/neovim")
+        self.index.add("config", "/.config")
+
+        with patch('dot.index.fnmatch.fnmatchcase',
+                   wraps=fnmatch.fnmatchcase) as fnmatchcase:
+            assert_equal(self.index.find(pattern="n*vim"), ["neovim", "nvim"])
+            assert_equal(self.index.find(prefix="ne", pattern="n*"),
+                         ["neovim"])
+            assert_equal(self.index.find(prefix="n", pattern="nv?m"),
+                         ["nvim"])
+            assert_equal(self.index.find(prefix="b", pattern="n*"), [])
+
+        assert_equal(["neovim", "nvim", "neovim", "nvim"],
+                     [call[0][0] for call in fnmatchcase.call_args_list])
+
+    def test_select(self):
+        """
+        Test select()
+
+        Names should be selected by glob pattern and by tag, and left out by
+        either
+        """
+        index = ConfigIndex(
+            {"shell:bash": "/.bashrc", "shell:zsh": "/.zshrc",
+             "vimrc": "/.vimrc", "nvim": "/.config/nvim"},
+            home=self.home,
+            tags={"vimrc": ["editor"], "nvim": ["editor"],
+                  "shell:zsh": ["old"]})
+
+        assert_equal(index.select(), set(index.files))
+        assert_equal(index.select(only=["shell:*"]),
+                     set(["shell:bash", "shell:zsh"]))
+        assert_equal(index.select(tags=["editor"]), set(["vimrc", "nvim"]))
+        assert_equal(index.select(only=["shell:*"], tags=["editor"],
+                                  exclude=["old", "n*"]),
+                     set(["shell:bash", "vimrc"]))
+
+        index.remove("vimrc")
+        assert_equal(index.select(tags=["editor"]), set(["nvim"]))
+        assert_equal(index.tags, {"nvim": ["editor"], "shell:zsh": ["old"]})
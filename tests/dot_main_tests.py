@@ -9,6 +9,7 @@ from nose.tools import *
 from mock import patch
 
 from dot import main
+from dot import helpers
 
 
 class TestCaseMain():
@@ -168,41 +169,237 @@ class TestCaseMain():
         data = json.loads(self.dotconfig_tracking)
         mock_get_dotconfig.return_value = data
 
-        args = ["tempfile", "path/to/testfile"]
+        args = ["tempfile", os.path.expanduser("~") + "/path/to/testfile"]
         with assert_raises(SystemExit) as cm:
             main.add(args)
         assert_in("is already being tracked", cm.exception.args[0])
 
+    def make_home(self, entries):
+        """
+        Create a home folder with a dotfiles folder in which the given entries
+        are already tracked and linked, returns the path of the home folder
+        """
+        home = tempfile.mkdtemp()
+        os.makedirs(home + "/dotfiles/backup")
+
+        for name, path in entries.iteritems():
+            os.makedirs(home + "/dotfiles/files/" + name)
+            src = home + "/dotfiles/files/" + name + path
+            open(src, "w").write(name)
+            os.symlink(src, home + path)
+
+        open(home + "/.dotconfig", "w").write(json.dumps(
+            {"files": entries, "dot_path": "/dotfiles"}))
+        os.chdir(home + "/dotfiles")
+
+        return home
+
     def test_command_remove(self):
         """
-        TODO
+        Test command 'rm'
+
+        Removing entries should move the files back to their prior location
+        and remove them from the .dotconfig file
+        """
+        home = self.make_home({"bashrc": "/.bashrc", "vimrc": "/.vimrc",
+                               "zshrc": "/.zshrc"})
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.run_command("rm", ["bashrc", "vimrc"], {"--jobs": "2"})
+
+            assert_equal(helpers.get_dotconfig()['files'],
+                         {"zshrc": "/.zshrc"})
+
+        assert_false(os.path.islink(home + "/.bashrc"))
+        assert_equal(open(home + "/.vimrc").read(), "vimrc")
+        assert_false(os.path.exists(home + "/dotfiles/files/bashrc"))
+        assert_in("bashrc removed from .dotconfig", self.output.getvalue())
+
+        shutil.rmtree(home)
+
+    def test_command_remove_sharded(self):
+        """
+        Test command 'rm' with the config in ~/.dotconfig.d
+
+        Only the file of the removed entry should be touched
         """
-        # make folders
-        # make symlink
-        # excute remove
-        pass
+        home = self.make_home({"bashrc": "/.bashrc", "vimrc": "/.vimrc"})
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.run_command("import-json", ["--sharded"])
+            os.utime(home + "/.dotconfig.d/vimrc.json", (0, 0))
+
+            main.run_command("rm", ["bashrc"])
+
+            assert_equal(helpers.load_config()['files'], {"vimrc": "/.vimrc"})
+            assert_equal(helpers.get_dot_path(), home + "/dotfiles")
+
+        assert_equal(sorted(os.listdir(home + "/.dotconfig.d")),
+                     [".root.json", "vimrc.json"])
+        assert_equal(0, os.stat(home + "/.dotconfig.d/vimrc.json").st_mtime)
+
+        shutil.rmtree(home)
 
     def test_command_remove_file_not_found_on_system(self):
         """
-        TODO
+        Test command 'rm' when the tracked file is missing
+
+        When the file is not in the files folder, it should raise a
+        SystemExit and keep the entry in the .dotconfig file
         """
-        pass
+        home = self.make_home({"bashrc": "/.bashrc"})
+        os.unlink(home + "/dotfiles/files/bashrc/.bashrc")
+
+        with patch.dict(os.environ, {"HOME": home}):
+            with assert_raises(SystemExit) as cm:
+                main.remove(["bashrc"])
+            assert_in("1 of 1 entries failed", cm.exception.args[0])
+            assert_in("not able to find file", self.output.getvalue())
+
+            assert_equal(helpers.get_dotconfig()['files'],
+                         {"bashrc": "/.bashrc"})
+
+        shutil.rmtree(home)
 
     def test_command_remove_file_not_found_in_dotconfig(self):
         """
-        TODO
+        Test command 'rm' when a name is not tracked
+
+        Nothing should be removed when one of the names is not in the
+        .dotconfig file, it should raise a SystemExit
+        """
+        home = self.make_home({"bashrc": "/.bashrc"})
+
+        with patch.dict(os.environ, {"HOME": home}):
+            with assert_raises(SystemExit) as cm:
+                main.remove(["bashrc", "Q"])
+            assert_in("not able to find Q in .dotconfig",
+                      cm.exception.args[0])
+
+        assert_true(os.path.islink(home + "/.bashrc"))
+
+        shutil.rmtree(home)
+
+    def test_command_remove_by_path(self):
+        """
+        Test command 'rm' with paths
+
+        Entries should be found by their path
+        """
+        home = self.make_home({"bashrc": "/.bashrc", "vimrc": "/.vimrc"})
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.remove(["--path", home + "/./.vimrc"])
+
+            assert_equal(helpers.load_config()['files'],
+                         {"bashrc": "/.bashrc"})
+
+        assert_false(os.path.islink(home + "/.vimrc"))
+
+        shutil.rmtree(home)
+
+    def test_command_which(self):
+        """
+        Test command 'which'
+
+        It should display the name of a tracked path and raise a SystemExit
+        for untracked paths
+        """
+        home = self.make_home({"bashrc": "/.bashrc"})
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.run_command("which", [home + "/.bashrc"])
+            assert_in("bashrc", self.output.getvalue())
+
+            with assert_raises(SystemExit) as cm:
+                main.which([home + "/.vimrc"])
+            assert_in("not being tracked", cm.exception.args[0])
+
+        shutil.rmtree(home)
+
+    def test_command_add_from_manifest(self):
+        """
+        Test command 'add' with a manifest
+
+        All entries of the manifest should be added at once
+        """
+        home = self.make_home({})
+        open(home + "/.bashrc", "w").close()
+        open(home + "/.vimrc", "w").close()
+
+        manifest = tempfile.NamedTemporaryFile()
+        manifest.write("# name\tpath\nbashrc\t%s/.bashrc\n\n"
+                       "vimrc ~/.vimrc\n" % home)
+        manifest.flush()
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.add(["--from", manifest.name])
+
+            assert_equal(helpers.get_dotconfig()['files'],
+                         {"bashrc": "/.bashrc", "vimrc": "/.vimrc"})
+        assert_in("2 entries added", self.output.getvalue())
+
+        manifest.close()
+        shutil.rmtree(home)
+
+    def test_command_add_relative_path(self):
+        """
+        Test command 'add' with a path relative to the working directory
+
+        The path should be stored relative to the home folder, in the form
+        the run links
+        """
+        home = self.make_home({})
+        open(home + "/.bashrc", "w").close()
+        os.chdir(home)
+
+        with patch.dict(os.environ, {"HOME": home}):
+            main.add(["bashrc", "./.bashrc"])
+
+            assert_equal(helpers.get_dotconfig()['files'],
+                         {"bashrc": "/.bashrc"})
+
+            with assert_raises(SystemExit) as cm:
+                main.add(["hosts", "/etc/hosts"])
+            assert_in("not in the home folder", cm.exception.args[0])
+
+        shutil.rmtree(home)
+
+    def test_command_add_from_manifest_invalid(self):
+        """
+        Test command 'add' with a manifest that has problems
+
+        Nothing should be added when any of the entries has a problem and all
+        problems should be listed
         """
-        pass
+        home = self.make_home({"bashrc": "/.bashrc"})
+        open(home + "/.vimrc", "w").close()
+
+        with patch.dict(os.environ, {"HOME": home}):
+            with patch('sys.stdin', StringIO(
+                    "vimrc ~/.vimrc\nvimrc ~/.gvimrc\n")):
+                with assert_raises(SystemExit) as cm:
+                    main.add([])
+            assert_in("nothing was added, 2 problems found",
+                      cm.exception.args[0])
+
+            assert_equal(helpers.get_dotconfig()['files'],
+                         {"bashrc": "/.bashrc"})
+
+        assert_in("does not exist", self.output.getvalue())
+        assert_in("vimrc is given more than once", self.output.getvalue())
+
+        shutil.rmtree(home)
 
     @patch('dot.helpers.check_backup_and_files_folders')
     @patch('dot.helpers.get_dotconfig')
     @patch('dot.helpers.make_and_move_to_dir')
     @patch('dot.helpers.create_symlink')
     def test_command_run_from_main(self,
-                                   mock_get_backup_and_files_folders,
-                                   mock_get_dotconfig,
+                                   mock_create_symlink,
                                    mock_make_and_move_dir,
-                                   mock_create_symlink):
+                                   mock_get_dotconfig,
+                                   mock_get_backup_and_files_folders):
         """
         Test command 'run' from main.py
 
@@ -231,6 +428,28 @@ class TestCaseMain():
             main.run()
         assert_in("no backup and/or files folder found", cm.exception.args[0])
 
+    def test_command_run_parses_config_once(self):
+        """
+        Test command 'run' parses the config file once
+
+        A full run reads the config for the entries and for the dot path, the
+        .dotconfig file should only be decoded a single time.
+        """
+        home = tempfile.mkdtemp()
+        os.mkdir(home + "/dotfiles")
+        os.mkdir(home + "/dotfiles/backup")
+        os.mkdir(home + "/dotfiles/files")
+        open(home + "/.dotconfig", "w").write(json.dumps(
+            {"files": {"bashrc": "/.bashrc"}, "dot_path": "/dotfiles"}))
+        os.chdir(home + "/dotfiles")
+
+        with patch.dict(os.environ, {"HOME": home}):
+            count = helpers.dotconfig_parse_count
+            assert_true(main.run())
+            assert_equal(helpers.dotconfig_parse_count, count + 1)
+
+        shutil.rmtree(home)
+
     @patch('dot.helpers.get_dotconfig')
     def test_command_list_tracked_files(self, mock_get_dotconfig):
         """
@@ -247,6 +466,35 @@ class TestCaseMain():
         assert_in(
             "The following files are being tracked", self.output.getvalue())
 
+    @patch('dot.helpers.get_dotconfig')
+    def test_command_list_filters(self, mock_get_dotconfig):
+        """
+        Test command 'list' with filters, sorting and paging
+
+        Only the selected page of the matching entries should be shown
+        """
+        mock_get_dotconfig.return_value = {
+            "files": {"vimrc": "/.vimrc", "bashrc": "/.bashrc",
+                      "bash_profile": "/.profile", "nvim": "/.config/nvim"},
+            "dot_path": "/dotfiles"}
+
+        main.run_command("list", ["--prefix", "bash", "--sort", "path"])
+        lines = self.output.getvalue().splitlines()
+        assert_equal(["bashrc /.bashrc", "bash_profile /.profile"],
+                     lines[-2:])
+
+        main.run_command("list", ["--glob", "*rc", "--offset", "1",
+                                  "--limit", "1"])
+        assert_equal("vimrc /.vimrc",
+                     self.output.getvalue().splitlines()[-1])
+
+        main.run_command("list", ["--path-under", "~/.config", "--count"])
+        assert_equal("1", self.output.getvalue().splitlines()[-1])
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("list", ["--sort", "size"])
+        assert_in("--sort should be name or path", cm.exception.code)
+
     @patch('dot.helpers.get_dotconfig')
     def test_command_list_no_tracked_files(self, mock_get_dotconfig):
         """
@@ -261,3 +509,44 @@ class TestCaseMain():
         main.run_command("list", "")
         assert_in("No files are being tracked, add them with 'dot add'",
                   self.output.getvalue())
+
+    def test_commands_use_repository(self):
+        """
+        Test commands 'run', 'apply' and 'status' go through DotRepository
+
+        The repository of the home folder should link and check the entries,
+        its errors should exit with their message
+        """
+        home = tempfile.mkdtemp()
+        os.makedirs(home + "/dotfiles/backup")
+        os.makedirs(home + "/dotfiles/files")
+        open(home + "/.bashrc", "w").close()
+        open(home + "/.dotconfig", "w").write(json.dumps(
+            {"files": {"bashrc": "/.bashrc"}, "dot_path": "/dotfiles"}))
+        os.chdir(home + "/dotfiles")
+
+        with patch.dict(os.environ, {"HOME": home}):
+            from dot.repository import DotRepository
+
+            run = DotRepository.run.__func__
+            homes = []
+
+            def run_repository(repository, *args):
+                homes.append(repository.home)
+                return run(repository, *args)
+
+            with patch.object(DotRepository, 'run', run_repository):
+                main.run_command(None, [], {"--jobs": "2"})
+            assert_equal([home], homes)
+            assert_true(os.path.islink(home + "/.bashrc"))
+
+            main.run_command("apply", [])
+            main.run_command("status", [])
+            assert_in("1 linked", self.output.getvalue())
+
+            with assert_raises(SystemExit) as cm:
+                main.run_command("status", [], {"--only": "zsh"})
+            assert_in("no entries selected", cm.exception.code)
+
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(home)
@@ -0,0 +1,136 @@
+import os
+import stat
+import errno
+import socket
+import shutil
+import tempfile
+
+from nose.tools import *
+from mock import patch
+
+from dot import move
+
+
+def _exdev(src, dst):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+class TestCaseMove():
+
+    def setup(self):
+        """
+        Creates a folder to move with a file, a nested folder and a symlink
+
+        tempdir
+        |-src
+          |-holodeck
+          |-deck
+          | |-ten
+          |-bridge -> deck
+        """
+        self.tempdir = tempfile.mkdtemp()
+        self.src = self.tempdir + "/src"
+        self.dst = self.tempdir + "/dst"
+
+        os.makedirs(self.src + "/deck")
+        open(self.src + "/holodeck", "w").write("Computer, arch." * 1000)
+        open(self.src + "/deck/ten", "w").write("Ten Forward")
+        os.chmod(self.src + "/deck/ten", 0600)
+        os.utime(self.src + "/deck/ten", (1000000000, 1000000000))
+        os.symlink("deck", self.src + "/bridge")
+
+    def teardown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_move_same_device(self):
+        """
+        Test move() on the same device
+
+        It should rename the folder without copying any data
+        """
+        stats = move.move(self.src, self.dst)
+
+        assert_false(stats.cross_device)
+        assert_equal(stats.bytes, 0)
+        assert_false(os.path.exists(self.src))
+        assert_true(os.path.exists(self.dst + "/deck/ten"))
+
+    @patch('os.rename', _exdev)
+    def test_move_cross_device(self):
+        """
+        Test move() across devices
+
+        When renaming isn't possible, the folder should be copied with its
+        contents, symlinks and metadata and the source should be removed
+        """
+        stats = move.move(self.src, self.dst)
+
+        assert_true(stats.cross_device)
+        assert_equal(stats.bytes, 15000 + 11)
+        assert_false(os.path.exists(self.src))
+        assert_equal(open(self.dst + "/holodeck").read(),
+                     "Computer, arch." * 1000)
+        assert_equal(open(self.dst + "/deck/ten").read(), "Ten Forward")
+        assert_equal(os.stat(self.dst + "/deck/ten").st_mode & 0777, 0600)
+        assert_equal(os.stat(self.dst + "/deck/ten").st_mtime, 1000000000)
+        assert_equal(os.readlink(self.dst + "/bridge"), "deck")
+
+    @patch('os.rename', _exdev)
+    def test_move_cross_device_fallback(self):
+        """
+        Test move() across devices without kernel copy support
+
+        When none of the kernel copy methods work, the data should be copied
+        through Python
+        """
+        with patch.object(move, '_available_methods', return_value=[]):
+            move.move(self.src + "/holodeck", self.dst)
+
+        assert_equal(open(self.dst).read(), "Computer, arch." * 1000)
+        assert_false(os.path.exists(self.src + "/holodeck"))
+
+    @patch('os.rename', _exdev)
+    def test_move_cross_device_special_files(self):
+        """
+        Test move() across devices of a folder with a FIFO and a socket
+
+        The FIFO should be created again without blocking, the socket should
+        stop the move with a shutil.Error and leave the source alone
+        """
+        os.mkfifo(self.src + "/deck/comms")
+
+        move.move(self.src, self.dst)
+        assert_true(stat.S_ISFIFO(os.lstat(self.dst + "/deck/comms").st_mode))
+
+        server = socket.socket(socket.AF_UNIX)
+        server.bind(self.dst + "/deck/sensor")
+        try:
+            with assert_raises(shutil.Error) as cm:
+                move.move(self.dst, self.src)
+        finally:
+            server.close()
+
+        assert_in("is a socket", str(cm.exception))
+        assert_true(os.path.exists(self.dst + "/deck/ten"))
+        assert_false(os.path.exists(self.src))
+
+    def test_move_destination_exists(self):
+        """
+        Test move() when the destination already exists
+
+        It should raise a shutil.Error and leave both paths alone
+        """
+        os.mkdir(self.dst)
+
+        with assert_raises(shutil.Error):
+            move.move(self.src, self.dst)
+        assert_true(os.path.exists(self.src))
+
+    def test_move_source_missing(self):
+        """
+        Test move() when the source doesn't exist
+
+        It should raise an IOError
+        """
+        with assert_raises(IOError):
+            move.move(self.tempdir + "/Q", self.dst)
@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import output
+from dot import colors
+
+
+class TestCaseOutput():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a home folder with a file to track.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        os.makedirs(self.home + "/dotfiles/backup")
+        os.makedirs(self.home + "/dotfiles/files")
+        open(self.home + "/.bashrc", "w").write("Make it so")
+        open(self.home + "/.dotconfig", "w").write(
+            '{"files": {"bashrc": "/.bashrc", "vimrc": "/.vimrc"}, '
+            '"dot_path": "/dotfiles"}')
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+    def teardown(self):
+        output.finish()
+
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_buffered(self):
+        """
+        Test buffered output
+
+        Lines are only written when flushed, or when the buffer is full
+        """
+        output.start()
+        output.notice("Engage")
+        assert_equal("", self.output.getvalue())
+
+        output.flush()
+        assert_equal("[NOTICE] Engage\n", self.output.getvalue())
+
+        for number in range(output.BUFFER_LINES):
+            output.line("line %d" % number)
+        assert_in("line %d" % (output.BUFFER_LINES - 1),
+                  self.output.getvalue())
+
+    def test_unbuffered(self):
+        """
+        Test output outside of a command
+
+        Without start() lines are written directly, with colours
+        """
+        output.notice("Engage")
+        assert_equal(colors.blue("[NOTICE]") + " Engage\n",
+                     self.output.getvalue())
+
+    def test_silence(self):
+        """
+        Test silence()
+
+        Only the output of the silenced thread should be dropped, the workers
+        it starts on the engine are silenced too
+        """
+        from dot import engine
+
+        def work():
+            output.silence()
+            output.error("Red alert")
+            engine.map_jobs(output.notice, ["Engage", "Make it so"], 2)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+        assert_false(output.is_silenced())
+        output.notice("Engage")
+
+        assert_equal(colors.blue("[NOTICE]") + " Engage\n",
+                     self.output.getvalue())
+
+    def test_no_colors_when_not_a_terminal(self):
+        """
+        Test colours
+
+        No ANSI escapes are written when the output isn't a terminal
+        """
+        main.run_command("list", [])
+        assert_in("bashrc /.bashrc", self.output.getvalue())
+        assert_not_in("\033[", self.output.getvalue())
+
+    def test_colors_on_a_terminal(self):
+        """
+        Test colours on a terminal
+
+        A terminal gets ANSI escapes, unless NO_COLOR is set
+        """
+        terminal = StringIO()
+        terminal.isatty = lambda: True
+
+        assert_true(colors.stream_supports_colors(terminal))
+        with patch.dict(os.environ, {"NO_COLOR": "1"}):
+            assert_false(colors.stream_supports_colors(terminal))
+
+    def test_quiet(self):
+        """
+        Test command 'run' with --quiet
+
+        Only the errors should be written
+        """
+        open(self.home + "/.vimrc", "w").write("Make it so")
+        os.mkdir(self.home + "/dotfiles/files/vimrc")
+        open(self.home + "/dotfiles/files/vimrc/.vimrc", "w").write("Engage")
+        open(self.home + "/dotfiles/backup/vimrc", "w").write("Engage")
+
+        with assert_raises(SystemExit):
+            main.run_command(None, [], {'--quiet': True})
+
+        assert_not_in("[NOTICE]", self.output.getvalue())
+        assert_in("backup/vimrc is not a folder", self.output.getvalue())
+        assert_in("(vimrc)", self.output.getvalue())
+
+    def test_summary(self):
+        """
+        Test command 'run' with --summary
+
+        The notices per entry should be replaced by the number of entries per
+        outcome
+        """
+        main.run_command(None, [], {'--summary': True})
+
+        assert_not_in("[NOTICE]", self.output.getvalue())
+        assert_in("[SUMMARY] 1 imported, 1 missing", self.output.getvalue())
+
+    def test_ndjson(self):
+        """
+        Test command 'run' with --format ndjson
+
+        Every line should be a JSON object describing an event, without any
+        of the text output
+        """
+        main.run_command(None, [], {'--format': "ndjson"})
+
+        events = [json.loads(line)
+                  for line in self.output.getvalue().splitlines()]
+        kinds = [(event["event"], event.get("name")) for event in events]
+
+        assert_equal([("checked", "bashrc"), ("moved", "bashrc"),
+                      ("linked", "bashrc"), ("checked", "vimrc"),
+                      ("skipped", "vimrc"), ("summary", None)], kinds)
+        assert_equal(10, events[1]["bytes"])
+        assert_equal(self.home + "/.bashrc", events[2]["origin"])
+        assert_equal({"imported": 1, "missing": 1}, events[5]["counts"])
+
+    def test_ndjson_error(self):
+        """
+        Test errors with --format ndjson
+
+        A command that exits with an error should write an error event
+        """
+        with assert_raises(SystemExit):
+            main.run_command("rm", ["Picard"], {'--format': "ndjson"})
+
+        event = json.loads(self.output.getvalue())
+        assert_equal("error", event["event"])
+        assert_in("not able to find Picard", event["message"])
+
+    def test_unknown_format(self):
+        """
+        Test an unknown format
+
+        Only the known formats are accepted
+        """
+        with assert_raises(SystemExit) as cm:
+            main.run_command("list", [], {'--format': "xml"})
+        assert_in("format should be one of", cm.exception.args[0])
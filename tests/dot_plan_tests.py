@@ -0,0 +1,140 @@
+import os
+import sys
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import plan
+from dot import backup
+
+
+class TestCasePlan():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a home folder with a dotfiles folder in
+        it and makes that the current directory.
+
+        home
+        |-.bashrc
+        |-.vimrc
+        |-.zshrc -> elsewhere
+        |-dotfiles
+          |-backup
+          |-files
+            |-vimrc
+              |-.vimrc
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+
+        os.makedirs(self.home + "/dotfiles/backup")
+        os.makedirs(self.home + "/dotfiles/files/vimrc")
+        open(self.home + "/dotfiles/files/vimrc/.vimrc", "w").close()
+        open(self.home + "/.bashrc", "w").write("Tea, Earl Grey, hot")
+        open(self.home + "/.vimrc", "w").close()
+        os.symlink("/elsewhere", self.home + "/.zshrc")
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        self.entries = {
+            "bashrc": "/.bashrc",
+            "vimrc": "/.vimrc",
+            "zshrc": "/.zshrc",
+            "gone": "/.gone",
+        }
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_build_plan(self):
+        """
+        Test build_plan()
+
+        Every entry should get the action that matches the state of the file
+        system and nothing should be changed.
+        """
+        actions = dict((action.name, action)
+                       for action in plan.build_plan(self.entries))
+
+        assert_equal(actions["bashrc"].kind, plan.IMPORT_AND_LINK)
+        assert_equal(actions["bashrc"].move_dir, "files/bashrc")
+        assert_equal(actions["bashrc"].size, 19)
+        assert_true(actions["bashrc"].make_dir)
+        assert_false(actions["bashrc"].cross_device)
+        assert_equal(actions["vimrc"].kind, plan.BACKUP_AND_LINK)
+        assert_true(actions["vimrc"].move_dir.startswith("backup/vimrc/"))
+        assert_true(actions["vimrc"].make_dir)
+        assert_equal(actions["zshrc"].kind, plan.SKIP_LINKED)
+        assert_equal(actions["gone"].kind, plan.SKIP_MISSING)
+
+        assert_false(os.path.exists("files/bashrc"))
+
+    def test_build_plan_backed_up_before(self):
+        """
+        Test build_plan() with a file already present in the backup folder
+
+        The file should be backed up in a new generation
+        """
+        os.mkdir("backup/vimrc")
+        open("backup/vimrc/.vimrc", "w").close()
+
+        actions = plan.build_plan({"vimrc": "/.vimrc"})
+
+        assert_equal(actions[0].kind, plan.BACKUP_AND_LINK)
+        assert_not_equal(actions[0].move_dir, "backup/vimrc")
+
+    def test_build_plan_conflict(self):
+        """
+        Test build_plan() with a file in the place of the backup folder
+
+        The entry should be planned as a conflict with the reason
+        """
+        open("backup/vimrc", "w").close()
+
+        actions = plan.build_plan({"vimrc": "/.vimrc"})
+
+        assert_equal(actions[0].kind, plan.CONFLICT)
+        assert_in("backup/vimrc is not a folder", actions[0].reason)
+
+    def test_apply_plan(self):
+        """
+        Test apply_plan()
+
+        Applying the plan should move the files and create the symlinks
+        """
+        results = plan.apply_plan(plan.build_plan(self.entries))
+        outcomes = dict((result.name, result.outcome) for result in results)
+
+        assert_equal(outcomes, {"bashrc": "imported", "vimrc": "backed-up",
+                                "zshrc": "linked", "gone": "missing"})
+        assert_true(os.path.islink(self.home + "/.bashrc"))
+        assert_true(os.path.exists("files/bashrc/.bashrc"))
+        assert_true(os.path.exists(
+            backup.generations("vimrc")[0].path + "/.vimrc"))
+
+    def test_show_plan(self):
+        """
+        Test show_plan()
+
+        Showing the plan should list the actions and return the number of
+        conflicts
+        """
+        assert_equal(plan.show_plan(plan.build_plan(self.entries)), 0)
+        assert_in("bashrc: /.bashrc to files/bashrc (19 B)",
+                  self.output.getvalue())
+        assert_in("1 to import, 1 to back up", self.output.getvalue())
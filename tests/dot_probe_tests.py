@@ -0,0 +1,94 @@
+import os
+import stat
+import shutil
+import tempfile
+
+from nose.tools import *
+from mock import patch
+
+from dot import probe
+
+
+class TestCaseProbe():
+
+    def setup(self):
+        """
+        Creates a folder with a file, a folder, a symlink and a tree
+        """
+        self.folder = tempfile.mkdtemp()
+        open(self.folder + "/bashrc", "w").write("Make it so")
+        os.mkdir(self.folder + "/config")
+        os.symlink(self.folder + "/bashrc", self.folder + "/link")
+        os.makedirs(self.folder + "/tree/sub")
+        open(self.folder + "/tree/a", "w").write("x" * 10)
+        open(self.folder + "/tree/sub/b", "w").write("x" * 5)
+
+        self.paths = [self.folder + "/" + name for name in (
+            "bashrc", "config", "link", "missing", "missing/file")]
+
+    def teardown(self):
+        shutil.rmtree(self.folder)
+
+    def check(self, probed):
+        assert_true(stat.S_ISREG(probed[self.paths[0]].st_mode))
+        assert_true(stat.S_ISDIR(probed[self.paths[1]].st_mode))
+        assert_true(stat.S_ISLNK(probed[self.paths[2]].st_mode))
+        assert_is_none(probed[self.paths[3]])
+        assert_is_none(probed[self.paths[4]])
+        assert_equal(10, probed[self.paths[0]].st_size)
+        assert_equal(os.lstat(self.paths[0]).st_ino,
+                     probed[self.paths[0]].st_ino)
+
+    def test_lstat_all(self):
+        """
+        Test probing paths
+
+        Every path should be found with its type and lstat attributes, or be
+        None when it doesn't exist
+        """
+        self.check(probe.lstat_all(self.paths))
+
+    @patch('dot.probe.scandir', None)
+    def test_lstat_all_listdir(self):
+        """
+        Test probing paths without scandir
+
+        The folder should be read once with listdir, paths in a missing
+        folder shouldn't be looked up
+        """
+        listdir = os.listdir
+        lstat = os.lstat
+
+        with patch('os.listdir', side_effect=listdir) as mock_listdir:
+            with patch('os.lstat', side_effect=lstat) as mock_lstat:
+                probed = probe.lstat_all(self.paths)
+
+                assert_equal(1, mock_listdir.call_count)
+                assert_equal(0, mock_lstat.call_count)
+
+                self.check(probed)
+                looked_up = [call[0][0] for call in mock_lstat.call_args_list]
+                assert_not_in(self.paths[3], looked_up)
+                assert_not_in(self.paths[4], looked_up)
+
+    def test_single_path(self):
+        """
+        Test probing a single path in a folder
+
+        The path should be looked up on its own
+        """
+        with patch('dot.probe._read_folder') as mock_read_folder:
+            probed = probe.lstat_all([self.paths[0]])
+
+        assert_false(mock_read_folder.called)
+        assert_true(stat.S_ISREG(probed[self.paths[0]].st_mode))
+
+    def test_tree_size(self):
+        """
+        Test the size of a tree
+
+        The sizes of all files in the tree should be added up
+        """
+        tree = self.folder + "/tree"
+        assert_equal(15, probe.tree_size(tree, os.lstat(tree)))
+        assert_equal(10, probe.tree_size(tree + "/a", os.lstat(tree + "/a")))
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from StringIO import StringIO
+
+from nose.tools import *
+
+from dot import plan
+from dot import state
+from dot import status
+from dot import output
+from dot.repository import DotRepository, DotError, ConfigError, \
+    EntryError, ConflictError
+
+
+class TestCaseRepository():
+
+    def setup(self):
+        """
+        To make sure nothing is printed, redirect stdout during the unittest.
+        Creates two home folders with their own dotfiles folder, the HOME of
+        the process isn't either of them.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.root = tempfile.mkdtemp()
+        self.repositories = []
+
+        for user in ("picard", "riker"):
+            home = self.root + "/" + user
+            os.makedirs(home + "/dotfiles/files")
+            os.makedirs(home + "/dotfiles/backup")
+            open(home + "/.dotconfig", "w").write(json.dumps({
+                "files": {}, "dot_path": "/dotfiles"}))
+            open(home + "/.bashrc", "w").write(user)
+            self.repositories.append(DotRepository(home))
+
+        self.cwd = os.getcwd()
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.root)
+
+    def test_apply(self):
+        """
+        Test add() and apply()
+
+        Every repository should link the files of its own home folder
+        """
+        for repository in self.repositories:
+            repository.add("bashrc", repository.home + "/.bashrc")
+            results = repository.apply(jobs=2)
+
+            assert_equal([("bashrc", "imported", None)], results)
+            assert_equal(repository.home + "/dotfiles/files/bashrc/.bashrc",
+                         os.readlink(repository.home + "/.bashrc"))
+            assert_equal([status.LINKED], [entry.state for entry
+                                           in repository.status()])
+            assert_equal(["bashrc"], list(state.load_manifest(
+                repository.home + "/dotfiles/" + state.MANIFEST_FILE)))
+
+        assert_equal("riker", open(self.root + "/riker/.bashrc").read())
+        assert_equal({"bashrc": "/.bashrc"}, json.load(
+            open(self.root + "/picard/.dotconfig"))["files"])
+        assert_equal("", self.output.getvalue())
+        assert_equal(self.cwd, os.getcwd())
+
+    def test_threads(self):
+        """
+        Test two repositories used from two threads at once
+
+        Both should be applied without changing the working directory or the
+        output of the main thread
+        """
+        errors = []
+
+        def apply(repository):
+            try:
+                repository.add("bashrc", "/.bashrc")
+                repository.apply(jobs=2)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=apply, args=(repository,))
+                   for repository in self.repositories]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        output.line("Engage")
+
+        assert_equal([], errors)
+        for repository in self.repositories:
+            assert_equal(repository.home + "/dotfiles/files/bashrc/.bashrc",
+                         os.readlink(repository.home + "/.bashrc"))
+        assert_equal("Engage\n", self.output.getvalue())
+        assert_equal(self.cwd, os.getcwd())
+
+    def test_remove(self):
+        """
+        Test remove()
+
+        The file should be moved back and forgotten
+        """
+        repository = self.repositories[0]
+        repository.add("bashrc", "/.bashrc")
+        repository.apply()
+
+        assert_equal("restored", repository.remove("bashrc"))
+        assert_false(os.path.islink(repository.home + "/.bashrc"))
+        assert_equal({}, repository.entries())
+
+        with assert_raises(EntryError):
+            repository.remove("bashrc")
+
+    def test_add_errors(self):
+        """
+        Test add() with a missing or tracked path
+        """
+        repository = self.repositories[0]
+        repository.add("bashrc", "/.bashrc")
+
+        with assert_raises(EntryError) as cm:
+            repository.add("bash", "/.bashrc")
+        assert_in("already being tracked as bashrc", str(cm.exception))
+
+        with assert_raises(EntryError):
+            repository.add("vimrc", "/.vimrc")
+
+    def test_conflict(self):
+        """
+        Test apply() with a conflict
+
+        It should raise the conflicting actions and change nothing
+        """
+        repository = self.repositories[0]
+        repository.add("bashrc", "/.bashrc")
+        open(repository.home + "/dotfiles/files/bashrc", "w").close()
+
+        with assert_raises(ConflictError) as cm:
+            repository.apply()
+
+        assert_equal(["bashrc"], [action.name
+                                  for action in cm.exception.actions])
+        assert_equal(plan.CONFLICT, repository.plan()[0].kind)
+        assert_false(os.path.islink(repository.home + "/.bashrc"))
+
+    def test_config_errors(self):
+        """
+        Test a broken or missing config
+        """
+        repository = self.repositories[0]
+        open(repository.config_path, "w").write("{")
+
+        with assert_raises(ConfigError):
+            repository.entries()
+
+        assert_true(issubclass(ConfigError, DotError))
+
+        with assert_raises(ConfigError):
+            DotRepository(self.root + "/data").plan()
+
+    def test_sharded_config(self):
+        """
+        Test a repository of which the config is a ~/.dotconfig.d folder
+
+        The entries should be read and written through its backend
+        """
+        repository = self.repositories[0]
+        os.mkdir(repository.home + "/.dotconfig.d")
+        json.dump({"dot_path": "/dotfiles"},
+                  open(repository.home + "/.dotconfig.d/.root.json", "w"))
+
+        repository = DotRepository(repository.home)
+        repository.add("bashrc", repository.home + "/.bashrc")
+
+        assert_equal({"path": "/.bashrc"}, json.load(
+            open(repository.home + "/.dotconfig.d/bashrc.json")))
+        assert_equal([("bashrc", "imported", None)], repository.apply())
+
+    def test_run(self):
+        """
+        Test run() with selectors and incremental
+
+        Only the selected entries should be linked, a second incremental run
+        shouldn't check them again
+        """
+        repository = self.repositories[0]
+        open(repository.home + "/.vimrc", "w").close()
+        repository.add("bashrc", "/.bashrc")
+        repository.add("vimrc", "/.vimrc")
+
+        results = repository.run(selectors={"only": ["bash*"]})
+        assert_equal([("bashrc", "imported", None)], results)
+        assert_false(os.path.islink(repository.home + "/.vimrc"))
+
+        with assert_raises(EntryError):
+            repository.run(selectors={"only": ["zsh*"]})
+
+        assert_equal(2, len(repository.run(incremental=True)))
+        assert_equal([], repository.run(incremental=True))
+        assert_equal("", self.output.getvalue())
+
+    def test_remove_missing_file(self):
+        """
+        Test remove() when the file is gone from the files folder
+
+        The error of dot should be raised as an EntryError and the entry
+        kept
+        """
+        repository = self.repositories[0]
+        repository.add("bashrc", "/.bashrc")
+        repository.apply()
+        shutil.rmtree(repository.home + "/dotfiles/files/bashrc")
+
+        with assert_raises(EntryError) as cm:
+            repository.remove("bashrc")
+        assert_equal("bashrc: not able to find file", str(cm.exception))
+        assert_equal({"bashrc": "/.bashrc"}, repository.entries())
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import state
+from dot.engine import Result
+
+
+class TestCaseState():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a home folder with a linked and a
+        regular file.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        os.symlink("/dotfiles/files/bashrc/.bashrc", self.home + "/.bashrc")
+        open(self.home + "/.vimrc", "w").close()
+        os.chdir(self.home)
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        self.entries = {"bashrc": "/.bashrc", "vimrc": "/.vimrc"}
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_load_state_missing(self):
+        """
+        Test load_state() without a state file
+
+        It should return an empty state that needs a full verify
+        """
+        last_state = state.load_state()
+
+        assert_equal(last_state["entries"], {})
+        assert_true(state.needs_full_verify(last_state))
+
+    def test_update_and_save_state(self):
+        """
+        Test update_state() and save_state()
+
+        Only the successfully linked entries should be recorded, together
+        with the link target, and the state should survive a save and load
+        """
+        results = [Result("bashrc", "linked", None),
+                   Result("vimrc", "error", "[ERROR] Borg")]
+
+        last_state = state.update_state(
+            state.load_state(), self.entries, results)
+        state.save_state(last_state)
+        last_state = state.load_state()
+
+        assert_equal(last_state["runs"], 1)
+        assert_equal(last_state["entries"].keys(), ["bashrc"])
+        assert_equal(last_state["entries"]["bashrc"]["target"],
+                     "/dotfiles/files/bashrc/.bashrc")
+
+    def test_changed_entries(self):
+        """
+        Test changed_entries()
+
+        Recorded entries with an unchanged origin should be left out, entries
+        that are replaced, moved in the config or new should be checked.
+        """
+        results = [Result("bashrc", "linked", None)]
+        last_state = state.update_state(
+            state.load_state(), self.entries, results)
+
+        assert_equal(state.changed_entries(self.entries, last_state),
+                     {"vimrc": "/.vimrc"})
+
+        entries = {"bashrc": "/.bash_profile", "vimrc": "/.vimrc"}
+        assert_equal(state.changed_entries(entries, last_state), entries)
+
+        os.unlink(self.home + "/.bashrc")
+        os.symlink("/elsewhere", self.home + "/.bashrc")
+        assert_in("bashrc", state.changed_entries(self.entries, last_state))
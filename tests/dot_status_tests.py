@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import status
+from dot import backup
+
+
+class TestCaseStatus():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles folder with an entry in every
+        state.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        self.dotfiles = self.home + "/dotfiles"
+        os.makedirs(self.dotfiles + "/backup")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {
+                "bashrc": "/.bashrc",
+                "vimrc": "/.vimrc",
+                "zshrc": "/.zshrc",
+                "gitconfig": "/.gitconfig",
+                "inputrc": "/.inputrc",
+                "tmux": "/.tmux.conf",
+            },
+            "dot_path": "/dotfiles"}))
+        os.chdir(self.dotfiles)
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        for name, filename in (("bashrc", ".bashrc"), ("zshrc", ".zshrc"),
+                               ("gitconfig", ".gitconfig")):
+            os.makedirs("files/" + name)
+            open("files/%s/%s" % (name, filename), "w").write(name)
+
+        # linked correctly
+        os.symlink(self.dotfiles + "/files/bashrc/.bashrc",
+                   self.home + "/.bashrc")
+        # not linked yet
+        open(self.home + "/.vimrc", "w").write("vimrc")
+        # linked somewhere else
+        open(self.home + "/zshrc.local", "w").write("local")
+        os.symlink(self.home + "/zshrc.local", self.home + "/.zshrc")
+        # gitconfig is missing in the home folder
+        # linked to nothing
+        os.symlink(self.home + "/gone", self.home + "/.inputrc")
+        # linked, but gone from the repository
+        os.symlink(self.dotfiles + "/files/tmux/.tmux.conf",
+                   self.home + "/.tmux.conf")
+
+    def teardown(self):
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def states(self):
+        data = json.load(open(self.home + "/.dotconfig"))
+        return dict((entry.name, entry.state)
+                    for entry in status.check_entries(data['files'], 4))
+
+    def test_check_entries(self):
+        """
+        Test check_entries()
+
+        Every entry should get its state without anything being changed
+        """
+        assert_equal({
+            "bashrc": status.LINKED,
+            "vimrc": status.UNLINKED,
+            "zshrc": status.LINKED_ELSEWHERE,
+            "gitconfig": status.MISSING,
+            "inputrc": status.DANGLING,
+            "tmux": status.REPO_MISSING,
+        }, self.states())
+
+        assert_false(os.path.islink(self.home + "/.vimrc"))
+        assert_false(os.path.exists("files/vimrc"))
+
+    def test_exit_code(self):
+        """
+        Test exit_code()
+
+        Broken entries should count more than entries that aren't linked
+        """
+        def entry(state):
+            return status.Status("name", "/path", state, None, None, None)
+
+        assert_equal(0, status.exit_code([]))
+        assert_equal(0, status.exit_code([entry(status.LINKED)]))
+        assert_equal(1, status.exit_code([entry(status.LINKED),
+                                          entry(status.MISSING)]))
+        assert_equal(2, status.exit_code([entry(status.UNLINKED),
+                                          entry(status.DANGLING)]))
+
+    def test_status(self):
+        """
+        Test check_status()
+
+        The broken entries should be shown and dot should exit with 2
+        """
+        with assert_raises(SystemExit) as cm:
+            main.check_status([], jobs=2)
+
+        assert_equal(2, cm.exception.code)
+        assert_in("[LINKED-ELSEWHERE]", self.output.getvalue())
+        assert_in("zshrc: /.zshrc -> %s/zshrc.local" % self.home,
+                  self.output.getvalue())
+        assert_in("inputrc: /.inputrc -> %s/gone" % self.home,
+                  self.output.getvalue())
+        assert_not_in("bashrc", self.output.getvalue())
+
+    def test_fix(self):
+        """
+        Test check_status() with --fix
+
+        Every entry of which the file is in the repository should be linked,
+        symlinks in the way should be backed up
+        """
+        with assert_raises(SystemExit) as cm:
+            main.check_status(["--fix"], jobs=2)
+
+        # The entries missing from the repository can't be fixed
+        assert_equal(2, cm.exception.code)
+        assert_equal({
+            "bashrc": status.LINKED,
+            "vimrc": status.LINKED,
+            "zshrc": status.LINKED,
+            "gitconfig": status.LINKED,
+            "inputrc": status.DANGLING,
+            "tmux": status.REPO_MISSING,
+        }, self.states())
+
+        assert_equal("vimrc", open(self.home + "/.vimrc").read())
+        generation = backup.generations("zshrc")[-1]
+        assert_equal(self.home + "/zshrc.local",
+                     os.readlink(generation.path + "/.zshrc"))
+
+    def test_selectors(self):
+        """
+        Test the command 'status' with selectors
+
+        Only the selected entries should be checked
+        """
+        config = json.load(open(self.home + "/.dotconfig"))
+        config["tags"] = {"vimrc": ["editor"], "zshrc": ["shell"]}
+        open(self.home + "/.dotconfig", "w").write(json.dumps(config))
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("status", [], {"--only": "bash*",
+                                            "--tag": "editor"})
+        assert_equal(1, cm.exception.code)
+        assert_in("1 linked, 1 unlinked, 0 missing", self.output.getvalue())
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("verify", [], {"--tag": "editor,shell",
+                                            "--except": "shell"})
+        assert_equal(1, cm.exception.code)
+        assert_not_in("zshrc", self.output.getvalue())
+
+        with assert_raises(SystemExit) as cm:
+            main.run_command("status", [], {"--only": "emacs"})
+        assert_in("no entries selected", cm.exception.code)
+
+    def test_unknown_argument(self):
+        """
+        Test check_status() with another argument than --fix
+        """
+        with assert_raises(SystemExit) as cm:
+            main.check_status(["--repair"])
+
+        assert_in("unknown argument --repair", cm.exception.code)
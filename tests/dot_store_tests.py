@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import store
+
+
+class TestCaseStore():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a dotfiles folder with two entries that
+        have the same file.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        os.makedirs(self.home + "/dotfiles/backup")
+        for name in ("vim", "vim-work"):
+            os.makedirs(self.home + "/dotfiles/files/%s/.vim" % name)
+            open(self.home + "/dotfiles/files/%s/.vim/vimrc" % name,
+                 "w").write("set number")
+        open(self.home + "/dotfiles/files/vim-work/.vim/work", "w").write(
+            "Make it so")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {"vim": "/.vim", "vim-work": "/.vim-work"},
+            "dot_path": "/dotfiles"}))
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        self.fcntl = patch('dot.store.fcntl', None)
+        self.fcntl.start()
+
+    def teardown(self):
+        self.fcntl.stop()
+
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_store_entries(self):
+        """
+        Test storing entries
+
+        The same file should be stored once and shared by both entries
+        """
+        store.enable(hardlinks=True)
+        assert_equal(0, store.store_entry("vim"))
+        assert_equal(10, store.store_entry("vim-work"))
+
+        first = os.lstat("files/vim/.vim/vimrc")
+        second = os.lstat("files/vim-work/.vim/vimrc")
+        assert_equal(first.st_ino, second.st_ino)
+
+        manifest = store.load_manifest("vim-work")
+        assert_equal(sorted([".vim/vimrc", ".vim/work"]), sorted(manifest))
+        assert_equal(store.hash_file("files/vim/.vim/vimrc"),
+                     manifest[".vim/vimrc"]["hash"])
+
+        assert_equal(([], []), store.fsck(["vim", "vim-work"]))
+
+    def test_fsck(self):
+        """
+        Test checking the store
+
+        Changed, missing and unknown files should be found, and objects that
+        are not used
+        """
+        store.enable(hardlinks=True)
+        store.store_entry("vim")
+        store.store_entry("vim-work")
+
+        os.unlink("files/vim-work/.vim/work")
+        open("files/vim-work/.vim/new", "w").write("Engage")
+        os.unlink("files/vim/.vim/vimrc")
+        open("files/vim/.vim/vimrc", "w").write("set nonumber")
+
+        problems, unreferenced = store.fsck(["vim", "vim-work"])
+
+        assert_equal([
+            ("vim", ".vim/vimrc was changed, run 'dot store' to store it "
+             "again"),
+            ("vim-work", ".vim/work is missing"),
+            ("vim-work", ".vim/new is not in the manifest")], problems)
+        assert_equal([], unreferenced)
+
+        store.unshare_entry("vim-work")
+        work = store.manifest_path("vim-work")
+        problems, unreferenced = store.fsck(["vim"])
+        assert_false(os.path.exists(work))
+        assert_equal(1, len(unreferenced))
+
+        store.prune(unreferenced)
+        assert_false(os.path.exists(store.object_path(unreferenced[0])))
+
+    def test_unshare_entry(self):
+        """
+        Test taking an entry out of the store
+
+        Its files should get their own data and its manifest removed
+        """
+        store.enable(hardlinks=True)
+        store.store_entry("vim")
+        store.store_entry("vim-work")
+        store.unshare_entry("vim-work")
+
+        assert_equal(1, os.lstat("files/vim-work/.vim/vimrc").st_nlink)
+        assert_equal("set number", open("files/vim-work/.vim/vimrc").read())
+        assert_is_none(store.load_manifest("vim-work"))
+
+    def test_command_store_and_fsck(self):
+        """
+        Test commands 'store' and 'fsck'
+
+        All entries should be stored and checked without problems
+        """
+        main.run_command("store", ["--hardlinks"])
+        assert_in("2 entries stored, 10 B saved", self.output.getvalue())
+        assert_true(os.path.isfile("store/.gitignore"))
+
+        main.run_command("fsck", [])
+        assert_in("no problems found", self.output.getvalue())
+
+        open("files/vim/.vim/vimrc", "a").write("\nset ruler")
+        with assert_raises(SystemExit) as cm:
+            main.run_command("fsck", [])
+        assert_in("3 problems found", cm.exception.args[0])
+        assert_in("is corrupt", self.output.getvalue())
+
+    def test_command_fsck_without_store(self):
+        """
+        Test command 'fsck' without a store
+
+        It should tell how to create the store
+        """
+        with assert_raises(SystemExit) as cm:
+            main.run_command("fsck", [])
+        assert_in("run 'dot store'", cm.exception.args[0])
+
+    def test_run_with_store(self):
+        """
+        Test command 'run' with the store
+
+        An imported entry with a file that is already stored should share it
+        """
+        main.run_command("store", ["--hardlinks"])
+
+        os.makedirs(self.home + "/.vim-home")
+        open(self.home + "/.vim-home/vimrc", "w").write("set number")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {"vim-home": "/.vim-home"}, "dot_path": "/dotfiles"}))
+
+        main.run_command(None, [])
+
+        assert_in("10 B of vim-home already stored", self.output.getvalue())
+        assert_equal(os.lstat("files/vim/.vim/vimrc").st_ino,
+                     os.lstat("files/vim-home/.vim-home/vimrc").st_ino)
+        assert_true(os.path.islink(self.home + "/.vim-home"))
+
+    def test_add_object_twice(self):
+        """
+        Test adding an object that another thread added at the same time
+
+        The object should be shared instead of failing the entry
+        """
+        store.enable(hardlinks=True)
+        store.store_entry("vim")
+
+        with patch('dot.store.os.path.isdir', return_value=False):
+            assert_false(store._add_object(
+                "files/vim-work/.vim/vimrc",
+                store.object_path(store.hash_file("files/vim/.vim/vimrc")),
+                os.lstat("files/vim-work/.vim/vimrc"), True))
+
+        # The object shows up after it was looked up
+        os.unlink(store.object_path(store.hash_file("files/vim/.vim/vimrc")))
+        add_object = store._add_object
+        with patch('dot.store._add_object', side_effect=lambda *args:
+                   add_object(*args) and False):
+            assert_equal(0, store.store_entry("vim-work"))
+            assert_equal(10, store.store_entry("vim"))
+        assert_equal(os.lstat("files/vim/.vim/vimrc").st_ino,
+                     os.lstat("files/vim-work/.vim/vimrc").st_ino)
+        assert_equal(([], []), store.fsck(["vim", "vim-work"]))
+
+    def test_store_without_hardlinks(self):
+        """
+        Test storing entries without reflinks and without hardlinks
+
+        Nothing should be shared, so a file changed in place doesn't change
+        the other entries, and turning hardlinks off should give every file
+        its own data again
+        """
+        main.run_command("store", [])
+        assert_in("2 entries stored, 0 B saved", self.output.getvalue())
+        assert_equal(1, os.lstat("files/vim/.vim/vimrc").st_nlink)
+
+        open("files/vim/.vim/vimrc", "a").write("\nset ruler")
+        assert_equal("set number", open("files/vim-work/.vim/vimrc").read())
+
+        main.run_command("store", ["--hardlinks"])
+        assert_equal(2, os.lstat("files/vim-work/.vim/work").st_nlink)
+        assert_true(store.uses_hardlinks())
+
+        main.run_command("store", ["--no-hardlinks"])
+        assert_false(store.uses_hardlinks())
+        for name in ("vim", "vim-work"):
+            assert_equal(1, os.lstat("files/%s/.vim/vimrc" % name).st_nlink)
+
+        with assert_raises(SystemExit):
+            main.run_command("store", ["--reflinks"])
+
+    def test_run_store_failed(self):
+        """
+        Test command 'run' when an imported entry can't be stored
+
+        The entry should still be linked
+        """
+        main.run_command("store", ["--hardlinks"])
+
+        os.makedirs(self.home + "/.vim-home")
+        open(self.home + "/.dotconfig", "w").write(json.dumps({
+            "files": {"vim-home": "/.vim-home"}, "dot_path": "/dotfiles"}))
+
+        with patch('dot.store.store_entry', side_effect=OSError("full")):
+            with assert_raises(SystemExit):
+                main.run_command(None, [])
+
+        assert_true(os.path.islink(self.home + "/.vim-home"))
@@ -0,0 +1,100 @@
+import os
+import sys
+import shutil
+import pstats
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import main
+from dot import timings
+
+
+class TestCaseTimings():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        and stderr during the unittest. Creates a home folder with a file to
+        track.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.errors = StringIO()
+        self.saved_stderr = sys.stderr
+        sys.stderr = self.errors
+
+        self.home = tempfile.mkdtemp()
+        os.makedirs(self.home + "/dotfiles/backup")
+        os.makedirs(self.home + "/dotfiles/files")
+        open(self.home + "/.bashrc", "w").write("Make it so")
+        open(self.home + "/.dotconfig", "w").write(
+            '{"files": {"bashrc": "/.bashrc"}, "dot_path": "/dotfiles"}')
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+    def teardown(self):
+        timings.disable()
+
+        self.output.close()
+        sys.stdout = self.saved_stdout
+        self.errors.close()
+        sys.stderr = self.saved_stderr
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def test_timings(self):
+        """
+        Test command 'run' with timings
+
+        The phases, entries, file system calls and moves should be reported
+        on stderr
+        """
+        main.run_command(None, [], {"--timings": True})
+
+        report = self.errors.getvalue()
+        assert_in("Timings", report)
+        for phase in ("config", "plan", "move", "link"):
+            assert_greater(timings.phases[phase][0], 0)
+            assert_in(phase, report)
+        assert_in("bashrc", timings.entries)
+        assert_greater(timings.fs_calls["lstat"], 0)
+        assert_equal(timings.moved["moves"], 1)
+        assert_not_in("Timings", self.output.getvalue())
+
+    def test_disable(self):
+        """
+        Test disable()
+
+        The original functions should be restored
+        """
+        lstat = os.lstat
+
+        timings.enable()
+        assert_is_not(os.lstat, lstat)
+
+        timings.disable()
+        assert_is(os.lstat, lstat)
+        assert_false(timings.enabled)
+
+    def test_profile(self):
+        """
+        Test command 'list' with DOT_PROFILE
+
+        The profile statistics should be written to the file
+        """
+        path = self.home + "/profile"
+
+        with patch.dict(os.environ, {"DOT_PROFILE": path}):
+            main.run_command("list", [], {})
+
+        assert_in("bashrc", self.output.getvalue())
+        assert_true(pstats.Stats(path).total_calls > 0)
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from nose.tools import *
+from mock import patch
+
+from dot import helpers
+from dot import backup
+from dot import watch
+
+
+class TestCaseWatch():
+
+    def setup(self):
+        """
+        To capture the output in the console for testing, redirect stdout
+        during the unittest. Creates a home folder with a linked entry and a
+        missing one.
+        """
+        self.output = StringIO()
+        self.saved_stdout = sys.stdout
+        sys.stdout = self.output
+
+        self.home = tempfile.mkdtemp()
+        os.makedirs(self.home + "/dotfiles/backup")
+        os.makedirs(self.home + "/dotfiles/files")
+        os.makedirs(self.home + "/.config")
+        open(self.home + "/.bashrc", "w").write("Make it so")
+        self.write_config({"bashrc": "/.bashrc", "vimrc": "/.config/vimrc"})
+        os.chdir(self.home + "/dotfiles")
+
+        self.environ = patch.dict(os.environ, {"HOME": self.home})
+        self.environ.start()
+
+        self.watcher = watch.Watcher()
+        self.watcher.load()
+        self.watcher.converge()
+
+    def teardown(self):
+        self.watcher.close()
+
+        self.output.close()
+        sys.stdout = self.saved_stdout
+
+        self.environ.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(self.home)
+
+    def write_config(self, files):
+        open(self.home + "/.dotconfig", "w").write(json.dumps(
+            {"files": files, "dot_path": "/dotfiles"}))
+
+    def outcomes(self):
+        results = self.watcher.step(timeout=2)
+        return dict((result.name, result.outcome) for result in results)
+
+    def test_converged(self):
+        """
+        Test starting to watch
+
+        The entries should be linked and the folders watched
+        """
+        assert_true(os.path.islink(self.home + "/.bashrc"))
+        assert_in(self.home, self.watcher.watches)
+        assert_in(self.home + "/.config", self.watcher.watches)
+        assert_in(os.path.abspath("files/bashrc"), self.watcher.watches)
+
+    def test_new_file(self):
+        """
+        Test a tracked file that shows up
+
+        Only the entry of the file should be linked
+        """
+        open(self.home + "/.config/vimrc", "w").write("Engage")
+
+        assert_equal({"vimrc": "imported"}, self.outcomes())
+        assert_true(os.path.islink(self.home + "/.config/vimrc"))
+
+    def test_replaced_symlink(self):
+        """
+        Test a symlink replaced by a file
+
+        The file should be backed up and the symlink restored
+        """
+        os.unlink(self.home + "/.bashrc")
+        open(self.home + "/.bashrc", "w").write("Engage")
+
+        assert_equal({"bashrc": "backed-up"}, self.outcomes())
+        assert_true(os.path.islink(self.home + "/.bashrc"))
+        assert_equal("Engage", open(
+            backup.generations("bashrc")[0].path + "/.bashrc").read())
+
+    def test_config_changed(self):
+        """
+        Test a new entry in the config
+
+        The new entry should be watched and linked
+        """
+        open(self.home + "/.zshrc", "w").write("Warp 8")
+        helpers.clear_dotconfig_cache()
+        self.write_config({"bashrc": "/.bashrc", "vimrc": "/.config/vimrc",
+                           "zshrc": "/.zshrc"})
+
+        assert_equal("imported", self.outcomes()["zshrc"])
+        assert_in("zshrc", self.watcher.entries)
+        assert_true(os.path.islink(self.home + "/.zshrc"))
+
+    def test_sharded_config_changed(self):
+        """
+        Test a new entry in a ~/.dotconfig.d folder
+
+        The folder should be watched once it's created and a new shard
+        should be linked
+        """
+        helpers.get_sharded_config().save(helpers.load_config())
+        self.outcomes()
+        assert_in(self.home + "/.dotconfig.d", self.watcher.watches)
+
+        open(self.home + "/.zshrc", "w").write("Warp 8")
+        helpers.ShardedConfig(self.home + "/.dotconfig.d").update_files(
+            added={"zshrc": "/.zshrc"})
+
+        assert_equal({"zshrc": "imported"}, self.outcomes())
+        assert_true(os.path.islink(self.home + "/.zshrc"))
+
+    def test_unrelated_event(self):
+        """
+        Test a change of a file that isn't tracked
+
+        Nothing should be applied
+        """
+        open(self.home + "/.profile", "w").write("Tea, Earl Grey, hot")
+
+        assert_equal({}, self.outcomes())
+
+    def test_overflow(self):
+        """
+        Test lost events
+
+        All entries should be checked again
+        """
+        assert_equal(None, self.watcher.affected(
+            [(-1, watch.IN_Q_OVERFLOW, u"")]))